@@ -0,0 +1,576 @@
+import asyncio
+import json
+import random
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from openai import AsyncOpenAI
+
+from deepseek_client import DeepSeekClient
+from helper.json_helper import decode_json_object
+from helper.stats_helper import summarize_latencies
+from helper.stream_json import StreamingJSONParser
+from helper.token_helper import get_prompt_cache_tokens
+from http_pool import SharedHTTPPool
+
+
+class AsyncDeepSeekClient(DeepSeekClient):
+    """
+    DeepSeek 异步客户端：基于 AsyncOpenAI，用信号量限制同时进行的请求数，
+    对 429/5xx、超时和连接错误按指数退避加随机抖动重试，适合整表批量生成时多行并发请求。
+    每次生成都是独立的单轮对话，不使用也不记录对话历史
+    """
+
+    def __init__(self, api_key: str, base_url: str = "https://api.deepseek.com", max_concurrency: int = 8,
+                 max_retries: int = 3, timeout: float = 120.0, backoff_base: float = 0.5, backoff_max: float = 10.0):
+        """
+        Args:
+            api_key: DeepSeek API密钥
+            base_url: API基础URL
+            max_concurrency: 同时进行的最大请求数
+            max_retries: 单个请求失败后的最大重试次数
+            timeout: 单次请求超时时间（秒）
+            backoff_base: 退避基准时间（秒），第n次重试最多等待 backoff_base * 2^n 秒
+            backoff_max: 单次退避的最长等待时间（秒）
+        """
+        super().__init__(api_key=api_key, base_url=base_url)
+        self.async_client = None  # 异步客户端与事件循环绑定，在事件循环中创建
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._semaphore = None
+        self._semaphore_loop = None
+        # 多行打包请求：每行输出token数的估计值（按实际用量更新），打包行数使输出不超过 max_tokens 的一定比例
+        self.output_tokens_per_row = 800
+        self.output_tokens_calibrated = False  # 是否已按实际回复校准过估计值
+        self.packed_output_ratio = 0.8
+        self.probe_rows = 2  # 估计值未校准时，首个打包请求只包含的行数
+        self.reset_stats()
+
+    def reset_stats(self):
+        """重置统计信息"""
+        self.stats = {'requests': 0, 'succeeded': 0, 'failed': 0, 'retries': 0, 'local': 0, 'cached': 0,
+                      'prompt_tokens': 0, 'cache_hit_tokens': 0, 'packed_requests': 0, 'packed_rows': 0,
+                      'packed_splits': 0, 'hybrid': 0}
+        self.latencies = []
+        self._started_at = None
+        self._finished_at = None
+
+    async def generate(self, message: str, excel_data: Optional[Dict[str, Any]] = None, use_cache: bool = True) -> str:
+        """
+        为一行数据生成JSON文本，失败时抛出异常
+
+        Args:
+            message: 用户消息
+            excel_data: Excel解析的数据字典
+            use_cache: 是否使用回复缓存
+
+        Returns:
+            大模型回复内容
+        """
+        if self._started_at is None:
+            self._started_at = time.perf_counter()
+
+        record = self.telemetry.start('generate', False, self.model_params.get('model'))
+        response, full_message, cache_key = self._resolve_without_request(message, excel_data, use_cache, record)
+        if response is not None:
+            return response
+
+        # 规则引擎无法确定部分字段时，只请求这些字段并与本地结果合并
+        response = await self._generate_hybrid_async(message, excel_data)
+        if response is not None:
+            if cache_key is not None:
+                self.response_cache.put(cache_key, response)
+            return response
+
+        # 固定前缀在前、行数据在最后，并发请求的前缀一致，可命中接口的前缀缓存
+        messages = self._get_prefix_messages() + [{"role": "user", "content": full_message}]
+        response = await self._request(messages, record)
+        if cache_key is not None and response:
+            self.response_cache.put(cache_key, response)
+        return response
+
+    def _resolve_without_request(self, message: str, excel_data: Optional[Dict[str, Any]], use_cache: bool,
+                                 record: Dict[str, Any]) -> Tuple[Optional[str], str, Optional[str]]:
+        """
+        依次尝试本地规则引擎和回复缓存
+
+        Returns:
+            tuple: (回复内容, 完整的用户消息, 缓存键)，均未命中时回复内容为 None
+        """
+        local_response = self._generate_locally(message, excel_data)
+        if local_response is not None:
+            self.stats['local'] += 1
+            self.telemetry.finish(record, source='local')
+            return local_response, message, None
+
+        full_message, cache_data = self._build_user_message(message, excel_data)
+        cache_key = None
+        if use_cache:
+            cache_key = self.response_cache.make_key(self._get_cache_prompt(), cache_data, message, self.model_params)
+            cached_response = self.response_cache.get(cache_key)
+            if cached_response is not None:
+                self.stats['cached'] += 1
+                self.telemetry.finish(record, source='cache')
+                return cached_response, full_message, cache_key
+        return None, full_message, cache_key
+
+    async def generate_many(self, rows: Iterable[Tuple[int, Dict[str, Any]]], message: str,
+                            use_cache: bool = True) -> List[Dict[str, Any]]:
+        """
+        并发生成多行数据
+
+        Args:
+            rows: (行号, 行数据字典) 的可迭代对象
+            message: 每行发送的生成指令
+            use_cache: 是否使用回复缓存
+
+        Returns:
+            List: 按输入顺序排列的结果，每项包含 row、response（成功时）或 error（失败时）
+        """
+        rows = list(rows)
+
+        async def generate_row(row_index, row_data):
+            try:
+                return {'row': row_index, 'response': await self.generate(message, row_data, use_cache)}
+            except Exception as e:
+                return {'row': row_index, 'error': str(e)}
+
+        results = await asyncio.gather(*(generate_row(row_index, row_data) for row_index, row_data in rows))
+        self._finished_at = time.perf_counter()
+        return list(results)
+
+    def run_many(self, rows: Iterable[Tuple[int, Dict[str, Any]]], message: str,
+                 use_cache: bool = True) -> List[Dict[str, Any]]:
+        """generate_many 的同步入口，供非异步代码调用"""
+        return asyncio.run(self.generate_many(rows, message, use_cache))
+
+    async def _generate_hybrid_async(self, message: str, excel_data: Optional[Dict[str, Any]]) -> Optional[str]:
+        """混合生成的异步版本，不适用或失败时返回None"""
+        request = self._build_hybrid_request(message, excel_data)
+        if request is None:
+            return None
+        fields, unresolved, messages = request
+        record = self.telemetry.start('hybrid', False, self.model_params.get('model'))
+        try:
+            response = await self._request_completion(messages, record)
+        except Exception as e:
+            print(f"警告：混合生成请求失败，改为完整生成 - {str(e)}")
+            return None
+        merged = self._merge_hybrid_reply(fields, unresolved, response.choices[0].message.content)
+        if merged is not None:
+            self.stats['hybrid'] += 1
+        return merged
+
+    def get_rows_per_request(self, max_rows: int) -> int:
+        """按每行输出token数的估计值计算一次请求打包的行数，使输出不超过 max_tokens"""
+        budget = self.model_params.get('max_tokens', 8192) * self.packed_output_ratio
+        return max(1, min(max_rows, int(budget // self.output_tokens_per_row)))
+
+    async def generate_packed(self, rows: Iterable[Tuple[int, Dict[str, Any]]], message: str, max_rows: int = 8,
+                              use_cache: bool = True,
+                              on_result: Optional[Callable[[int, Dict[str, Any], Optional[str], Optional[str]], None]] = None
+                              ) -> List[Dict[str, Any]]:
+        """
+        多行打包生成：本地规则引擎和回复缓存无法处理的行按 WPS 编号打包，一次请求生成多行，
+        分摊系统提示词和请求开销。打包行数按输出token数自适应：有空闲的并发名额时才切分下一组，
+        每组按当时的每行输出token数估计值确定行数；估计值未校准时先发送一个小的探测组。
+        回复被截断或缺少某些行时，缺少的行对半拆分后重新请求，只剩一行时按单行生成。
+        只有少量字段无法由规则确定的行同样打包，一次请求补全多行各自缺少的字段。
+        逐行读取 rows，凑满一组即发出请求，后续行仍在读取时前面的行已开始生成
+
+        Args:
+            rows: (行号, 行数据字典) 的可迭代对象
+            message: 每行的生成指令
+            max_rows: 一次请求最多打包的行数
+            use_cache: 是否使用回复缓存
+            on_result: 每行完成时以 (行号, 行数据, 回复内容, 错误信息) 调用，可在其余行生成时提前处理
+
+        Returns:
+            List: 按输入顺序排列的结果，每项包含 row、response（成功时）或 error（失败时）；
+                指定 on_result 时结果只交给 on_result、不在内存中保留，返回空列表
+        """
+        if self._started_at is None:
+            self._started_at = time.perf_counter()
+        order = []
+        results = {}
+
+        def complete(row_index, row_data, response=None, error=None):
+            if on_result is not None:
+                on_result(row_index, row_data, response, error)
+                return
+            results[row_index] = {'row': row_index, 'response': response} if error is None \
+                else {'row': row_index, 'error': error}
+
+        # 同时进行的打包请求不超过并发数，已返回的回复更新估计值后，后续各组的行数随之调整；
+        # 没有空闲名额时暂停读取，待请求的行最多为每种请求一组
+        slots = asyncio.Semaphore(self.max_concurrency)
+        tasks = set()
+        pending = []
+        hybrid_pending = []
+        probe = None
+
+        def full_pack_size():
+            # 估计值未校准时先发送探测组，其余各组等探测组返回、按实测值切分
+            if probe is None and not self.output_tokens_calibrated:
+                return min(self.probe_rows, self.get_rows_per_request(max_rows))
+            return self.get_rows_per_request(max_rows)
+
+        async def dispatch(buffer, generate, rows_per_request):
+            await slots.acquire()
+            task = asyncio.ensure_future(generate(self._cut_pack(buffer, rows_per_request), message, complete))
+            task.add_done_callback(lambda _: slots.release())
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            return task
+
+        async def dispatch_full():
+            nonlocal probe
+            if probe is None and not self.output_tokens_calibrated:
+                probe = await dispatch(pending, self._generate_pack, full_pack_size())
+                return
+            if probe is not None and not probe.done():
+                await asyncio.wait([probe])
+            await dispatch(pending, self._generate_pack, full_pack_size())
+
+        for row_index, row_data in rows:
+            if on_result is None:
+                order.append(row_index)
+            record = self.telemetry.start('generate', False, self.model_params.get('model'))
+            response, _, cache_key = self._resolve_without_request(message, row_data, use_cache, record)
+            if response is not None:
+                complete(row_index, row_data, response)
+            else:
+                hybrid = self._resolve_hybrid_fields(message, row_data)
+                if hybrid is not None:
+                    fields, unresolved = hybrid
+                    hybrid_pending.append((row_index, row_data, cache_key, fields, unresolved))
+                    if self._pack_ready(hybrid_pending, self.get_rows_per_request(max_rows)):
+                        await dispatch(hybrid_pending, self._generate_hybrid_pack, self.get_rows_per_request(max_rows))
+                else:
+                    pending.append((row_index, row_data, cache_key))
+                    if self._pack_ready(pending, full_pack_size()):
+                        await dispatch_full()
+            # 读取下一行前处理已返回的回复
+            await asyncio.sleep(0)
+
+        while hybrid_pending:
+            await dispatch(hybrid_pending, self._generate_hybrid_pack, self.get_rows_per_request(max_rows))
+        while pending:
+            await dispatch_full()
+        await asyncio.gather(*tasks)
+        self._finished_at = time.perf_counter()
+        return [results[row_index] for row_index in order]
+
+    @staticmethod
+    def _get_pack_key(row_index: int, row_data: Dict[str, Any]) -> str:
+        """打包请求中行的键：WPS 编号，没有编号时使用行号"""
+        return str(row_data.get('WPS') or f"第{row_index + 1}行")
+
+    def _pack_ready(self, buffer: list, rows_per_request: int) -> bool:
+        """待请求的行中不同的 WPS 编号已够一组，或同一编号的行积压过多时切分下一组"""
+        if len(buffer) >= 4 * rows_per_request:
+            return True
+        return len({self._get_pack_key(item[0], item[1]) for item in buffer}) >= rows_per_request
+
+    def _cut_pack(self, buffer: list, rows_per_request: int) -> list:
+        """从待请求的行中按顺序取出下一组（最多 rows_per_request 行），同一组内的 WPS 编号不重复"""
+        pack = []
+        keys = set()
+        rest = []
+        for item in buffer:
+            key = self._get_pack_key(item[0], item[1])
+            if len(pack) < rows_per_request and key not in keys:
+                pack.append(item)
+                keys.add(key)
+            else:
+                rest.append(item)
+        buffer[:] = rest
+        return pack
+
+    def _build_packed_message(self, pack: list, message: str) -> str:
+        """构建打包请求的用户消息：生成指令、输出格式说明，以及各行数据"""
+        keys = [self._get_pack_key(row_index, row_data) for row_index, row_data, _ in pack]
+        parts = [f"{message}\n\n以下共有{len(pack)}条焊接接头数据，请分别为每条数据生成焊接工艺规程。"
+                 f"输出一个JSON对象，键为各条数据的编号（{'、'.join(keys)}），"
+                 f"值为该条数据对应的完整焊接工艺规程JSON对象，不要遗漏任何一条。"]
+        for key, (_, row_data, _) in zip(keys, pack):
+            row_message, _ = self._build_user_message('', row_data)
+            parts.append(f"\n\n【编号：{key}】{row_message}")
+        return ''.join(parts)
+
+    async def _generate_pack(self, pack: list, message: str, complete: Callable):
+        """请求一组行，回复中缺少的行拆分后重新请求"""
+        if not pack:
+            return
+        if len(pack) == 1:
+            row_index, row_data, cache_key = pack[0]
+            record = self.telemetry.start('generate', False, self.model_params.get('model'))
+            full_message, _ = self._build_user_message(message, row_data)
+            try:
+                completion = await self._request_completion(self._get_prefix_messages() +
+                                                            [{"role": "user", "content": full_message}], record)
+            except Exception as e:
+                complete(row_index, row_data, error=str(e))
+                return
+            response = completion.choices[0].message.content
+            completion_tokens = getattr(completion.usage, 'completion_tokens', None)
+            if completion_tokens and completion.choices[0].finish_reason != 'length':
+                self._observe_output_tokens(completion_tokens)
+            if cache_key is not None and response:
+                self.response_cache.put(cache_key, response)
+            complete(row_index, row_data, response)
+            return
+
+        record = self.telemetry.start('packed', False, self.model_params.get('model'))
+        messages = self._get_prefix_messages() + [{"role": "user", "content": self._build_packed_message(pack, message)}]
+        try:
+            response = await self._request_completion(messages, record)
+        except Exception as e:
+            for row_index, row_data, _ in pack:
+                complete(row_index, row_data, error=str(e))
+            return
+        self.stats['packed_requests'] += 1
+
+        choice = response.choices[0]
+        data = decode_json_object(choice.message.content)
+        if data is None:
+            # 回复被截断时保留已完整输出的行
+            parser = StreamingJSONParser()
+            parser.feed(choice.message.content or '')
+            data = parser.data
+        missing = []
+        for row_index, row_data, cache_key in pack:
+            item = data.get(self._get_pack_key(row_index, row_data))
+            if not isinstance(item, dict) or '工艺规程编号' not in item:
+                missing.append((row_index, row_data, cache_key))
+                continue
+            row_response = json.dumps(item, ensure_ascii=False, indent=4)
+            if cache_key is not None:
+                self.response_cache.put(cache_key, row_response)
+            self.stats['packed_rows'] += 1
+            complete(row_index, row_data, row_response)
+
+        completion_tokens = getattr(response.usage, 'completion_tokens', None)
+        if choice.finish_reason == 'length':
+            # 输出被截断：按最大输出token数和完整返回的行数提高每行的估计值，后续打包更少的行
+            returned = max(len(pack) - len(missing), 1)
+            self.output_tokens_per_row = max(self.output_tokens_per_row,
+                                             self.model_params.get('max_tokens', 8192) / returned)
+            self.output_tokens_calibrated = True
+        elif completion_tokens and len(missing) < len(pack):
+            self._observe_output_tokens(completion_tokens / (len(pack) - len(missing)))
+
+        if missing:
+            self.stats['packed_splits'] += 1
+            print(f"警告：打包请求缺少 {len(missing)}/{len(pack)} 行（结束原因：{choice.finish_reason}），拆分后重新请求")
+            middle = (len(missing) + 1) // 2
+            await asyncio.gather(self._generate_pack(missing[:middle], message, complete),
+                                 self._generate_pack(missing[middle:], message, complete))
+
+    def _observe_output_tokens(self, observed: float):
+        """按实测的每行输出token数更新估计值：首个实测值直接采用，之后指数平滑"""
+        if self.output_tokens_calibrated:
+            self.output_tokens_per_row = 0.8 * self.output_tokens_per_row + 0.2 * observed
+        else:
+            self.output_tokens_per_row = observed
+            self.output_tokens_calibrated = True
+
+    def _build_packed_hybrid_message(self, pack: list) -> str:
+        """构建打包的混合生成请求：各行需要补全的字段和行数据，映射规则按所有行的字段合并后只列出一次"""
+        keys = [self._get_pack_key(row_index, row_data) for row_index, row_data, _, _, _ in pack]
+        names = []
+        for _, _, _, _, unresolved in pack:
+            names.extend(name for name in unresolved if name not in names)
+        rules = self.rule_engine.extract_field_rules(self.system_prompt, names)
+        parts = [f"以下共有{len(pack)}条焊接接头数据，请分别补全每条数据中本地规则无法确定的字段。"
+                 f"输出一个JSON对象，键为各条数据的编号（{'、'.join(keys)}），"
+                 f"值为该条数据需要补全的字段组成的JSON对象，不要遗漏任何一条。"]
+        parts.append("\n\n映射规则：\n" + "\n".join(rules.get(name, f"- {name}：参照同类数据推断") for name in names))
+        for key, (_, row_data, _, _, unresolved) in zip(keys, pack):
+            row_message, _ = self._build_user_message('', row_data)
+            parts.append(f"\n\n【编号：{key}】需要补全的字段：{'、'.join(unresolved)}{row_message}")
+        return ''.join(parts)
+
+    async def _generate_hybrid_pack(self, pack: list, message: str, complete: Callable):
+        """
+        打包请求一组行中规则无法确定的字段并与本地结果合并；缺少或无效的行拆分后重新请求，
+        只剩一行时单独混合生成，仍失败时完整生成
+        """
+        if not pack:
+            return
+        if len(pack) == 1:
+            row_index, row_data, cache_key, _, _ = pack[0]
+            response = await self._generate_hybrid_async(message, row_data)
+            if response is None:
+                await self._generate_pack([(row_index, row_data, cache_key)], message, complete)
+                return
+            if cache_key is not None:
+                self.response_cache.put(cache_key, response)
+            complete(row_index, row_data, response)
+            return
+
+        record = self.telemetry.start('hybrid', False, self.model_params.get('model'))
+        messages = [{"role": "system", "content": self.hybrid_system_prompt},
+                    {"role": "user", "content": self._build_packed_hybrid_message(pack)}]
+        try:
+            response = await self._request_completion(messages, record)
+        except Exception as e:
+            print(f"警告：打包混合生成请求失败，改为完整生成 - {str(e)}")
+            await self._generate_pack([(row_index, row_data, cache_key)
+                                       for row_index, row_data, cache_key, _, _ in pack], message, complete)
+            return
+        self.stats['packed_requests'] += 1
+
+        choice = response.choices[0]
+        data = decode_json_object(choice.message.content)
+        if data is None:
+            # 回复被截断时保留已完整输出的行
+            parser = StreamingJSONParser()
+            parser.feed(choice.message.content or '')
+            data = parser.data
+        missing = []
+        for item in pack:
+            row_index, row_data, cache_key, fields, unresolved = item
+            completed = data.get(self._get_pack_key(row_index, row_data))
+            row_response = self._merge_hybrid_fields(fields, unresolved, completed) \
+                if isinstance(completed, dict) else None
+            if row_response is None:
+                missing.append(item)
+                continue
+            if cache_key is not None:
+                self.response_cache.put(cache_key, row_response)
+            self.stats['packed_rows'] += 1
+            self.stats['hybrid'] += 1
+            complete(row_index, row_data, row_response)
+
+        if missing:
+            self.stats['packed_splits'] += 1
+            print(f"警告：打包混合生成缺少 {len(missing)}/{len(pack)} 行（结束原因：{choice.finish_reason}），拆分后重新请求")
+            middle = (len(missing) + 1) // 2
+            await asyncio.gather(self._generate_hybrid_pack(missing[:middle], message, complete),
+                                 self._generate_hybrid_pack(missing[middle:], message, complete))
+
+    async def _request(self, messages: list, record: Optional[Dict[str, Any]] = None) -> str:
+        """发送单个请求并返回回复内容"""
+        response = await self._request_completion(messages, record)
+        return response.choices[0].message.content
+
+    async def _request_completion(self, messages: list, record: Optional[Dict[str, Any]] = None):
+        """发送单个请求，可重试的错误按指数退避加抖动重试，结果写入调用记录"""
+        if record is None:
+            record = self.telemetry.start('generate', False, self.model_params.get('model'))
+        # 信号量与事件循环绑定，每次 asyncio.run 都会创建新的事件循环
+        loop = asyncio.get_running_loop()
+        if self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+            # 共用当前事件循环的HTTP连接池；重试由本类统一处理，关闭 SDK 自带的重试
+            self.async_client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0,
+                                            timeout=self.timeout, http_client=SharedHTTPPool.get_async_client())
+
+        self.telemetry.mark_queue(record)
+        async with self._semaphore:
+            self.stats['requests'] += 1
+            self.telemetry.mark_request(record)
+            start_time = time.perf_counter()
+            attempt = 0
+            while True:
+                try:
+                    response = await asyncio.wait_for(
+                        self.async_client.chat.completions.create(messages=messages, **self.model_params),
+                        timeout=self.timeout
+                    )
+                    self.telemetry.mark_response(record)
+                    self.latencies.append(time.perf_counter() - start_time)
+                    self.stats['succeeded'] += 1
+                    self._record_usage(response.usage)
+                    self.telemetry.finish(record, usage=response.usage)
+                    return response
+                except Exception as e:
+                    if attempt >= self.max_retries or not self._is_retryable(e):
+                        self.stats['failed'] += 1
+                        self.telemetry.finish(record, 'error', error=e)
+                        raise
+                    # 全抖动退避：在 [0, min(上限, 基准 * 2^attempt)] 内随机等待，避免并发请求同时重试
+                    delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                    print(f"警告：请求失败，{delay:.2f}秒后第{attempt + 1}次重试 - {str(e) or type(e).__name__}")
+                    attempt += 1
+                    record['retries'] = attempt
+                    self.stats['retries'] += 1
+                    await asyncio.sleep(delay)
+
+    def _record_usage(self, usage):
+        """累计提示词token数及命中接口前缀缓存的token数"""
+        cache_hit_tokens, _ = get_prompt_cache_tokens(usage)
+        self.stats['prompt_tokens'] += getattr(usage, 'prompt_tokens', None) or 0
+        self.stats['cache_hit_tokens'] += cache_hit_tokens or 0
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        return isinstance(error, asyncio.TimeoutError) or DeepSeekClient._is_retryable(error)
+
+    def get_report(self) -> Dict[str, Any]:
+        """汇总吞吐量和请求延迟分布（p50/p95/p99）"""
+        elapsed = 0.0
+        if self._started_at is not None:
+            elapsed = (self._finished_at or time.perf_counter()) - self._started_at
+        completed = self.stats['succeeded'] + self.stats['local'] + self.stats['cached']
+        report = dict(self.stats)
+        report['elapsed'] = elapsed
+        report['rows_per_second'] = completed / elapsed if elapsed > 0 else 0.0
+        report['latency'] = summarize_latencies(self.latencies)
+        report['cache_hit_rate'] = (self.stats['cache_hit_tokens'] / self.stats['prompt_tokens']
+                                    if self.stats['prompt_tokens'] else 0.0)
+        return report
+
+    def print_report(self):
+        """打印并发请求统计"""
+        report = self.get_report()
+        latency = report['latency']
+        print(f"并发请求统计：请求 {report['requests']} 次，成功 {report['succeeded']}，失败 {report['failed']}，"
+              f"重试 {report['retries']} 次，本地规则 {report['local']}，缓存命中 {report['cached']}；"
+              f"耗时 {report['elapsed']:.2f} 秒，吞吐量 {report['rows_per_second']:.2f} 行/秒")
+        print(f"请求延迟：p50 {latency['p50']:.3f}秒，p95 {latency['p95']:.3f}秒，p99 {latency['p99']:.3f}秒，"
+              f"最大 {latency['max']:.3f}秒")
+        if report['packed_requests']:
+            print(f"打包请求：{report['packed_requests']} 次，生成 {report['packed_rows']} 行，拆分重试 {report['packed_splits']} 次")
+        if report['hybrid']:
+            print(f"混合生成：{report['hybrid']} 行（本地规则 + 大模型补全部分字段）")
+        print(f"提示词token：共 {report['prompt_tokens']}，命中前缀缓存 {report['cache_hit_tokens']}"
+              f"（{report['cache_hit_rate']:.0%}）")
+        SharedHTTPPool.print_stats()
+        self.telemetry.print_summary(self.telemetry.records)
+
+
+if __name__ == "__main__":
+    # 并发压测，例如：python async_deepseek_client.py 200 16 [http://127.0.0.1:8765]
+    # 未指定服务器地址时启动内置桩服务器（首个token延迟 0.3 秒、120 token/秒，5% 的 429 和 2% 的 500，随机种子固定）
+    import sys
+    from excel_parser import ExcelParser
+    from mock_server import MockChatServer
+
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    mock_server = None
+    if len(sys.argv) > 3:
+        base_url = sys.argv[3]
+    else:
+        mock_server = MockChatServer(port=0, ttft=0.3, tokens_per_second=120.0, jitter=0.2, error_rate=0.02,
+                                     rate_limit_rate=0.05, seed=0).start()
+        base_url = mock_server.base_url
+
+    sample_rows = list(ExcelParser().iter_excel_rows("data/底架焊接接头清单.xlsx"))
+    rows = [(i, sample_rows[i % len(sample_rows)][1]) for i in range(row_count)]
+
+    client = AsyncDeepSeekClient(api_key="benchmark", base_url=base_url, max_concurrency=concurrency)
+    # 压测只统计网络请求：关闭本地规则引擎和回复缓存
+    client.use_local_rules = False
+    client.response_cache.enabled = False
+    client.run_many(rows, "请参照现有知识，生成焊接工艺规程。")
+    client.print_report()
+    if mock_server is not None:
+        print(f"桩服务器统计: {mock_server.stats}")
+        mock_server.stop()
@@ -0,0 +1,253 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from excel_parser import ExcelParser
+from helper.os_helper import make_doc_file_name, make_sure_path
+
+DEFAULT_BATCH_MESSAGE = "请参照现有知识，生成焊接工艺规程。"
+
+# 工作进程（或工作线程）内的状态，每个进程或线程初始化一次
+_worker_state = threading.local()
+
+
+def _init_worker(template_path: str, save_dir: str, api_key: str, base_url: str, message: str,
+                 optimize_images: bool = False):
+    """
+    工作进程（或工作线程）初始化：每个进程或线程创建一个客户端，供其处理的所有行复用。
+    客户端在第一行需要请求大模型时才建立接口连接，全部由本地规则生成时不需要API密钥
+    """
+    from deepseek_client import DeepSeekClient
+
+    _worker_state.client = DeepSeekClient(api_key=api_key, base_url=base_url)
+    _worker_state.template_path = template_path
+    _worker_state.save_dir = save_dir
+    _worker_state.message = message
+    _worker_state.optimize_images = optimize_images
+
+
+def _make_context():
+    """为一份文档创建渲染上下文，图片优化设置属于本批次，不影响同一进程中的其他任务"""
+    from render_context import RenderContext
+    from template_analyzer import TemplateAnalyzer
+
+    return RenderContext(_worker_state.template_path, TemplateAnalyzer.registered_labels,
+                         optimize_images=_worker_state.optimize_images)
+
+
+def _generate_row(row_index: int, row_data: Dict[str, Any], file_name: str) -> str:
+    """在工作进程（或工作线程）中为单行数据计算工艺参数、生成数据并渲染文档，返回文档保存路径"""
+    client = _worker_state.client
+
+    # 先校验厚度信息，无法计算工艺参数的行直接判定为失败
+    client.wps_calculator.calculate_welding_parameters(row_data)
+
+    # 每行都是独立的生成任务，不携带其他行的对话历史；流式生成，模板分析和字段插入与生成同时进行
+    client.reset_conversation()
+    save_path = os.path.join(_worker_state.save_dir, f"{file_name}.docx")
+    client.chat_and_render(_worker_state.template_path, save_path, _worker_state.message,
+                           excel_data=row_data, echo=False, context=_make_context())
+    return save_path
+
+
+def _render_row(json_text: str, file_name: str) -> str:
+    """在工作进程（或工作线程）中将大模型输出的JSON文本渲染为文档，返回文档保存路径"""
+    from data_loader import LLMDataLoader
+    from main import match
+
+    data = LLMDataLoader(json_text).load_data()
+    if not data or '工艺规程编号' not in data:
+        raise ValueError(f"无法解析大模型输出: {json_text[:100]}")
+
+    save_path = os.path.join(_worker_state.save_dir, f"{file_name}.docx")
+    match(_worker_state.template_path, save_path, data, _make_context())
+    return save_path
+
+
+class BatchGenerator:
+    """整表批量生成器：为焊接接头清单的每一行生成一份焊接工艺规程文档，多进程（或多线程）并行处理"""
+
+    def __init__(self, template_path: str, save_dir: str, api_key: Optional[str] = None,
+                 base_url: str = "https://api.deepseek.com", message: str = DEFAULT_BATCH_MESSAGE,
+                 max_workers: Optional[int] = None, llm_concurrency: Optional[int] = None,
+                 rows_per_request: Optional[int] = None, use_threads: bool = False, optimize_images: bool = False):
+        """
+        Args:
+            template_path: 模板文件路径
+            save_dir: 文档保存目录
+            api_key: DeepSeek API密钥，默认读取环境变量 DEEPSEEK_API_KEY
+            base_url: API基础URL
+            message: 每行发送给大模型的生成指令
+            max_workers: 工作进程数，默认为本机CPU核数
+            llm_concurrency: 设置后在主进程中用异步客户端并发请求大模型（最多同时进行的请求数），
+                工作进程只负责渲染文档；未设置时每个工作进程同步请求并渲染各自的行
+            rows_per_request: 设置后将多行打包到一次请求中（最多打包的行数，按输出token数自适应），
+                分摊系统提示词和请求开销；打包请求同样在主进程中异步并发，并发数为 llm_concurrency（默认 4）
+            use_threads: 在当前进程中用线程池代替进程池生成文档（每个文档使用独立的渲染上下文），
+                省去工作进程的启动和模板加载开销，适合大模型请求占主要耗时或不便创建子进程的场合
+            optimize_images: 嵌入前将图片缩小到最终尺寸所需的分辨率并重新压缩（需要 Pillow），
+                处理结果缓存在 data/.image_cache 中
+        """
+        self.template_path = template_path
+        self.save_dir = save_dir
+        self.api_key = api_key if api_key is not None else os.getenv("DEEPSEEK_API_KEY")
+        self.base_url = base_url
+        self.message = message
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.llm_concurrency = llm_concurrency
+        self.rows_per_request = rows_per_request
+        self.use_threads = use_threads
+        self.optimize_images = optimize_images
+        if optimize_images:
+            from helper.image_optimizer import ImageOptimizer
+            if not ImageOptimizer.is_available():
+                print("警告：未安装 Pillow，无法优化图片，继续嵌入原图")
+                self.optimize_images = False
+
+    def generate_from_excel(self, file_path: str) -> Dict[str, Any]:
+        """流式读取Excel文件并为其中每一行生成文档，后续行仍在读取时前面的行已开始生成"""
+        return self.generate(ExcelParser().iter_excel_rows(file_path))
+
+    def generate(self, rows: Iterable[Tuple[int, Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        为每一行数据生成文档
+
+        Args:
+            rows: (行号, 行数据字典) 的可迭代对象
+
+        Returns:
+            Dict: 批量生成结果，包括成功数量、失败行列表、耗时和吞吐量（文档/秒）
+        """
+        make_sure_path(self.save_dir)
+        start_time = time.perf_counter()
+
+        outputs = []
+        failed_rows = []
+        used_names = set()
+        executor_class = ThreadPoolExecutor if self.use_threads else ProcessPoolExecutor
+        with executor_class(max_workers=self.max_workers, initializer=_init_worker,
+                            initargs=(self.template_path, self.save_dir, self.api_key, self.base_url,
+                                      self.message, self.optimize_images)) as executor:
+            futures = {}
+            if self.rows_per_request:
+                asyncio.run(self._request_packed(rows, executor, futures, failed_rows, used_names))
+            elif self.llm_concurrency:
+                asyncio.run(self._request_async(rows, executor, futures, failed_rows, used_names))
+            else:
+                for row_index, row_data in rows:
+                    file_name = self._make_file_name(row_data, row_index, used_names)
+                    futures[executor.submit(_generate_row, row_index, row_data, file_name)] = (row_index, row_data)
+
+            for future in as_completed(futures):
+                row_index, row_data = futures[future]
+                try:
+                    outputs.append(future.result())
+                except Exception as e:
+                    failed_rows.append({'row': row_index, 'wps': row_data.get('WPS'), 'error': str(e)})
+
+        elapsed = time.perf_counter() - start_time
+        failed_rows.sort(key=lambda r: r['row'])
+        result = {
+            'total': len(outputs) + len(failed_rows),
+            'succeeded': len(outputs),
+            'failed_rows': failed_rows,
+            'outputs': outputs,
+            'elapsed': elapsed,
+            'docs_per_second': len(outputs) / elapsed if elapsed > 0 else 0.0
+        }
+        self.print_result(result)
+        if self.use_threads:
+            # 线程池中的各个文档共用本进程的图片缓存
+            from helper.image_cache import ImageCache
+            from helper.image_optimizer import ImageOptimizer
+            ImageCache.print_stats()
+            if self.optimize_images:
+                ImageOptimizer.print_stats()
+        return result
+
+    async def _request_async(self, rows: Iterable[Tuple[int, Dict[str, Any]]], executor: Executor,
+                             futures: dict, failed_rows: list, used_names: set):
+        """并发请求大模型，每行得到JSON文本后立即提交给工作进程（或工作线程）渲染"""
+        from async_deepseek_client import AsyncDeepSeekClient
+
+        client = AsyncDeepSeekClient(api_key=self.api_key, base_url=self.base_url, max_concurrency=self.llm_concurrency)
+
+        async def request_row(row_index, row_data, file_name):
+            try:
+                # 先校验厚度信息，无法计算工艺参数的行直接判定为失败
+                client.wps_calculator.calculate_welding_parameters(row_data)
+                json_text = await client.generate(self.message, excel_data=row_data)
+            except Exception as e:
+                failed_rows.append({'row': row_index, 'wps': row_data.get('WPS'), 'error': str(e)})
+                return
+            futures[executor.submit(_render_row, json_text, file_name)] = (row_index, row_data)
+
+        # 有界队列：读取的行最多领先正在请求的行 llm_concurrency 行，后续行仍在读取时前面的行已开始请求
+        queue = asyncio.Queue(maxsize=self.llm_concurrency)
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                await request_row(*item)
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(self.llm_concurrency)]
+        for row_index, row_data in rows:
+            await queue.put((row_index, row_data, self._make_file_name(row_data, row_index, used_names)))
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+        client.print_report()
+
+    async def _request_packed(self, rows: Iterable[Tuple[int, Dict[str, Any]]], executor: Executor,
+                              futures: dict, failed_rows: list, used_names: set):
+        """多行打包请求大模型，每行得到JSON文本后立即提交给工作进程（或工作线程）渲染"""
+        from async_deepseek_client import AsyncDeepSeekClient
+
+        client = AsyncDeepSeekClient(api_key=self.api_key, base_url=self.base_url,
+                                     max_concurrency=self.llm_concurrency or 4)
+
+        # 逐行校验并交给打包生成，后续行仍在读取时前面的行已开始请求
+        file_names = {}
+
+        def valid_rows():
+            for row_index, row_data in rows:
+                try:
+                    # 先校验厚度信息，无法计算工艺参数的行直接判定为失败
+                    client.wps_calculator.calculate_welding_parameters(row_data)
+                except Exception as e:
+                    failed_rows.append({'row': row_index, 'wps': row_data.get('WPS'), 'error': str(e)})
+                    continue
+                file_names[row_index] = self._make_file_name(row_data, row_index, used_names)
+                yield row_index, row_data
+
+        def on_result(row_index, row_data, json_text, error):
+            file_name = file_names.pop(row_index)
+            if error is not None:
+                failed_rows.append({'row': row_index, 'wps': row_data.get('WPS'), 'error': error})
+                return
+            futures[executor.submit(_render_row, json_text, file_name)] = (row_index, row_data)
+
+        await client.generate_packed(valid_rows(), self.message, max_rows=self.rows_per_request, on_result=on_result)
+        client.print_report()
+
+    @staticmethod
+    def _make_file_name(row_data: Dict[str, Any], row_index: int, used_names: set) -> str:
+        """同一批次中工艺规程编号重复时追加行号，避免互相覆盖"""
+        file_name = make_doc_file_name(row_data.get('WPS'))
+        if file_name in used_names:
+            file_name = f"{file_name}_{row_index + 1}"
+        used_names.add(file_name)
+        return file_name
+
+    @staticmethod
+    def print_result(result: Dict[str, Any]):
+        """打印批量生成结果摘要"""
+        print(f"批量生成完成：共 {result['total']} 行，成功 {result['succeeded']} 份，失败 {len(result['failed_rows'])} 行，"
+              f"耗时 {result['elapsed']:.1f} 秒，吞吐量 {result['docs_per_second']:.2f} 份/秒")
+        for failed in result['failed_rows']:
+            print(f"  第{failed['row'] + 1}行（WPS: {failed['wps']}）生成失败: {failed['error']}")
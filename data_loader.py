@@ -1,7 +1,7 @@
 from abc import ABCMeta, abstractmethod
 from typing import Union
-import json
-import re
+
+from helper.json_helper import decode_label_data
 
 
 class DataLoader(metaclass=ABCMeta):
@@ -34,36 +34,11 @@ class LLMDataLoader(DataLoader):
     """处理大模型输出的数据加载器"""
 
     def __init__(self, llm_output: str):
-        # 提取JSON部分内容
-        json_match = re.search(r'```json\s*(.*?)\s*```', llm_output, re.DOTALL)
-        if json_match:
-            # 找到了JSON代码块
-            json_str = json_match.group(1)
-        else:
-            # 没有找到JSON代码块，使用整个输出
-            json_str = llm_output
-        
-        # 将Python风格的单引号转换为双引号的JSON
-        json_str = json_str.replace("'", '"')
-        
-        try:
-            # 首先尝试标准JSON解析
-            data = json.loads(json_str)
-            # 转换数据格式以匹配原有的格式
+        # 解析输出中的第一个JSON对象（兼容```json代码块及常见格式问题），两个元素的列表转换为元组
+        self.data = decode_label_data(llm_output)
+        if self.data is None:
+            print(f"无法解析LLM输出内容: {llm_output[:100] if llm_output else llm_output}")
             self.data = {}
-            for tag, value in data.items():
-                if isinstance(value, list) and len(value) == 2:
-                    self.data[tag] = tuple(value)
-                else:
-                    self.data[tag] = value
-        except json.JSONDecodeError:
-            # 如果标准JSON解析失败，尝试使用eval（更安全的做法）
-            try:
-                self.data = eval(json_str)
-            except Exception as e:
-                # 如果都失败，打印错误并使用空字典
-                print(f"无法解析LLM输出内容: {str(e)}")
-                self.data = {}
         
         # 添加默认图片数据（仅当大模型输出中没有相应图片数据时）
         self._add_default_image_data()
@@ -96,3 +71,41 @@ class LLMDataLoader(DataLoader):
             return None
         self.loaded = True
         return self.data
+
+
+if __name__ == "__main__":
+    # 基准测试：含大型焊接工艺参数表的输出，对比旧的解析方式（正则提取代码块、替换单引号后 json.loads）
+    import json
+    import re
+    import time
+
+    def legacy_decode(llm_output: str) -> dict:
+        json_match = re.search(r'```json\s*(.*?)\s*```', llm_output, re.DOTALL)
+        json_str = json_match.group(1) if json_match else llm_output
+        data = json.loads(json_str.replace("'", '"'))
+        return {tag: tuple(value) if isinstance(value, list) and len(value) == 2 else value
+                for tag, value in data.items()}
+
+    header = ["焊道", "焊接方法", "焊材规格(mm)", "电流强度(A)", "电弧电压(V)", "电流种类/极性",
+              "送丝速度(m/min)", "焊接速度*(mm/s)", "热输入*(KJ/mm)"]
+    row = ["1-PB", "t131", "Φ1.2", "200~220", "23.5~23.8", "DCEP/+", "12.7~13.8", "8~11.5", "0.33~0.52"]
+    for row_count in [10, 1000, 10000, 50000]:
+        payload = {"工艺规程编号": "G/TS-AL1-100-43054", "焊前准备": "用清洗剂去除油污/用打磨方法去除氧化膜",
+                   "焊接工艺参数": [header] + [row] * row_count}
+        output = "```json\n" + json.dumps(payload, ensure_ascii=False, indent=4) + "\n```"
+        # 模型常见的格式问题：数组末尾多余的逗号
+        glitched = output.replace('"0.33~0.52"\n        ]', '"0.33~0.52",\n        ]')
+        repeat = max(1, 20000 // row_count)
+
+        results = {}
+        for name, func, text in [("旧方式", legacy_decode, output),
+                                 ("新方式", decode_label_data, output),
+                                 ("新方式（需修复）", decode_label_data, glitched)]:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                data = func(text)
+            results[name] = (time.perf_counter() - start) / repeat * 1000
+            assert data["焊接工艺参数"] == payload["焊接工艺参数"]
+
+        print(f"参数表 {row_count} 行（{len(output) / 1024:.0f} KB）: " +
+              "，".join(f"{name} {elapsed:.2f}ms" for name, elapsed in results.items()))
@@ -1,23 +1,74 @@
+import hashlib
 import json
-from typing import Optional, Dict, Any
+import random
+import time
+from typing import TYPE_CHECKING, Optional, Dict, Any, Callable
+import openai
 from openai import OpenAI
 from wps_calculator import WPSCalculator
+from wps_rules import WPSRuleEngine
+from llm_cache import LLMResponseCache
+from history_manager import HistoryManager
+from helper.token_helper import estimate_messages_tokens, get_prompt_cache_tokens
+from helper.stream_json import StreamingJSONParser
+from helper.json_helper import decode_json_object
+from http_pool import SharedHTTPPool
+from llm_telemetry import LLMTelemetry
+
+if TYPE_CHECKING:
+    from render_context import RenderContext
 
 class DeepSeekClient:
-    def __init__(self, api_key: str, base_url: str = "https://api.deepseek.com"):
+    def __init__(self, api_key: str, base_url: str = "https://api.deepseek.com", history_token_budget: int = 4000):
         """
         初始化DeepSeek客户端
         
         Args:
             api_key: DeepSeek API密钥
             base_url: API基础URL
+            history_token_budget: 每轮发送的历史消息token预算
         """
-        self.client = OpenAI(
-            api_key=api_key,
-            base_url=base_url
-        )
+        self.api_key = api_key
+        self.base_url = base_url
+        self._client = None  # 首次请求大模型时创建，本地规则即可生成的数据不需要API密钥
+        self.max_retries = 2  # 可重试的错误（429/5xx、超时、连接错误）的最大重试次数
+        self.backoff_base = 0.5  # 退避基准时间（秒）
+        self.backoff_max = 10.0  # 单次退避的最长等待时间（秒）
+        self.telemetry = LLMTelemetry()  # 每次调用的延迟和token用量指标
         self.conversation_history = []
+        self.history_manager = HistoryManager(history_token_budget)  # 按token预算压缩发送的历史消息
+        self.turn_stats = []  # 每轮请求的提示词token统计
         self.wps_calculator = WPSCalculator()  # 初始化焊接工艺参数计算器
+        self.rule_engine = WPSRuleEngine(self.wps_calculator)  # 本地映射规则引擎
+        self.use_local_rules = True  # 首轮生成时优先由本地规则引擎生成数据
+        # 规则引擎无法确定部分字段时，只请求大模型生成这些字段并与本地结果合并
+        self.use_hybrid = True
+        self.hybrid_max_unresolved = 12  # 未解析字段超过该数量时直接完整生成
+        self.hybrid_system_prompt = '''你负责补全焊接工艺规程JSON中本地规则无法确定的字段。用户会提供需要补全的字段、这些字段的映射规则和Excel行数据。
+
+要求：
+1. 只输出需要补全的字段组成的JSON对象，字段名与给出的字段名完全一致，不要输出其他字段
+2. 严格按照映射规则取值；规则没有覆盖的情况，参照规则中最接近的情形推断
+3. "焊接工艺参数"为包含表头的二维数组，其余字段均为字符串，多行内容用换行符分隔
+4. 不要输出```json标记、说明或其他额外内容'''
+        # 视为标准生成指令的消息，其他消息（如修改指令）交由大模型处理
+        self.generation_messages = {"请参照现有知识，生成焊接工艺规程。"}
+        # JSON模式：接口保证输出为合法的JSON对象
+        self.model_params = {"model": "deepseek-chat", "temperature": 0.2, "max_tokens": 8192,
+                             "response_format": {"type": "json_object"}}
+        self.response_cache = LLMResponseCache()  # 大模型回复磁盘缓存
+        # 固定示例消息（成对的 user/assistant），紧跟系统提示词，与其一起构成逐字节不变的请求前缀
+        self.prefix_examples = []
+        self.use_patch_mode = True  # 修改轮次只请求变更字段，在本地合并到最新的JSON
+        self.patch_system_prompt = '''你负责修改焊接工艺规程JSON。用户会提供当前的完整JSON和一条修改指令。
+
+要求：
+1. 只输出需要修改的字段组成的JSON对象，例如 {"预热温度": "100~120"}，未修改的字段不要输出
+2. 字段名必须与当前JSON中的字段名完全一致，不要新增字段
+3. 字段值的类型和格式与当前JSON保持一致；"焊接工艺参数"为二维数组，修改时输出包含表头的完整二维数组
+4. 修改某字段后，依赖该字段的其他字段（如焊接位置对应的工艺编号和焊接工艺参数数据行）需一并修改
+5. 严格按照用户的修改要求进行精确修改，不要自行推断或扩展
+6. 不要输出```json标记、修改说明或其他额外内容'''
         self.system_prompt = '''请基于以下输入数据字典，按照指定的映射规则生成焊接工艺参数，输出格式必须为JSON对象结构：
 
 映射规则说明：
@@ -194,12 +245,30 @@ t2: [t2厚度]"
     def set_system_prompt(self, prompt: str):
         """设置系统提示词"""
         self.system_prompt = prompt
+        # 自定义系统提示词的映射规则可能与本地规则引擎不一致，改由大模型生成
+        self.use_local_rules = False
     
+    @property
+    def client(self) -> OpenAI:
+        """OpenAI 客户端，首次请求大模型时创建"""
+        if self._client is None:
+            # 所有客户端共用进程内的HTTP连接池，复用已建立的连接；重试由本类处理以便记录重试次数
+            self._client = OpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=SharedHTTPPool.get_client(),
+                max_retries=0
+            )
+        return self._client
+
     def reset_conversation(self):
         """重置对话历史"""
         self.conversation_history = []
+        self.turn_stats = []
     
-    def chat(self, message: str, excel_data: Optional[Dict[str, Any]] = None, stream: bool = False) -> str:
+    def chat(self, message: str, excel_data: Optional[Dict[str, Any]] = None, stream: bool = False,
+             use_cache: bool = True, on_field: Optional[Callable[[str, Any], None]] = None,
+             echo: bool = True) -> str:
         """
         发送消息到DeepSeek API
         
@@ -207,83 +276,431 @@ t2: [t2厚度]"
             message: 用户消息
             excel_data: Excel解析的数据字典
             stream: 是否使用流式响应
+            use_cache: 是否使用回复缓存（存在对话历史的修改轮次始终不使用缓存）
+            on_field: 字段回调，JSON顶层字段的值完整后立即以 (字段名, 字段值) 调用，流式响应时边生成边回调
+            echo: 流式响应时是否打印回复内容
             
         Returns:
             AI回复内容
         """
+        # 修改轮次优先只请求变更字段（单独记录为 patch 调用），补丁无效时再完整重新生成
+        if self.use_patch_mode and self.conversation_history:
+            patched_response = self._chat_patch(message)
+            if patched_response is not None:
+                return self._deliver_response(patched_response, stream and echo, on_field)
+
+        # 首轮标准生成指令优先使用本地规则引擎，规则全部可确定时无需调用大模型
+        record = self.telemetry.start('generate', stream, self.model_params.get('model'))
+        local_response = self._generate_locally(message, excel_data)
+        if local_response is not None:
+            self.conversation_history.append({"role": "user", "content": message})
+            self.conversation_history.append({"role": "assistant", "content": local_response})
+            self.telemetry.finish(record, source='local')
+            return self._deliver_response(local_response, stream and echo, on_field)
+
         # 构建完整的用户消息
-        full_message = message
-        if excel_data:
-            # 使用焊接工艺参数计算器处理Excel数据
-            try:
-                processed_data = self.wps_calculator.process_excel_data(excel_data)
-                excel_info = "\n\n以下是Excel文件解析的焊接参数数据（已包含计算的工艺参数）：\n"
-                excel_info += json.dumps(processed_data, ensure_ascii=False, indent=2)
-                
-                # 添加计算参数的说明
-                calc_params = {k: v for k, v in processed_data.items() if k not in excel_data}
-                if calc_params:
-                    excel_info += "\n\n计算得出的焊接工艺参数说明：\n"
-                    excel_info += self.wps_calculator.format_parameters_for_display(calc_params)
-                    
-            except Exception as e:
-                print(f"计算焊接工艺参数时发生错误: {str(e)}")
-                # 如果计算失败，使用原始数据
-                excel_info = "\n\n以下是Excel文件解析的焊接参数数据：\n"
-                excel_info += json.dumps(excel_data, ensure_ascii=False, indent=2)
-                
-            full_message += excel_info
+        full_message, cache_data = self._build_user_message(message, excel_data)
         
-        # 构建消息列表
-        messages = [
-            {"role": "system", "content": self.system_prompt}
-        ]
-        
-        # 添加历史对话
-        messages.extend(self.conversation_history)
-        
-        # 添加当前消息
-        messages.append({"role": "user", "content": full_message})
+        # 首轮生成可使用缓存；修改轮次的回复依赖对话历史，不读写缓存
+        cache_key = None
+        if use_cache and not self.conversation_history:
+            cache_key = self.response_cache.make_key(self._get_cache_prompt(), cache_data, message, self.model_params)
+            cached_response = self.response_cache.get(cache_key)
+            if cached_response is not None:
+                print(f"调试 - 命中大模型回复缓存（命中率 {self.response_cache.get_hit_rate():.0%}）")
+                self.conversation_history.append({"role": "user", "content": message})
+                self.conversation_history.append({"role": "assistant", "content": cached_response})
+                self.telemetry.finish(record, source='cache')
+                return self._deliver_response(cached_response, stream and echo, on_field)
+
+        # 规则引擎无法确定部分字段时，只请求这些字段并与本地结果合并
+        hybrid_response = self._generate_hybrid(message, excel_data, record)
+        if LLMTelemetry.is_finished(record):
+            # 混合生成请求失败时改为完整生成，完整生成的请求另行记录
+            record = self.telemetry.start('generate', stream, self.model_params.get('model'))
+        if hybrid_response is not None:
+            self.conversation_history.append({"role": "user", "content": message})
+            self.conversation_history.append({"role": "assistant", "content": hybrid_response})
+            if cache_key is not None:
+                self.response_cache.put(cache_key, hybrid_response)
+            return self._deliver_response(hybrid_response, stream and echo, on_field)
+
+        # 构建消息列表：固定前缀在前，当前行数据在最后
+        messages = self._build_messages(full_message)
         
         try:
-            response = self.client.chat.completions.create(
-                model="deepseek-chat",
-                messages=messages,
-                stream=stream,
-                temperature=0.2,
-                max_tokens=8192
-            )
+            request_params = dict(self.model_params)
+            if stream:
+                # 流式响应在最后一个数据块中返回token用量
+                request_params["stream_options"] = {"include_usage": True}
+            self.telemetry.mark_request(record)
+            response = self._create_completion(messages, record, stream=stream, **request_params)
             
             if stream:
                 # 处理流式响应
                 full_response = ""
+                usage = None
+                # 增量解析JSON，字段完整后立即回调，无需等待最后一个token
+                parser = StreamingJSONParser() if on_field else None
                 for chunk in response:
-                    if chunk.choices[0].delta.content is not None:
+                    if chunk.usage is not None:
+                        usage = chunk.usage
+                    if chunk.choices and chunk.choices[0].delta.content is not None:
                         content = chunk.choices[0].delta.content
+                        self.telemetry.mark_first_token(record)
                         full_response += content
-                        print(content, end="", flush=True)
-                print()  # 换行
+                        if echo:
+                            print(content, end="", flush=True)
+                        if parser is not None:
+                            for name, value in parser.feed(content):
+                                on_field(name, value)
+                self.telemetry.mark_response(record)
+                if echo:
+                    print()  # 换行
+                self._record_turn(messages, full_message, usage)
                 
                 # 保存到对话历史
                 self.conversation_history.append({"role": "user", "content": message})
                 self.conversation_history.append({"role": "assistant", "content": full_response})
+                if cache_key is not None:
+                    self.response_cache.put(cache_key, full_response)
+                self.telemetry.finish(record, usage=usage)
                 
                 return full_response
             else:
                 # 处理非流式响应
+                self.telemetry.mark_response(record)
                 assistant_message = response.choices[0].message.content
+                self._record_turn(messages, full_message, response.usage)
+                if on_field and assistant_message:
+                    self._deliver_response(assistant_message, False, on_field)
                 
                 # 保存到对话历史
                 self.conversation_history.append({"role": "user", "content": message})
                 self.conversation_history.append({"role": "assistant", "content": assistant_message})
+                if cache_key is not None and assistant_message:
+                    self.response_cache.put(cache_key, assistant_message)
+                self.telemetry.finish(record, usage=response.usage)
                 
                 return assistant_message
                 
         except Exception as e:
+            self.telemetry.finish(record, 'error', error=e)
             error_msg = f"调用DeepSeek API时发生错误: {str(e)}"
             print(error_msg)
             return error_msg
     
+    def _create_completion(self, messages: list, record: Optional[Dict[str, Any]] = None, **params):
+        """发送请求，可重试的错误按指数退避加随机抖动重试，重试次数计入调用记录"""
+        attempt = 0
+        while True:
+            try:
+                return self.client.chat.completions.create(messages=messages, **params)
+            except Exception as e:
+                if attempt >= self.max_retries or not self._is_retryable(e):
+                    raise
+                # 全抖动退避：在 [0, min(上限, 基准 * 2^attempt)] 内随机等待
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                print(f"警告：请求失败，{delay:.2f}秒后第{attempt + 1}次重试 - {str(e) or type(e).__name__}")
+                attempt += 1
+                if record is not None:
+                    record['retries'] = attempt
+                time.sleep(delay)
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+            return True
+        return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+    @staticmethod
+    def _deliver_response(response: str, echo: bool, on_field: Optional[Callable[[str, Any], None]]) -> str:
+        """输出未经流式接口得到的完整回复（本地规则、缓存、增量修改），并依次回调各字段"""
+        if echo:
+            print(response)
+        if on_field:
+            parser = StreamingJSONParser()
+            for name, value in parser.feed(response):
+                on_field(name, value)
+        return response
+
+    def _chat_patch(self, message: str) -> Optional[str]:
+        """
+        增量修改：只发送最新的JSON和修改指令，请求由变更字段组成的补丁并在本地合并
+
+        Returns:
+            合并后的完整JSON文本；无法获得有效补丁时返回None，由调用方完整重新生成
+        """
+        current = self._parse_json_object(self.get_last_response())
+        if current is None:
+            return None
+
+        patch_message = "当前JSON：\n" + json.dumps(current, ensure_ascii=False) + "\n\n修改指令：" + message
+        messages = [
+            {"role": "system", "content": self.patch_system_prompt},
+            {"role": "user", "content": patch_message}
+        ]
+        record = self.telemetry.start('patch', False, self.model_params.get('model'))
+        try:
+            self.telemetry.mark_request(record)
+            response = self._create_completion(messages, record, stream=False, **self.model_params)
+            self.telemetry.mark_response(record)
+            patch_text = response.choices[0].message.content
+        except Exception as e:
+            self.telemetry.finish(record, 'error', error=e)
+            print(f"警告：增量修改请求失败，改为完整重新生成 - {str(e)}")
+            return None
+
+        patch = self._parse_json_object(patch_text)
+        error = self._validate_patch(current, patch)
+        if error:
+            self.telemetry.finish(record, 'invalid', usage=response.usage)
+            print(f"警告：增量修改结果无效，改为完整重新生成 - {error}")
+            return None
+        self.telemetry.finish(record, usage=response.usage)
+
+        self._record_turn(messages, patch_message, response.usage)
+        print(f"调试 - 增量修改字段: {list(patch.keys())}")
+        updated = dict(current)
+        updated.update(patch)
+        updated_text = json.dumps(updated, ensure_ascii=False, indent=4)
+
+        self.conversation_history.append({"role": "user", "content": message})
+        self.conversation_history.append({"role": "assistant", "content": updated_text})
+        return updated_text
+
+    @staticmethod
+    def _parse_json_object(text: Optional[str]) -> Optional[Dict[str, Any]]:
+        """解析回复中的JSON对象（兼容```json代码块及常见格式问题），失败时返回None"""
+        return decode_json_object(text)
+
+    @staticmethod
+    def _validate_patch(current: Dict[str, Any], patch: Optional[Dict[str, Any]]) -> Optional[str]:
+        """校验补丁的字段名和值类型，有效时返回None，否则返回错误说明"""
+        if patch is None:
+            return "补丁不是JSON对象"
+        for key, value in patch.items():
+            if key not in current:
+                return f"未知字段 {key}"
+            original = current[key]
+            if isinstance(original, str):
+                if not isinstance(value, str):
+                    return f"字段 {key} 应为字符串"
+            elif isinstance(original, list):
+                if not isinstance(value, list) or not value or not all(isinstance(row, list) for row in value):
+                    return f"字段 {key} 应为二维数组"
+                # 表格的表头和列数需与原表格一致
+                if original and isinstance(original[0], list):
+                    if value[0] != original[0]:
+                        return f"字段 {key} 的表头与原表格不一致"
+                    if any(len(row) != len(original[0]) for row in value):
+                        return f"字段 {key} 的列数与表头不一致"
+            elif type(value) is not type(original):
+                return f"字段 {key} 的类型与原值不一致"
+        return None
+
+    def _build_messages(self, full_message: str) -> list:
+        """
+        构建请求消息：系统提示词和固定示例在前，对话历史其次，当前消息（含行数据）始终在最后。
+        同一系统提示词下各次请求的前缀逐字节一致，可命中接口的提示词前缀缓存
+        """
+        messages = self._get_prefix_messages()
+        # 添加历史对话（最新的JSON和最近的指令原样保留，更早的轮次按token预算合并）
+        messages.extend(self.history_manager.build(self.conversation_history))
+        messages.append({"role": "user", "content": full_message})
+        return messages
+
+    def _get_prefix_messages(self) -> list:
+        """请求的固定前缀：系统提示词和固定示例"""
+        return [{"role": "system", "content": self.system_prompt}] + [dict(m) for m in self.prefix_examples]
+
+    def _get_cache_prompt(self) -> str:
+        """计算回复缓存键使用的提示词：系统提示词，设置了固定示例时附加示例内容"""
+        if not self.prefix_examples:
+            return self.system_prompt
+        return self.system_prompt + json.dumps(self.prefix_examples, ensure_ascii=False, sort_keys=True)
+
+    @staticmethod
+    def _get_prefix_hash(messages: list) -> str:
+        """前缀消息的摘要，用于确认各次请求的前缀是否一致"""
+        content = json.dumps(messages, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()[:12]
+
+    def _record_turn(self, messages: list, full_message: str, usage):
+        """
+        记录本轮提示词token数：估算值、接口返回的实际值、不压缩历史时的估算值，
+        以及命中和未命中接口前缀缓存的token数
+        """
+        prefix = self._get_prefix_messages()
+        # 增量修改请求使用单独的系统提示词，前缀只有该系统消息
+        sent_prefix = prefix if messages[0].get('content') == self.system_prompt else messages[:1]
+        full_history = prefix + self.conversation_history
+        full_history.append({"role": "user", "content": full_message})
+        cache_hit_tokens, cache_miss_tokens = get_prompt_cache_tokens(usage)
+        stats = {
+            'turn': len(self.turn_stats) + 1,
+            'history_messages': len(messages) - len(sent_prefix) - 1,
+            'estimated_prompt_tokens': estimate_messages_tokens(messages),
+            'uncompressed_prompt_tokens': estimate_messages_tokens(full_history),
+            'prompt_tokens': getattr(usage, 'prompt_tokens', None),
+            'completion_tokens': getattr(usage, 'completion_tokens', None),
+            'cache_hit_tokens': cache_hit_tokens,
+            'cache_miss_tokens': cache_miss_tokens,
+            'prefix_hash': self._get_prefix_hash(sent_prefix)
+        }
+        self.turn_stats.append(stats)
+        print(f"调试 - 第{stats['turn']}轮提示词token数: 实际 {stats['prompt_tokens']}，估算 {stats['estimated_prompt_tokens']}"
+              f"（未压缩历史估算 {stats['uncompressed_prompt_tokens']}，历史消息 {stats['history_messages']} 条），"
+              f"前缀缓存命中 {cache_hit_tokens}，未命中 {cache_miss_tokens}")
+    
+    def _build_user_message(self, message: str, excel_data: Optional[Dict[str, Any]]):
+        """
+        将Excel数据及计算得到的工艺参数附加到用户消息后
+        
+        Returns:
+            tuple: (完整的用户消息, 用于计算缓存键的输入数据)
+        """
+        full_message = message
+        cache_data = excel_data
+        if excel_data:
+            # 使用焊接工艺参数计算器处理Excel数据
+            try:
+                processed_data = self.wps_calculator.process_excel_data(excel_data)
+                cache_data = processed_data
+                excel_info = "\n\n以下是Excel文件解析的焊接参数数据（已包含计算的工艺参数）：\n"
+                excel_info += json.dumps(processed_data, ensure_ascii=False, indent=2)
+                
+                # 添加计算参数的说明
+                calc_params = {k: v for k, v in processed_data.items() if k not in excel_data}
+                if calc_params:
+                    excel_info += "\n\n计算得出的焊接工艺参数说明：\n"
+                    excel_info += self.wps_calculator.format_parameters_for_display(calc_params)
+                    
+            except Exception as e:
+                print(f"计算焊接工艺参数时发生错误: {str(e)}")
+                # 如果计算失败，使用原始数据
+                excel_info = "\n\n以下是Excel文件解析的焊接参数数据：\n"
+                excel_info += json.dumps(excel_data, ensure_ascii=False, indent=2)
+                
+            full_message += excel_info
+        
+        return full_message, cache_data
+    
+    def _generate_locally(self, message: str, excel_data: Optional[Dict[str, Any]]) -> Optional[str]:
+        """
+        使用本地规则引擎生成JSON文本
+
+        仅在存在Excel数据、没有对话历史（非修改轮次）且消息为标准生成指令时生效；
+        存在规则无法确定的字段时返回None，由大模型生成
+        """
+        if not self.use_local_rules or not excel_data or self.conversation_history:
+            return None
+        if message.strip() not in self.generation_messages:
+            return None
+
+        payload = self.rule_engine.build_payload(excel_data)
+        if payload is None:
+            return None
+        return json.dumps(payload, ensure_ascii=False, indent=4)
+
+    def _resolve_hybrid_fields(self, message: str, excel_data: Optional[Dict[str, Any]]):
+        """
+        由规则引擎解析可确定的字段，仅在满足本地规则引擎的使用条件且存在少量未解析字段时生效
+
+        Returns:
+            tuple: (已解析字段, 未解析字段名列表)，不适用混合生成时返回None
+        """
+        if not self.use_hybrid or not self.use_local_rules or not excel_data or self.conversation_history:
+            return None
+        if message.strip() not in self.generation_messages:
+            return None
+
+        fields, unresolved = self.rule_engine.resolve(excel_data)
+        if not unresolved or len(unresolved) > self.hybrid_max_unresolved:
+            return None
+        return fields, unresolved
+
+    def _build_hybrid_request(self, message: str, excel_data: Optional[Dict[str, Any]]):
+        """
+        构建混合生成请求：由规则引擎解析可确定的字段，只将未解析字段的名称、映射规则和行数据发送给大模型
+
+        Returns:
+            tuple: (已解析字段, 未解析字段名列表, 请求消息)，不适用时返回None
+        """
+        resolved = self._resolve_hybrid_fields(message, excel_data)
+        if resolved is None:
+            return None
+        fields, unresolved = resolved
+
+        rules = self.rule_engine.extract_field_rules(self.system_prompt, unresolved)
+        row_message, _ = self._build_user_message('', excel_data)
+        content = "需要补全的字段：" + "、".join(unresolved)
+        content += "\n\n映射规则：\n" + "\n".join(rules.get(name, f"- {name}：参照同类数据推断") for name in unresolved)
+        content += row_message
+        messages = [
+            {"role": "system", "content": self.hybrid_system_prompt},
+            {"role": "user", "content": content}
+        ]
+        return fields, unresolved, messages
+
+    def _merge_hybrid_reply(self, fields: Dict[str, Any], unresolved: list, reply: Optional[str]) -> Optional[str]:
+        """将大模型补全的字段与本地解析的字段按输出结构顺序合并，补全结果无效时返回None"""
+        completed = self._parse_json_object(reply)
+        if completed is None:
+            print("警告：混合生成结果不是JSON对象，改为完整生成")
+            return None
+        return self._merge_hybrid_fields(fields, unresolved, completed)
+
+    def _merge_hybrid_fields(self, fields: Dict[str, Any], unresolved: list,
+                             completed: Dict[str, Any]) -> Optional[str]:
+        """将已解析为字典的补全字段与本地解析的字段合并，补全结果无效时返回None"""
+        merged = dict(fields)
+        for name in unresolved:
+            value = completed.get(name)
+            if name == "焊接工艺参数":
+                if not isinstance(value, list) or not value or value[0] != self.rule_engine.PARAMETER_TABLE_HEADER:
+                    print(f"警告：混合生成的字段 {name} 无效，改为完整生成")
+                    return None
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                value = str(value)
+            elif not isinstance(value, str):
+                print(f"警告：混合生成缺少字段 {name}，改为完整生成")
+                return None
+            merged[name] = value
+        print(f"调试 - 混合生成: 本地解析 {len(fields)} 个字段，大模型补全 {unresolved}")
+        ordered = {name: merged[name] for name in self.rule_engine.FIELD_ORDER if name in merged}
+        return json.dumps(ordered, ensure_ascii=False, indent=4)
+
+    def _generate_hybrid(self, message: str, excel_data: Optional[Dict[str, Any]],
+                         record: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        混合生成：本地解析可确定的字段，大模型只补全其余字段，失败时返回None由调用方完整生成
+
+        Args:
+            record: 本次调用的遥测记录，发出请求时改记为 hybrid 调用并由本方法结束，默认新建
+        """
+        request = self._build_hybrid_request(message, excel_data)
+        if request is None:
+            return None
+        fields, unresolved, messages = request
+
+        if record is None:
+            record = self.telemetry.start('hybrid', False, self.model_params.get('model'))
+        record['kind'] = 'hybrid'
+        record['stream'] = False
+        try:
+            self.telemetry.mark_request(record)
+            response = self._create_completion(messages, record, stream=False, **self.model_params)
+            self.telemetry.mark_response(record)
+        except Exception as e:
+            self.telemetry.finish(record, 'error', error=e)
+            print(f"警告：混合生成请求失败，改为完整生成 - {str(e)}")
+            return None
+
+        merged = self._merge_hybrid_reply(fields, unresolved, response.choices[0].message.content)
+        self.telemetry.finish(record, 'success' if merged is not None else 'invalid', usage=response.usage)
+        return merged
+
     def get_last_response(self) -> Optional[str]:
         """获取最后一次AI回复"""
         if self.conversation_history and self.conversation_history[-1]["role"] == "assistant":
@@ -294,6 +711,34 @@ t2: [t2厚度]"
         """获取完整对话历史"""
         return self.conversation_history.copy()
     
+    def chat_and_render(self, template_path: str, save_path: str, message: str,
+                        excel_data: Optional[Dict[str, Any]] = None, echo: bool = True,
+                        context: Optional['RenderContext'] = None) -> str:
+        """流式生成并渲染文档：模板分析和已完成字段的插入与大模型生成同时进行
+
+        Args:
+            template_path: 模板文件路径
+            save_path: 保存文件路径
+            message: 用户消息
+            excel_data: Excel解析的数据字典
+            echo: 是否打印回复内容
+            context: 本次生成的渲染上下文，默认按当前注册的标签新建
+
+        Returns:
+            AI回复内容
+        """
+        from data_loader import LLMDataLoader
+        from stream_renderer import StreamingDocumentRenderer
+
+        renderer = StreamingDocumentRenderer(template_path, context)
+        json_text = self.chat(message, excel_data=excel_data, stream=True, on_field=renderer.add_field, echo=echo)
+
+        data = LLMDataLoader(json_text).load_data()
+        if not data or '工艺规程编号' not in data:
+            raise ValueError(f"无法解析大模型输出: {json_text[:100]}")
+        renderer.finish(json_text, save_path, data)
+        return json_text
+    
     def generate_document(self, template_path: str, save_path: str, json_text: str, image_path: str = None, selected_images: dict = None):
         """生成文档
         
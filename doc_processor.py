@@ -1,20 +1,42 @@
+from render_context import RenderContext
 from template_analyzer import TemplateAnalyzer
 
 
 class DocumentProcessor:
     @staticmethod
-    def insert_data_to_no_content_point(p_d: dict):
+    def insert_data_to_no_content_point(p_d: dict, context: RenderContext):
         """校验模板并在预处理阶段插入无内容标签的信息"""
         p_t = p_d['type']
-        if p_t in TemplateAnalyzer.insert_point_no_content_types:
-            no_content_label = TemplateAnalyzer.registered_labels[p_t]
-            no_content_label.insert_data_to_point(p_d, None, TemplateAnalyzer.static_datas)
+        if context.is_no_content_type(p_t):
+            no_content_label = context.get_label(p_t)
+            no_content_label.insert_data_to_point(p_d, None, context)
+            context.count_inserted(p_t)
             return True
         return False
 
     @staticmethod
-    def solve_content_labels(insert_points, datas):
-        """处理有内容类型插入点，包括表格中的内容，增强对表格内容的处理"""
+    def _insert_point(label, point_data, data, context: RenderContext):
+        """在单个插入点插入数据并记录到渲染上下文的指标中"""
+        try:
+            label.insert_data_to_point(point_data, data, context)
+            context.count_inserted(point_data['type'])
+        except Exception as e:
+            context.count_failed(point_data['type'])
+            print(f"错误：处理标签 {point_data['text']} 时发生错误: {str(e)}")
+
+    @staticmethod
+    def solve_content_labels(insert_points, datas, context: RenderContext = None):
+        """
+        处理有内容类型插入点，包括表格中的内容，增强对表格内容的处理
+
+        Args:
+            insert_points: 模板校验得到的插入点
+            datas: 标签数据
+            context: 本次生成任务的渲染上下文（通常为 check_template 结果中的 data['context']），
+                     默认按当前注册的标签新建
+        """
+        if context is None:
+            context = RenderContext(registered_labels=TemplateAnalyzer.registered_labels)
         no_data_points = {}
         
         # 检查图片标签
@@ -56,7 +78,7 @@ class DocumentProcessor:
                 if isinstance(point_data, list):
                     valid = False
                     for pd in point_data:
-                        label = TemplateAnalyzer.registered_labels[pd['type']]
+                        label = context.get_label(pd['type'])
                         if label.check_data_type(data):
                             valid = True
                             break
@@ -66,7 +88,7 @@ class DocumentProcessor:
                         no_data_points[point_name] = point_data
                         continue
                 else:
-                    label = TemplateAnalyzer.registered_labels[point_data['type']]
+                    label = context.get_label(point_data['type'])
                     if not label.check_data_type(data):
                         print(f"警告：标签 '{point_name}' 的数据类型不匹配，已跳过处理")
                         no_data_points[point_name] = point_data
@@ -107,34 +129,22 @@ class DocumentProcessor:
                     if is_image_type:
                         # 处理所有表格中的图片标签
                         for pd in table_image_points:
-                            label = TemplateAnalyzer.registered_labels[pd['type']]
-                            try:
-                                label.insert_data_to_point(pd, data, TemplateAnalyzer.static_datas)
-                            except Exception as e:
-                                print(f"错误：处理标签 {pd['text']} 时发生错误: {str(e)}")
+                            label = context.get_label(pd['type'])
+                            DocumentProcessor._insert_point(label, pd, data, context)
                         
                         # 处理所有非表格中的图片标签
                         for pd in non_table_image_points:
-                            label = TemplateAnalyzer.registered_labels[pd['type']]
-                            try:
-                                label.insert_data_to_point(pd, data, TemplateAnalyzer.static_datas)
-                            except Exception as e:
-                                print(f"错误：处理标签 {pd['text']} 时发生错误: {str(e)}")
+                            label = context.get_label(pd['type'])
+                            DocumentProcessor._insert_point(label, pd, data, context)
                     else:
                         # 不是图片类型，处理所有标签
                         for pd in point_data:
-                            label = TemplateAnalyzer.registered_labels[pd['type']]
-                            try:
-                                label.insert_data_to_point(pd, data, TemplateAnalyzer.static_datas)
-                            except Exception as e:
-                                print(f"错误：处理标签 {pd['text']} 时发生错误: {str(e)}")
+                            label = context.get_label(pd['type'])
+                            DocumentProcessor._insert_point(label, pd, data, context)
                 else:
                     # 单个标签的处理
-                    label = TemplateAnalyzer.registered_labels[point_data['type']]
-                    try:
-                        label.insert_data_to_point(point_data, data, TemplateAnalyzer.static_datas)
-                    except Exception as e:
-                        print(f"错误：处理标签 {point_data['text']} 时发生错误: {str(e)}")
+                    label = context.get_label(point_data['type'])
+                    DocumentProcessor._insert_point(label, point_data, data, context)
             except Exception as e:
                 print(f"错误：处理标签 '{point_name}' 时发生未知错误: {str(e)}")
 
@@ -153,8 +163,8 @@ class DocumentProcessor:
             匹配结果字典，键是标签名，值是匹配到的图片数据
         """
         result = {}
-        used_data = set()  # 记录已经使用过的数据
-        
+        index = _ImageTagIndex(image_data)  # 每次处理只建立一次索引
+
         # 遍历所有图片标签
         for tag_name, tag_text in image_tags:
             # 如果标签名已在原始数据中存在，且类型合适，则不需要额外匹配
@@ -163,71 +173,12 @@ class DocumentProcessor:
                 if isinstance(data, tuple) and len(data) == 2 and isinstance(data[1], str):
                     if data[1].endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp')):
                         continue
-            
-            # 尝试多种匹配策略
-            matched = False
-            
-            # 1. 直接匹配标签名
-            if tag_name in image_data and tag_name not in used_data:
-                result[tag_name] = image_data[tag_name]
-                used_data.add(tag_name)
-                matched = True
-                continue
-                
-            # 2. 忽略大小写匹配
-            tag_name_lower = tag_name.lower()
-            for key, value in image_data.items():
-                if key.lower() == tag_name_lower and key not in used_data:
-                    result[tag_name] = value
-                    used_data.add(key)
-                    matched = True
-                    break
-            if matched:
-                continue
-                
-            # 3. 检查"image:标签名"格式
-            image_prefix_key = f"image:{tag_name}"
-            for key, value in image_data.items():
-                # 忽略大小写比较前缀
-                if key.lower() == image_prefix_key.lower() and key not in used_data:
-                    result[tag_name] = value
-                    used_data.add(key)
-                    matched = True
-                    break
-            if matched:
-                continue
-                
-            # 4. 检查键名包含标签名的情况
-            for key, value in image_data.items():
-                if key not in used_data and (
-                    tag_name.lower() in key.lower() or  # 键名包含标签名
-                    key.lower().endswith(tag_name.lower())  # 键名以标签名结尾
-                ):
-                    result[tag_name] = value
-                    used_data.add(key)
-                    matched = True
-                    break
-            if matched:
-                continue
-                
-            # 5. 检查图片路径包含标签名的情况
-            for key, value in image_data.items():
-                if key not in used_data and tag_name.lower() in value[1].lower():
-                    result[tag_name] = value
-                    used_data.add(key)
-                    matched = True
-                    break
-            if matched:
-                continue
-                
-            # 6. 如果都匹配不到，使用任意未使用的图片数据
-            for key, value in image_data.items():
-                if key not in used_data:
-                    result[tag_name] = value
-                    used_data.add(key)
-                    matched = True
-                    break
-        
+
+            # 按优先级尝试多种匹配策略，标记匹配到的数据为已使用
+            key = index.match(tag_name)
+            if key is not None:
+                result[tag_name] = image_data[key]
+
         return result
 
     @staticmethod
@@ -246,3 +197,156 @@ class DocumentProcessor:
                 print(
                     f"  ({i}) 标签名为'{point_name}'、类型为'{point_data['type']}'的内容标签'{point_data['text']}'无法匹配到数据")
                 i += 1
+
+
+class _ImageTagIndex:
+    """
+    图片数据索引：为图片数据的键名（小写）、键名和图片路径中的字符建立索引，
+    按以下优先级为图片标签查找未使用的数据，多个数据满足同一策略时取数据顺序中的第一个：
+    1. 键名与标签名相同；2. 忽略大小写相同；3. 键名为"image:标签名"（忽略大小写）；
+    4. 键名包含标签名（忽略大小写）；5. 图片路径包含标签名（忽略大小写）；6. 任意未使用的数据
+    """
+
+    def __init__(self, image_data: dict):
+        self.keys = list(image_data)
+        self.positions = {key: i for i, key in enumerate(self.keys)}
+        self.used = [False] * len(self.keys)
+        self._next_unused = 0
+
+        self.key_lowers = [key.lower() for key in self.keys]
+        self.path_lowers = [value[1].lower() for value in image_data.values()]
+        self.lower_positions = {}
+        for i, key_lower in enumerate(self.key_lowers):
+            self.lower_positions.setdefault(key_lower, []).append(i)
+        self.key_grams = self._build_gram_index(self.key_lowers)
+        self.path_grams = self._build_gram_index(self.path_lowers)
+
+    @staticmethod
+    def _build_gram_index(texts: list) -> dict:
+        """单字和相邻两字 -> 包含它的文本序号（升序）"""
+        grams = {}
+        for i, text in enumerate(texts):
+            for gram in {*text, *(text[j:j + 2] for j in range(len(text) - 1))}:
+                grams.setdefault(gram, []).append(i)
+        return grams
+
+    def _first_unused(self, positions) -> int:
+        for i in positions:
+            if not self.used[i]:
+                return i
+        return -1
+
+    def _find_containing(self, text: str, texts: list, grams: dict) -> int:
+        """查找包含 text 的第一个未使用的文本，只检查包含 text 中最少见的单字或两字的文本"""
+        if not text:
+            return self._first_unused(range(len(texts)))
+        pieces = [text] if len(text) == 1 else [text[j:j + 2] for j in range(len(text) - 1)]
+        candidates = None
+        for piece in pieces:
+            positions = grams.get(piece)
+            if positions is None:
+                return -1
+            if candidates is None or len(positions) < len(candidates):
+                candidates = positions
+        for i in candidates:
+            if not self.used[i] and text in texts[i]:
+                return i
+        return -1
+
+    def match(self, tag_name: str):
+        """为图片标签查找数据并标记为已使用，返回数据键名，没有可用数据时返回 None"""
+        i = self.positions.get(tag_name, -1)
+        if i < 0 or self.used[i]:
+            tag_name_lower = tag_name.lower()
+            i = self._first_unused(self.lower_positions.get(tag_name_lower, ()))
+            if i < 0:
+                i = self._first_unused(self.lower_positions.get(f"image:{tag_name}".lower(), ()))
+            if i < 0:
+                i = self._find_containing(tag_name_lower, self.key_lowers, self.key_grams)
+            if i < 0:
+                i = self._find_containing(tag_name_lower, self.path_lowers, self.path_grams)
+            if i < 0:
+                while self._next_unused < len(self.keys) and self.used[self._next_unused]:
+                    self._next_unused += 1
+                i = self._next_unused if self._next_unused < len(self.keys) else -1
+        if i < 0:
+            return None
+        self.used[i] = True
+        return self.keys[i]
+
+
+# 图片标签匹配性能测试：合成数百个图片标签和图片数据，与逐个策略线性查找的原实现对比结果和耗时
+if __name__ == "__main__":
+    import random
+    import time
+
+    def linear_match(image_tags, image_data, original_data):
+        """原实现：每个标签按六种策略依次线性查找全部图片数据"""
+        result = {}
+        used_data = set()
+        for tag_name, tag_text in image_tags:
+            if tag_name in original_data:
+                data = original_data[tag_name]
+                if isinstance(data, tuple) and len(data) == 2 and isinstance(data[1], str):
+                    if data[1].endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp')):
+                        continue
+            strategies = [
+                lambda key, value: key == tag_name,
+                lambda key, value: key.lower() == tag_name.lower(),
+                lambda key, value: key.lower() == f"image:{tag_name}".lower(),
+                lambda key, value: tag_name.lower() in key.lower() or key.lower().endswith(tag_name.lower()),
+                lambda key, value: tag_name.lower() in value[1].lower(),
+                lambda key, value: True,
+            ]
+            for strategy in strategies:
+                matched_key = next((key for key, value in image_data.items()
+                                    if key not in used_data and strategy(key, value)), None)
+                if matched_key is not None:
+                    result[tag_name] = image_data[matched_key]
+                    used_data.add(matched_key)
+                    break
+        return result
+
+    def make_case(count, seed):
+        """合成图片标签和图片数据，覆盖大小写差异、image: 前缀、键名包含、路径包含和无法匹配的情况"""
+        rng = random.Random(seed)
+        joints = ['板T形接头', '板对接接头', '板搭接接头', '管板对接', '角接接头']
+        kinds = ['焊接接头形式', '焊接顺序', 'Weld', 'Sketch']
+        image_tags, datas = [], {}
+        for i in range(count):
+            name = f"{rng.choice(joints)}{rng.choice(kinds)}{i}"
+            path = f"imgs/{rng.choice(joints)}/{name}-{i:03d}.png"
+            style = rng.randrange(7)
+            if style == 0:
+                datas[name.upper()] = ('', path)
+            elif style == 1:
+                datas[f"Image:{name}"] = ('', path)
+            elif style == 2:
+                datas[f"图片_{name}"] = ('', path)
+            elif style == 3:
+                datas[f"图{i}"] = ('', path)
+            elif style == 4:
+                datas[f"其他{i}"] = ('', f"imgs/其他/{i}.png")
+            elif style == 5:
+                datas[name] = ('', path)
+            image_tags.append((name, f"{{{{image:{name}}}}}"))
+            if rng.random() < 0.1:
+                image_tags.append((name[:4], f"{{{{image:{name[:4]}}}}}"))
+        return image_tags, datas
+
+    print(f"{'标签数':>8} {'图片数':>8} {'原实现(ms)':>12} {'索引(ms)':>10}")
+    for count in (100, 300, 1000):
+        image_tags, datas = make_case(count, count)
+        image_data = {key: value for key, value in datas.items()
+                      if value[1].endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp'))}
+
+        start = time.perf_counter()
+        expected = linear_match(image_tags, image_data, datas)
+        linear_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = DocumentProcessor._smart_match_image_tags(image_tags, image_data, datas)
+        indexed_seconds = time.perf_counter() - start
+
+        assert actual == expected, "索引匹配结果与原实现不一致"
+        print(f"{len(image_tags):>8} {len(image_data):>8} {linear_seconds * 1000:>12.1f} {indexed_seconds * 1000:>10.1f}")
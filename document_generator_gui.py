@@ -8,6 +8,7 @@ import os
 import json
 from PIL import Image, ImageTk
 from excel_parser import ExcelParser
+from helper.os_helper import make_doc_file_name
 
 
 class DocumentGeneratorGUI:
@@ -239,6 +240,9 @@ class DocumentGeneratorGUI:
         
         self.generate_button = ttk.Button(button_frame, text="生成文档", command=self.generate_document)
         self.generate_button.pack(fill=tk.X, pady=2)
+        
+        self.batch_generate_button = ttk.Button(button_frame, text="批量生成文档", command=self.batch_generate_documents)
+        self.batch_generate_button.pack(fill=tk.X, pady=2)
 
         # Model Output Area
         output_label = ttk.Label(main_frame, text="主面板:")
@@ -640,20 +644,7 @@ class DocumentGeneratorGUI:
                 os.makedirs(save_dir, exist_ok=True)
                 
                 # 从Excel数据中获取工艺规程编号(WPS)作为文件名
-                filename = "generated_doc"
-                if self.excel_data and 'WPS' in self.excel_data:
-                    wps_number = str(self.excel_data['WPS']).strip()
-                    if wps_number and wps_number != 'nan':
-                        # 处理文件名中的特殊字符，将斜杠替换为合法字符
-                        filename = wps_number.replace('/', '').replace('\\', '')
-                        # 特殊处理：G/TS 改为 GTS
-                        filename = filename.replace('G/TS', 'GTS')
-                    else:
-                        import uuid
-                        filename = f"generated_doc_{str(uuid.uuid4())[:8]}"
-                else:
-                    import uuid
-                    filename = f"generated_doc_{str(uuid.uuid4())[:8]}"
+                filename = make_doc_file_name(self.excel_data.get('WPS') if self.excel_data else None)
                 
                 save_path = f"{save_dir}/{filename}.docx"
 
@@ -705,11 +696,59 @@ class DocumentGeneratorGUI:
         # Run in separate thread to prevent GUI freezing
         threading.Thread(target=process_generation, daemon=True).start()
 
+    def batch_generate_documents(self):
+        """为Excel文件中的每一行批量生成文档"""
+        if not self.excel_file_path:
+            messagebox.showwarning("提示", "请先选择并解析Excel文件后再批量生成！")
+            return
+        
+        if not messagebox.askyesno("批量生成", "将为Excel中的每一行生成一份文档，是否继续？"):
+            return
+        
+        # Disable buttons while processing
+        self.toggle_buttons(False)
+        
+        def process_batch():
+            try:
+                from batch_generator import BatchGenerator
+                
+                save_dir = self.save_dir
+                if isinstance(self.save_dir, dict):
+                    save_dir = self.save_dir[self.current_template]
+                
+                generator = BatchGenerator(
+                    self.template_paths[self.current_template],
+                    save_dir,
+                    api_key=self.chat_assistant.api_key,
+                    base_url=self.chat_assistant.base_url,
+                    message=self.current_prompt or self.prompt_var.get()
+                )
+                result = generator.generate_from_excel(self.excel_file_path)
+                
+                summary = (f"成功 {result['succeeded']} / {result['total']} 份，"
+                           f"吞吐量 {result['docs_per_second']:.2f} 份/秒")
+                if result['failed_rows']:
+                    failed = "、".join(str(r['row'] + 1) for r in result['failed_rows'][:20])
+                    summary += f"\n失败行: {failed}"
+                self.root.after(0, lambda: messagebox.showinfo("批量生成完成", summary))
+            
+            except Exception as e:
+                import traceback
+                traceback.print_exc()
+                error_msg = str(e)
+                self.root.after(0, lambda: messagebox.showerror("Error", f"批量生成失败: {error_msg}"))
+            finally:
+                # Re-enable buttons
+                self.root.after(0, lambda: self.toggle_buttons(True))
+        
+        threading.Thread(target=process_batch, daemon=True).start()
+
     def toggle_buttons(self, enabled: bool):
         state = 'normal' if enabled else 'disabled'
         self.reset_button.configure(state=state)
         self.send_button.configure(state=state)
         self.generate_button.configure(state=state)
+        self.batch_generate_button.configure(state=state)
     
     def select_excel_file(self):
         """选择Excel文件"""
@@ -804,8 +843,8 @@ class DocumentGeneratorGUI:
         
         # 计算并显示焊接工艺参数
         try:
-            from wps_calculator import WPSCalculator
-            calculator = WPSCalculator()
+            # 复用对话客户端的计算器
+            calculator = self.chat_assistant.wps_calculator
             calculated_params = calculator.calculate_welding_parameters(self.excel_data)
             formatted_params = calculator.format_parameters_for_display(calculated_params)
             params_text_display.insert("1.0", formatted_params)
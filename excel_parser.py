@@ -1,29 +1,27 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import openpyxl
 import pandas as pd
 import re
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Iterator, Tuple
 
 class ExcelParser:
     """Excel文件解析器，用于解析焊接接头清单数据"""
     
+    # 需要提取的列名（注意：列名已经过清理，去除了所有空白字符）
+    TARGET_COLUMNS = [
+        'WPS', '焊接工艺', '接头类型', '焊接位置', 'WPQR', 
+        '厚度t1/材质', '厚度t2/材质', '接头坡口形式', '焊接填充材料','保护气体类型'
+    ]
+    
     def __init__(self):
         self.data = None
         self.parsed_dict = None
     
     def clean_column_names(self, df: pd.DataFrame) -> pd.DataFrame:
         """清理列名中的空格和回车"""
-        cleaned_columns = {}
-        for col in df.columns:
-            if isinstance(col, str):
-                # 移除所有空白字符（空格、回车、换行符、制表符等）
-                cleaned_col = re.sub(r'[\s\r\n\t]+', '', str(col).strip())
-                # 进一步清理，确保没有残留的特殊字符
-                cleaned_col = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', cleaned_col)
-                cleaned_columns[col] = cleaned_col
-            else:
-                cleaned_columns[col] = col
+        cleaned_columns = {col: self.clean_column_name(col) for col in df.columns}
         
         return df.rename(columns=cleaned_columns)
     
@@ -84,6 +82,73 @@ class ExcelParser:
             print(f"加载Excel文件时发生错误: {str(e)}")
             return False
     
+    def clean_column_name(self, col):
+        """清理单个列名中的空白和控制字符"""
+        if not isinstance(col, str):
+            return col
+        # 移除所有空白字符（空格、回车、换行符、制表符等）
+        cleaned_col = re.sub(r'[\s\r\n\t]+', '', str(col).strip())
+        # 进一步清理，确保没有残留的特殊字符
+        return re.sub(r'[\x00-\x1f\x7f-\x9f]', '', cleaned_col)
+    
+    def iter_excel_rows(self, file_path: str, sheet_name_or_index: int = 2,
+                        header_row: int = 2) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        以只读流式方式逐行读取Excel文件，边读取边标准化，惰性返回每行数据
+        
+        与 load_excel_data 不同，该方法不会把整张表载入内存，适合数万行的接头清单：
+        标题行只清理一次，厚度/材质在读取每行时即时标准化，调用方可以在后续行尚未读取时开始处理前面的行。
+        
+        Args:
+            file_path: Excel文件路径
+            sheet_name_or_index: 工作表名称或索引（默认第3个工作表，索引为2）
+            header_row: 标题行位置（默认第3行，索引为2）
+            
+        Returns:
+            Iterator: (行号, 行数据字典) 的迭代器，行号与 load_excel_data 得到的DataFrame索引一致，
+            行数据字典只包含 TARGET_COLUMNS 中的列，格式与 extract_row_data 相同
+        """
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            if isinstance(sheet_name_or_index, int):
+                worksheet = workbook.worksheets[sheet_name_or_index]
+            else:
+                worksheet = workbook[sheet_name_or_index]
+            # 部分文件记录的表格范围不准确，重新计算以免漏读
+            worksheet.reset_dimensions()
+            
+            rows = worksheet.iter_rows(min_row=header_row + 1, values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            
+            # 标题行只清理一次，重复列名取第一次出现的列
+            column_indexes = {}
+            for index, col in enumerate(header):
+                cleaned_col = self.clean_column_name(col)
+                if cleaned_col is not None and cleaned_col not in column_indexes:
+                    column_indexes[cleaned_col] = index
+            
+            thickness_columns = ['厚度t1/材质', '厚度t2/材质']
+            for row_index, values in enumerate(rows):
+                # 跳过整行为空的行
+                if all(value is None or (isinstance(value, str) and not value.strip()) for value in values):
+                    continue
+                
+                row_dict = {}
+                for col in self.TARGET_COLUMNS:
+                    index = column_indexes.get(col)
+                    value = values[index] if index is not None and index < len(values) else None
+                    if value is None:
+                        row_dict[col] = None
+                    elif col in thickness_columns:
+                        row_dict[col] = self.standardize_thickness_material(value)
+                    else:
+                        row_dict[col] = str(value)
+                yield row_index, row_dict
+        finally:
+            workbook.close()
+    
     def extract_first_row_data(self) -> Optional[Dict[str, Any]]:
         """
         提取第一行数据并转换为字典
@@ -91,20 +156,30 @@ class ExcelParser:
         Returns:
             Dict: 包含第一行数据的字典，如果没有数据则返回None
         """
-        if self.data is None or len(self.data) == 0:
-            return None
+        row_dict = self.extract_row_data(0)
+        if row_dict is not None:
+            self.parsed_dict = row_dict
+        return row_dict
+    
+    def extract_row_data(self, row_index: int) -> Optional[Dict[str, Any]]:
+        """
+        提取指定行数据并转换为字典
         
-        # 定义需要提取的列名（注意：列名已经过清理，去除了所有空白字符）
-        target_columns = [
-            'WPS', '焊接工艺', '接头类型', '焊接位置', 'WPQR', 
-            '厚度t1/材质', '厚度t2/材质', '接头坡口形式', '焊接填充材料','保护气体类型'
-        ]
+        Args:
+            row_index: 行号（从0开始，不含标题行）
+            
+        Returns:
+            Dict: 包含该行数据的字典，如果没有该行则返回None
+        """
+        if self.data is None or row_index >= len(self.data):
+            return None
         
-        # 提取第一行数据并存储到字典中
+        # 提取该行数据并存储到字典中
+        row = self.data.iloc[row_index]
         row_dict = {}
-        for col in target_columns:
+        for col in self.TARGET_COLUMNS:
             if col in self.data.columns:
-                value = self.data.iloc[0][col]
+                value = row[col]
                 # 处理NaN值
                 if pd.isna(value):
                     row_dict[col] = None
@@ -113,9 +188,20 @@ class ExcelParser:
             else:
                 row_dict[col] = None
         
-        self.parsed_dict = row_dict
         return row_dict
     
+    def iter_row_data(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        依次提取所有行数据
+        
+        Returns:
+            Iterator: (行号, 行数据字典) 的迭代器
+        """
+        if self.data is None:
+            return
+        for row_index in range(len(self.data)):
+            yield row_index, self.extract_row_data(row_index)
+    
     def get_all_data(self) -> Optional[pd.DataFrame]:
         """获取完整的DataFrame数据"""
         return self.data
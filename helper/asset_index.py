@@ -0,0 +1,269 @@
+import os
+import threading
+import time
+from typing import Iterable, Optional
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tif', '.tiff')
+
+# 项目根目录（labels.py 所在目录），与 ImageLabel 原有的路径查找规则一致
+_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _normalize(path: str) -> str:
+    return os.path.normcase(os.path.normpath(os.path.abspath(path)))
+
+
+def _split_path(path: str) -> list:
+    """将路径拆分为规范化的各级名称，忽略 . 和 .."""
+    path = os.path.normcase(os.path.normpath(path)).replace('\\', '/')
+    return [part for part in path.split('/') if part not in ('', '.', '..')]
+
+
+class AssetIndex:
+    """
+    图片素材索引：一次扫描 imgs/ 和模板所在目录，将绝对路径、素材目录下的相对路径（如 板T形接头/xx.png、
+    imgs/板T形接头/xx.png）和逻辑名称（文件名及不含扩展名的文件名）映射到文件的绝对路径，并记录文件大小和修改时间。
+    解析图片路径只需字典查找，不再逐个位置检查文件是否存在；
+    查找时最多每 refresh_interval 秒重新扫描一次目录，只让大小或修改时间变化的文件失效
+    """
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, roots: Iterable[str], refresh_interval: float = 2.0, shallow_roots: Iterable[str] = ()):
+        """
+        Args:
+            roots: 需要索引的目录（递归扫描，跳过以 . 开头的文件和目录）
+            refresh_interval: 两次重新扫描之间的最短间隔（秒）
+            shallow_roots: 只索引目录下直接包含的图片、不进入子目录的目录（如模板所在目录，可能是工作目录或用户主目录）
+        """
+        self.roots = []
+        for root in roots:
+            root = _normalize(root)
+            if root not in self.roots:
+                self.roots.append(root)
+        self.shallow_roots = []
+        for root in shallow_roots:
+            root = _normalize(root)
+            if root not in self.roots and root not in self.shallow_roots:
+                self.shallow_roots.append(root)
+        self.refresh_interval = refresh_interval
+        self._entries = {}  # 规范化绝对路径 -> 文件信息
+        self._relpaths = {}  # 素材目录下的相对路径 -> 规范化绝对路径，多个目录中都有时取靠前的目录
+        self._names = {}  # 逻辑名称 -> 同名文件的规范化绝对路径列表
+        self._warned = set()  # 已提示过重名的图片路径
+        self._resolved = {}  # (查询路径, 模板目录) -> 解析结果，索引变化时清空
+        self._lock = threading.Lock()
+        self._last_refresh = float('-inf')
+        self.stats = {'lookups': 0, 'hits': 0, 'name_hits': 0, 'misses': 0, 'refreshes': 0, 'invalidated': 0}
+        self.refresh(force=True)
+
+    @classmethod
+    def get_shared(cls, roots: Iterable[str], shallow_roots: Iterable[str] = ()) -> 'AssetIndex':
+        """获取进程内共享的索引，相同目录只建立一次索引"""
+        key = (tuple(_normalize(root) for root in roots), tuple(_normalize(root) for root in shallow_roots))
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = cls(key[0], shallow_roots=key[1])
+            return cls._shared[key]
+
+    @classmethod
+    def for_template(cls, template_dir: str = '') -> 'AssetIndex':
+        """
+        获取覆盖 imgs/（当前工作目录、项目根目录和模板所在目录下）的共享索引；
+        模板所在目录本身只索引直接包含的图片，不递归扫描整个目录树
+        """
+        roots = [os.path.join(os.getcwd(), 'imgs'), os.path.join(_PROJECT_DIR, 'imgs')]
+        shallow_roots = []
+        if template_dir:
+            roots.append(os.path.join(template_dir, 'imgs'))
+            shallow_roots.append(template_dir)
+        return cls.get_shared(roots, shallow_roots)
+
+    def refresh(self, force: bool = False):
+        """重新扫描目录，距上次扫描不足 refresh_interval 秒时跳过（force 为 True 时除外）"""
+        if not force and time.monotonic() - self._last_refresh < self.refresh_interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_refresh < self.refresh_interval:
+                return
+            self._last_refresh = now
+
+            scanned = {}
+            for root in self.roots:
+                self._scan(root, scanned)
+            for root in self.shallow_roots:
+                self._scan(root, scanned, recursive=False)
+
+            entries = {}
+            changed = len(scanned) != len(self._entries)
+            for key, (path, size, mtime, relparts) in scanned.items():
+                entry = self._entries.get(key)
+                if entry is None or entry['size'] != size or entry['mtime'] != mtime:
+                    if entry is not None:
+                        self.stats['invalidated'] += 1
+                    entry = {'path': path, 'size': size, 'mtime': mtime, 'relparts': relparts}
+                    changed = True
+                entries[key] = entry
+            self.stats['invalidated'] += sum(1 for key in self._entries if key not in entries)
+            self.stats['refreshes'] += 1
+            if not changed:
+                return
+
+            relpaths = {}
+            names = {}
+            for key, entry in entries.items():
+                parts = entry['relparts']
+                # 带素材目录名的相对路径，以及子目录中的图片不带素材目录名的相对路径
+                for start in range(0, len(parts) - 1):
+                    relpaths.setdefault('/'.join(parts[start:]), key)
+                for name in (parts[-1], os.path.splitext(parts[-1])[0]):
+                    names.setdefault(name, []).append(key)
+            self._entries = entries
+            self._relpaths = relpaths
+            self._names = names
+            self._resolved = {}
+            self._warned = set()
+
+    @staticmethod
+    def _scan(root: str, scanned: dict, recursive: bool = True):
+        directories = [root]
+        while directories:
+            directory = directories.pop()
+            try:
+                iterator = os.scandir(directory)
+            except OSError:
+                continue
+            with iterator:
+                for entry in iterator:
+                    if entry.name.startswith('.'):
+                        continue
+                    try:
+                        if entry.is_dir():
+                            if recursive:
+                                directories.append(entry.path)
+                        elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                            stat = entry.stat()
+                            relparts = _split_path(os.path.join(os.path.basename(root),
+                                                                os.path.relpath(entry.path, root)))
+                            scanned.setdefault(_normalize(entry.path), (os.path.abspath(entry.path), stat.st_size,
+                                                                        stat.st_mtime_ns, relparts))
+                    except OSError:
+                        continue
+
+    def resolve(self, path: str, template_dir: str = '') -> Optional[str]:
+        """
+        将图片路径解析为索引中的绝对路径，依次按当前工作目录、模板所在目录、项目根目录及其上级目录
+        拼接查找（与 ImageLabel 原有的查找顺序一致），都找不到时按素材目录下的相对路径查找，
+        只给出文件名时按逻辑名称查找（有多个同名文件时提示并返回 None），不在索引中时返回 None
+        """
+        self.refresh()
+        self.stats['lookups'] += 1
+        query = (path, template_dir)
+        resolved = self._resolved.get(query)
+        if resolved is not None:
+            self.stats['hits'] += 1
+            return resolved
+
+        entries = self._entries
+        if os.path.isabs(path):
+            candidates = [path]
+        else:
+            candidates = [path]
+            if template_dir:
+                candidates.append(os.path.join(template_dir, path))
+            candidates.append(os.path.join(_PROJECT_DIR, path))
+            candidates.append(os.path.join(_PROJECT_DIR, '..', path))
+        for candidate in candidates:
+            entry = entries.get(_normalize(candidate))
+            if entry is not None:
+                self.stats['hits'] += 1
+                self._resolved[query] = entry['path']
+                return entry['path']
+
+        # 按素材目录下的相对路径查找（如其他机器上的绝对路径以 imgs/板T形接头/xx.png 结尾），
+        # 不同子目录中的同名图片不会互相替代
+        parts = _split_path(path)
+        for start in range(0, len(parts) - 1):
+            key = self._relpaths.get('/'.join(parts[start:]))
+            if key is not None:
+                self.stats['name_hits'] += 1
+                self._resolved[query] = entries[key]['path']
+                return entries[key]['path']
+
+        # 只给出文件名时按逻辑名称查找，有多个同名文件时无法确定使用哪一个
+        if len(parts) == 1:
+            keys = self._names.get(parts[0], [])
+            if len(keys) == 1:
+                self.stats['name_hits'] += 1
+                self._resolved[query] = entries[keys[0]]['path']
+                return entries[keys[0]]['path']
+            if len(keys) > 1 and path not in self._warned:
+                self._warned.add(path)
+                print(f"警告：图片素材中有 {len(keys)} 个名为 {path} 的文件，无法确定使用哪一个 - "
+                      f"{'、'.join(entries[key]['path'] for key in keys)}")
+        self.stats['misses'] += 1
+        return None
+
+
+# 路径解析检查和性能测试：对比索引查找与逐个位置检查文件是否存在
+if __name__ == "__main__":
+    import shutil
+    import sys
+    import tempfile
+
+    from labels import ImageLabel
+    from render_context import RenderContext
+
+    os.chdir(_PROJECT_DIR)
+    index = AssetIndex.for_template(os.path.join(_PROJECT_DIR, 'data'))
+
+    # 存在的路径即使不在索引目录中、且与索引中的图片同名，也必须原样使用
+    context = RenderContext(os.path.join(_PROJECT_DIR, 'data', 'template.docx'), asset_index=index)
+    indexed_path = next(entry['path'] for entry in index._entries.values() if len(entry['relparts']) > 2)
+    joint_dir, file_name = os.path.split(indexed_path)
+    with tempfile.TemporaryDirectory() as other_dir:
+        explicit_path = os.path.join(other_dir, file_name)
+        shutil.copyfile(indexed_path, explicit_path)
+        assert ImageLabel.resolve_pic_url(explicit_path, context) == explicit_path
+
+        # 不存在的路径按素材目录下的相对路径查找，子目录不同的同名图片不能替代
+        moved_path = os.path.join(other_dir, 'imgs', os.path.basename(joint_dir), file_name)
+        assert ImageLabel.resolve_pic_url(moved_path, context) == indexed_path
+        assert ImageLabel.resolve_pic_url(os.path.join(other_dir, 'imgs', '其他接头', file_name), context) is None
+        assert ImageLabel.resolve_pic_url(file_name, context) == indexed_path
+
+        # 只给出文件名且有多个同名文件时不做替代
+        for joint in ('板对接接头', '板搭接接头'):
+            os.makedirs(os.path.join(other_dir, 'imgs', joint))
+            shutil.copyfile(indexed_path, os.path.join(other_dir, 'imgs', joint, file_name))
+        other_index = AssetIndex([os.path.join(other_dir, 'imgs')])
+        assert other_index.resolve(file_name) is None
+        assert other_index.resolve(os.path.join('板搭接接头', file_name)) == \
+            os.path.join(other_dir, 'imgs', '板搭接接头', file_name)
+    print("路径解析检查通过")
+    # 有效的相对路径，以及大模型有时只给出的文件名
+    pic_urls = [os.path.relpath(entry['path']) for entry in index._entries.values()]
+    pic_urls += [os.path.basename(pic_url) for pic_url in pic_urls]
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f"索引文件数: {len(index._entries)}，每种方式解析 {len(pic_urls) * rounds} 次")
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for pic_url in pic_urls:
+            index.resolve(pic_url, 'data')
+    indexed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for pic_url in pic_urls:
+            # 原有的查找方式：路径无效时逐个位置检查文件是否存在
+            if not os.path.exists(pic_url):
+                for path in (pic_url, os.path.join(os.getcwd(), pic_url), os.path.join('data', pic_url),
+                             os.path.abspath(pic_url), os.path.join(_PROJECT_DIR, pic_url),
+                             os.path.join(_PROJECT_DIR, '..', pic_url)):
+                    if os.path.exists(path):
+                        break
+    probed = time.perf_counter() - start
+    print(f"索引查找: {indexed * 1000:.1f}ms，逐个位置检查: {probed * 1000:.1f}ms，统计: {index.stats}")
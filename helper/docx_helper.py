@@ -121,3 +121,27 @@ def set_hyperlink(run_index: int, paragraph: Paragraph, text: str, url: str):
     delete_paragraph(run)
 
     return hyperlink
+
+
+HEADER_FOOTER_KINDS = ('header', 'footer', 'first_page_header', 'first_page_footer',
+                       'even_page_header', 'even_page_footer')
+
+
+def iter_story_containers(document: Document):
+    """依次返回正文和各节中实际定义的页眉页脚容器，同一页眉页脚部件只返回一次
+
+    :return: (部件描述, 容器) 的迭代器，部件描述形如 {'kind': 'body'} 或 {'kind': 'header', 'section': 0}
+    """
+    yield {'kind': 'body'}, document._body
+    seen_elements = set()
+    for section_index, section in enumerate(document.sections):
+        for kind in HEADER_FOOTER_KINDS:
+            header_footer = getattr(section, kind)
+            # 链接到前一节的页眉页脚没有自己的定义，访问其内容会新建部件，直接跳过
+            if header_footer.is_linked_to_previous:
+                continue
+            element = header_footer._element
+            if element in seen_elements:
+                continue
+            seen_elements.add(element)
+            yield {'kind': kind, 'section': section_index}, header_footer
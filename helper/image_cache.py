@@ -0,0 +1,147 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from helper import image_size
+
+
+class CachedImage:
+    def __init__(self, path: str, mtime_ns: int, size: int, data: bytes, width: int, height: int, dpi):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.data = data
+        self.sha1 = hashlib.sha1(data).hexdigest()
+        self.width = width
+        self.height = height
+        self.dpi = dpi
+
+    def open(self) -> io.BytesIO:
+        """返回图片内容的内存文件，可直接传给 run.add_picture"""
+        return io.BytesIO(self.data)
+
+
+class ImageCache:
+    """
+    进程内共享的图片缓存（LRU）：按文件路径缓存图片内容、SHA1、像素尺寸和DPI，
+    通过文件修改时间和大小判断是否失效。同一图片插入多份文档时只读取和解析一次，
+    缓存总字节数超过 max_bytes 或条目数超过 max_entries 时淘汰最久未使用的图片
+    """
+
+    max_bytes = 64 * 1024 * 1024  # 缓存图片内容的总字节数上限
+    max_entries = 256  # 缓存图片数上限
+
+    _entries = OrderedDict()
+    _lock = threading.Lock()
+    _bytes = 0
+
+    stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    @classmethod
+    def configure(cls, max_bytes: Optional[int] = None, max_entries: Optional[int] = None):
+        """调整缓存上限，超出新上限的图片立即淘汰"""
+        with cls._lock:
+            if max_bytes is not None:
+                cls.max_bytes = max_bytes
+            if max_entries is not None:
+                cls.max_entries = max_entries
+            cls._evict()
+
+    @classmethod
+    def get(cls, file_path: str) -> CachedImage:
+        """获取图片（内容、SHA1、像素尺寸和DPI），未缓存或文件已修改时读取文件"""
+        key = os.path.abspath(file_path)
+        stat = os.stat(key)
+        with cls._lock:
+            cached = cls._entries.get(key)
+            if cached is not None and cached.mtime_ns == stat.st_mtime_ns and cached.size == stat.st_size:
+                cls._entries.move_to_end(key)
+                cls.stats['hits'] += 1
+                return cached
+
+        with open(key, 'rb') as f:
+            data = f.read()
+        # 尺寸和DPI都从已读取的内容中解析，不再重复读取文件
+        width, height = image_size.get(io.BytesIO(data))
+        try:
+            dpi = image_size.getDPI(io.BytesIO(data))
+        except Exception:
+            dpi = (-1, -1)
+        cached = CachedImage(key, stat.st_mtime_ns, stat.st_size, data, width, height, dpi)
+
+        with cls._lock:
+            cls.stats['misses'] += 1
+            previous = cls._entries.pop(key, None)
+            if previous is not None:
+                cls._bytes -= len(previous.data)
+            # 超过缓存上限的单个图片不缓存
+            if len(data) <= cls.max_bytes:
+                cls._entries[key] = cached
+                cls._bytes += len(data)
+                cls._evict()
+        return cached
+
+    @classmethod
+    def _evict(cls):
+        # 调用方需持有 cls._lock
+        while cls._entries and (cls._bytes > cls.max_bytes or len(cls._entries) > cls.max_entries):
+            _, cached = cls._entries.popitem(last=False)
+            cls._bytes -= len(cached.data)
+            cls.stats['evictions'] += 1
+
+    @classmethod
+    def clear(cls):
+        """清空缓存和统计"""
+        with cls._lock:
+            cls._entries.clear()
+            cls._bytes = 0
+            cls.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Any]:
+        """缓存统计：命中、未命中、淘汰次数，命中率，当前缓存的图片数和字节数"""
+        with cls._lock:
+            stats = dict(cls.stats)
+            stats['entries'] = len(cls._entries)
+            stats['bytes'] = cls._bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    @classmethod
+    def print_stats(cls):
+        """打印缓存统计"""
+        stats = cls.get_stats()
+        print(f"图片缓存统计：命中 {stats['hits']} 次，未命中 {stats['misses']} 次，命中率 {stats['hit_rate']:.0%}，"
+              f"淘汰 {stats['evictions']} 次，缓存 {stats['entries']} 张图片"
+              f"（{stats['bytes'] / 1024 / 1024:.1f}MB / {cls.max_bytes / 1024 / 1024:.0f}MB）")
+
+
+# 缓存性能测试：模拟批量生成时同一批图片反复插入多份文档，例如：python -m helper.image_cache [文档数]
+if __name__ == "__main__":
+    import sys
+    import time
+
+    image_paths = [os.path.join(root, name) for root, _, names in os.walk('imgs') for name in names
+                   if name.lower().endswith('.png')]
+    documents = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+
+    start = time.perf_counter()
+    for _ in range(documents):
+        for image_path in image_paths:
+            with open(image_path, 'rb') as f:
+                data = f.read()
+            image_size.get(image_path)
+    uncached = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(documents):
+        for image_path in image_paths:
+            ImageCache.get(image_path).open()
+    cached = time.perf_counter() - start
+    print(f"{documents} 份文档 × {len(image_paths)} 张图片：每次读取文件 {uncached * 1000:.1f}ms，"
+          f"使用缓存 {cached * 1000:.1f}ms")
+    ImageCache.print_stats()
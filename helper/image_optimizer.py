@@ -0,0 +1,137 @@
+import hashlib
+import io
+import math
+import os
+import threading
+import uuid
+from typing import Any, Dict, Optional
+
+from helper.image_cache import CachedImage, ImageCache
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow 为可选依赖，未安装时不做优化
+    Image = None
+
+_EMU_PER_INCH = 914400
+# 预处理参数变化时修改版本号，使旧的派生图片失效
+_PIPELINE_VERSION = 1
+
+
+class ImageOptimizer:
+    """
+    图片嵌入前的优化：按图片在文档中的最终宽度，将图片缩小到目标DPI所需的像素尺寸并重新压缩，
+    线条图（颜色数较少的图片）转换为调色板PNG。处理结果按源图片内容哈希和目标尺寸保存在磁盘缓存中，
+    同一图片的同一尺寸只处理一次。是否启用及目标分辨率由各任务的 RenderContext 决定，需要 Pillow
+    """
+
+    target_dpi = 220  # 默认目标分辨率
+    line_art_max_colors = 4096  # 源图片颜色数不超过此值时视为线条图
+    palette_colors = 256  # 线条图调色板颜色数
+    jpeg_quality = 85
+    # 位于项目目录下，与启动程序时的工作目录无关
+    cache_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', '.image_cache')
+
+    _lock = threading.Lock()
+    stats = {'optimized': 0, 'disk_hits': 0, 'skipped': 0, 'source_bytes': 0, 'embedded_bytes': 0}
+
+    @staticmethod
+    def is_available() -> bool:
+        """是否已安装 Pillow"""
+        return Image is not None
+
+    @classmethod
+    def optimize(cls, image: CachedImage, final_width: int, target_dpi: Optional[int] = None) -> CachedImage:
+        """
+        返回按最终宽度优化后的图片，未安装 Pillow、不需要缩小或优化后没有变小时返回原图
+
+        Args:
+            image: 图片缓存中的源图片
+            final_width: 图片在文档中的宽度（EMU）
+            target_dpi: 目标分辨率，默认为 target_dpi
+        """
+        if Image is None or image.width <= 0 or image.height <= 0:
+            return image
+        target_dpi = target_dpi or cls.target_dpi
+        target_width = max(1, math.ceil(final_width / _EMU_PER_INCH * target_dpi))
+        if target_width >= image.width:
+            cls._count(image, image, 'skipped')
+            return image
+        target_height = max(1, round(image.height * target_width / image.width))
+
+        key = hashlib.sha1(f"{image.sha1}:{target_width}x{target_height}:{target_dpi}:"
+                           f"{cls.palette_colors}:{cls.jpeg_quality}:{_PIPELINE_VERSION}".encode()).hexdigest()
+        is_jpeg = image.data[:3] == b'\xff\xd8\xff'
+        derived_path = os.path.join(cls.cache_dir, key[:2], f"{key}.{'jpg' if is_jpeg else 'png'}")
+
+        try:
+            if os.path.exists(derived_path):
+                outcome = 'disk_hits'
+            else:
+                cls._write(derived_path, cls._downsample(image, target_width, target_height, target_dpi, is_jpeg))
+                outcome = 'optimized'
+            derived = ImageCache.get(derived_path)
+        except Exception as e:
+            print(f"警告：优化图片失败，嵌入原图 - {str(e)}")
+            return image
+
+        # 重新压缩后反而变大时（如原图已高度压缩）嵌入原图
+        if len(derived.data) >= len(image.data):
+            cls._count(image, image, 'skipped')
+            return image
+        cls._count(image, derived, outcome)
+        return derived
+
+    @classmethod
+    def _downsample(cls, image: CachedImage, width: int, height: int, target_dpi: int, is_jpeg: bool) -> bytes:
+        resampling = getattr(Image, 'Resampling', Image)
+        with Image.open(image.open()) as source:
+            source.load()
+            is_line_art = not is_jpeg and source.getcolors(cls.line_art_max_colors) is not None
+            if source.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+                source = source.convert('RGBA' if 'transparency' in source.info else 'RGB')
+            resized = source.resize((width, height), resampling.LANCZOS)
+
+        output = io.BytesIO()
+        dpi = (target_dpi, target_dpi)
+        if is_jpeg:
+            resized.convert('RGB').save(output, 'JPEG', quality=cls.jpeg_quality, optimize=True, dpi=dpi)
+        else:
+            if is_line_art:
+                dither = getattr(Image, 'Dither', Image).NONE
+                method = Image.FASTOCTREE if resized.mode == 'RGBA' else Image.MEDIANCUT
+                resized = resized.quantize(colors=cls.palette_colors, method=method, dither=dither)
+            resized.save(output, 'PNG', optimize=True, dpi=dpi)
+        return output.getvalue()
+
+    @staticmethod
+    def _write(path: str, data: bytes):
+        # 先写临时文件再替换，多个进程或线程同时处理同一图片时不会读到不完整的文件
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def _count(cls, source: CachedImage, embedded: CachedImage, outcome: str):
+        with cls._lock:
+            cls.stats[outcome] += 1
+            cls.stats['source_bytes'] += len(source.data)
+            cls.stats['embedded_bytes'] += len(embedded.data)
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Any]:
+        """优化统计：新处理、命中磁盘缓存、保持原图的次数，源图片和实际嵌入的总字节数"""
+        with cls._lock:
+            stats = dict(cls.stats)
+        stats['saved_ratio'] = 1 - stats['embedded_bytes'] / stats['source_bytes'] if stats['source_bytes'] else 0.0
+        return stats
+
+    @classmethod
+    def print_stats(cls):
+        """打印优化统计"""
+        stats = cls.get_stats()
+        print(f"图片优化统计：新处理 {stats['optimized']} 次，命中磁盘缓存 {stats['disk_hits']} 次，"
+              f"保持原图 {stats['skipped']} 次，嵌入 {stats['embedded_bytes'] / 1024:.0f}KB"
+              f"（原图 {stats['source_bytes'] / 1024:.0f}KB，减少 {stats['saved_ratio']:.0%}）")
@@ -265,10 +265,14 @@ def getDPI(filepath):
     xDPI = -1
     yDPI = -1
 
-    if not isinstance(filepath, bytes):
-        filepath = str(filepath)
+    if isinstance(filepath, io.BytesIO):  # file-like object
+        fhandle = filepath
+    else:
+        if not isinstance(filepath, bytes):
+            filepath = str(filepath)
+        fhandle = open(filepath, 'rb')
 
-    with open(filepath, 'rb') as fhandle:
+    try:
         head = fhandle.read(24)
         size = len(head)
         # handle GIFs
@@ -360,4 +364,8 @@ def getDPI(filepath):
                         headerSize -= boxSize
             except struct.error as e:
                 raise ValueError("Invalid JPEG2000 file")
+
+    finally:
+        fhandle.close()
+
     return xDPI, yDPI
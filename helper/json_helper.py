@@ -0,0 +1,85 @@
+import json
+import re
+from typing import Optional
+
+_DECODER = json.JSONDecoder()
+
+# 需要修复的记号：各种定界符的字符串、注释、对象和数组末尾多余的逗号、Python 字面量
+_REPAIR_PATTERN = re.compile(r'''
+    "(?:[^"\\]|\\.)*"
+  | '(?:[^'\\]|\\.)*'
+  | “[^”]*” | ‘[^’]*’
+  | //[^\n]* | /\*[\s\S]*?\*/
+  | ,(?=(?:\s|//[^\n]*|/\*[\s\S]*?\*/)*[}\]])
+  | \b(?:True|False|None)\b
+''', re.VERBOSE)
+# 字符串内容中需要转换的字符：转义序列、未转义的双引号和换行
+_STRING_CONTENT_PATTERN = re.compile(r'\\.|"|\n', re.DOTALL)
+_PYTHON_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+
+
+def decode_json_object(text: Optional[str]) -> Optional[dict]:
+    """
+    从大模型输出中解析第一个JSON对象，忽略对象前后的说明文字和 ```json 标记。
+    先按标准JSON直接解析，失败时对文本做一次容错修复后再解析，均失败时返回 None
+    """
+    if not text:
+        return None
+    start = text.find('{')
+    if start < 0:
+        return None
+    try:
+        obj, _ = _DECODER.raw_decode(text, start)
+    except json.JSONDecodeError:
+        try:
+            obj, _ = _DECODER.raw_decode(repair_json(text[start:]))
+        except json.JSONDecodeError:
+            return None
+    return obj if isinstance(obj, dict) else None
+
+
+def repair_json(text: str) -> str:
+    """
+    修复模型输出中常见的JSON格式问题：单引号或智能引号作定界符、字符串中未转义的换行、
+    Python 的 True/False/None、// 和 /* */ 注释、对象和数组末尾多余的逗号。
+    由一个正则表达式单次扫描完成，字符串内容不会被误改
+    """
+    return _REPAIR_PATTERN.sub(_repair_token, text)
+
+
+def _repair_token(match) -> str:
+    token = match.group()
+    first = token[0]
+    if first == '"':
+        return token.replace('\n', '\\n') if '\n' in token else token
+    if first in '\'“‘':
+        return '"' + _STRING_CONTENT_PATTERN.sub(_repair_string_content, token[1:-1]) + '"'
+    if first in '/,':
+        return ''
+    return _PYTHON_LITERALS[token]
+
+
+def _repair_string_content(match) -> str:
+    char = match.group()
+    if char == '"':
+        return '\\"'
+    if char == '\n':
+        return '\\n'
+    # 单引号字符串中的 \' 在JSON中不是合法转义
+    return "'" if char == "\\'" else char
+
+
+def to_label_data(obj: dict) -> dict:
+    """
+    将解析得到的JSON对象转换为标签数据：两个元素的列表转换为元组（如图片数据 (说明, 路径)），
+    其余值保持不变
+    """
+    return {tag: tuple(value) if isinstance(value, list) and len(value) == 2 else value
+            for tag, value in obj.items()}
+
+
+def decode_label_data(text: Optional[str]) -> Optional[dict]:
+    """解析大模型输出并转换为标签数据，无法解析时返回 None"""
+    obj = decode_json_object(text)
+    return to_label_data(obj) if obj is not None else None
+
@@ -1,5 +1,12 @@
+import contextlib
 import os
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
 
 def make_sure_path(path: str):
     """
@@ -7,3 +14,48 @@ def make_sure_path(path: str):
     """
     if not os.path.exists(path):
         os.makedirs(path)
+
+
+@contextlib.contextmanager
+def file_lock(path: str):
+    """
+    跨进程文件锁：锁定 path 对应的锁文件（path.lock），同一时间只有一个进程或线程进入，
+    用于多个工作进程读写同一文件
+    """
+    lock_path = f"{path}.lock"
+    directory = os.path.dirname(lock_path)
+    if directory:
+        make_sure_path(directory)
+    with open(lock_path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    # LK_LOCK 重试约10秒后仍未获得锁时抛出 OSError，继续等待
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def make_doc_file_name(wps_number) -> str:
+    """
+    根据工艺规程编号(WPS)生成文档文件名（不含扩展名），编号无效时生成随机文件名
+    """
+    if wps_number is not None:
+        wps_number = str(wps_number).strip()
+        if wps_number and wps_number != 'nan':
+            # 处理文件名中的特殊字符，将斜杠替换为合法字符（如 G/TS 改为 GTS）
+            return wps_number.replace('/', '').replace('\\', '')
+    import uuid
+    return f"generated_doc_{str(uuid.uuid4())[:8]}"
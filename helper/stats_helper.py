@@ -0,0 +1,28 @@
+import math
+from typing import Dict, Iterable
+
+
+def percentile(values: Iterable[float], p: float) -> float:
+    """
+    计算百分位数（最近秩法），values 为空时返回 0
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(math.ceil(p / 100 * len(ordered)), 1)
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize_latencies(values: Iterable[float]) -> Dict[str, float]:
+    """
+    汇总延迟数据：样本数、平均值及 p50/p95/p99/最大值
+    """
+    values = list(values)
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values) if values else 0.0,
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': max(values) if values else 0.0
+    }
@@ -0,0 +1,78 @@
+import json
+from typing import Any, List, Tuple
+
+
+class StreamingJSONParser:
+    """
+    增量JSON解析器：逐块接收大模型的流式输出，每当顶层对象的一个字段的值完整时立即返回该字段。
+    忽略第一个 '{' 之前的内容（如 ```json 标记），只扫描新到达的字符，不重复解析已接收的文本
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.errors = []
+        self.done = False
+        self._buffer = []
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        接收一段文本
+
+        Returns:
+            List: 本段文本中完成的 (字段名, 字段值) 列表，按出现顺序排列
+        """
+        completed = []
+        if self.done or not chunk:
+            return completed
+
+        for char in chunk:
+            if not self._started:
+                if char != '{':
+                    continue
+                self._started = True
+                self._depth = 1
+                continue
+
+            self._buffer.append(char)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._complete_member(completed)
+                    self.done = True
+                    break
+            elif char == ',' and self._depth == 1:
+                self._complete_member(completed)
+        return completed
+
+    def _complete_member(self, completed: list):
+        """解析缓冲区中的一个顶层字段（不含结尾的 ',' 或 '}'），并清空缓冲区"""
+        member = ''.join(self._buffer[:-1]).strip()
+        self._buffer = []
+        if not member:
+            return
+        try:
+            item = json.loads('{' + member + '}')
+        except json.JSONDecodeError as e:
+            self.errors.append(f"{member[:50]}: {str(e)}")
+            return
+        for key, value in item.items():
+            self.data[key] = value
+            completed.append((key, value))
@@ -0,0 +1,42 @@
+import math
+import re
+from typing import Optional, Tuple
+
+# 中日韩文字及全角标点，每个字符约计 1 个token
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的token数：中文字符每字约 1 个token，其余字符约每 4 个字符 1 个token
+    """
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    return cjk_count + math.ceil((len(text) - cjk_count) / 4)
+
+
+def estimate_messages_tokens(messages: list) -> int:
+    """
+    估算消息列表的token数，每条消息额外计入少量格式开销
+    """
+    return sum(estimate_tokens(m.get('content') or '') + 4 for m in messages)
+
+
+def get_prompt_cache_tokens(usage) -> Tuple[Optional[int], Optional[int]]:
+    """
+    读取接口返回的提示词前缀缓存用量，返回 (命中缓存的token数, 未命中的token数)：
+    DeepSeek 为 prompt_cache_hit_tokens/prompt_cache_miss_tokens，OpenAI 为 prompt_tokens_details.cached_tokens，
+    接口未返回时为 None
+    """
+    if usage is None:
+        return None, None
+    hit = getattr(usage, 'prompt_cache_hit_tokens', None)
+    miss = getattr(usage, 'prompt_cache_miss_tokens', None)
+    if hit is None:
+        hit = getattr(getattr(usage, 'prompt_tokens_details', None), 'cached_tokens', None)
+    if hit is not None and miss is None:
+        prompt_tokens = getattr(usage, 'prompt_tokens', None)
+        if prompt_tokens is not None:
+            miss = prompt_tokens - hit
+    return hit, miss
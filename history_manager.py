@@ -0,0 +1,79 @@
+from typing import List
+
+from helper.token_helper import estimate_messages_tokens
+
+
+class HistoryManager:
+    """
+    对话历史管理器：按token预算构建发送给大模型的历史消息。
+    最新一次助手回复（完整JSON）和最近几条用户指令原样保留，更早的轮次合并为一条指令摘要，
+    被后续回复取代的旧JSON不再重复发送，使多轮修改时提示词长度保持有界
+    """
+
+    SUMMARY_TITLE = "此前依次提出的指令（已合并，均已在最新的JSON中生效）："
+    SUMMARY_REPLY = "已按上述指令完成修改，最新的完整JSON见后续回复。"
+    SUPERSEDED_REPLY = "已按该指令输出完整JSON（已被后续回复取代）。"
+
+    def __init__(self, token_budget: int = 4000, keep_recent_turns: int = 2):
+        """
+        Args:
+            token_budget: 历史消息的token预算（不含系统提示词和本轮消息）
+            keep_recent_turns: 原样保留的最近用户指令条数
+        """
+        self.token_budget = token_budget
+        self.keep_recent_turns = keep_recent_turns
+
+    def build(self, history: List[dict]) -> List[dict]:
+        """
+        根据完整的对话历史构建发送给大模型的历史消息
+
+        Args:
+            history: 完整的对话历史，按 user/assistant 交替排列
+
+        Returns:
+            List: 控制在token预算内的历史消息
+        """
+        turns = self._split_turns(history)
+        if not turns:
+            return []
+
+        keep_count = max(self.keep_recent_turns, 1)
+        while True:
+            messages = self._compose(turns, keep_count)
+            if keep_count <= 1 or estimate_messages_tokens(messages) <= self.token_budget:
+                break
+            keep_count -= 1
+
+        # 仍超出预算时从最早的指令开始删减摘要；最新的JSON和最近一条指令始终保留
+        older = turns[:-keep_count]
+        while older and estimate_messages_tokens(messages) > self.token_budget:
+            older = older[1:]
+            messages = self._compose(older + turns[-keep_count:], keep_count)
+        return messages
+
+    def _compose(self, turns: list, keep_count: int) -> List[dict]:
+        older, recent = turns[:-keep_count], turns[-keep_count:]
+        messages = []
+        if older:
+            instructions = [f"{i + 1}. {user}" for i, (user, _) in enumerate(older)]
+            messages.append({"role": "user", "content": self.SUMMARY_TITLE + "\n" + "\n".join(instructions)})
+            messages.append({"role": "assistant", "content": self.SUMMARY_REPLY})
+
+        for i, (user, assistant) in enumerate(recent):
+            messages.append({"role": "user", "content": user})
+            is_latest = i == len(recent) - 1
+            messages.append({"role": "assistant", "content": assistant if is_latest else self.SUPERSEDED_REPLY})
+        return messages
+
+    @staticmethod
+    def _split_turns(history: List[dict]) -> list:
+        """将历史拆分为 (用户指令, 助手回复) 轮次"""
+        turns = []
+        user = None
+        for message in history:
+            if message["role"] == "user":
+                user = message["content"]
+            elif message["role"] == "assistant" and user is not None:
+                turns.append((user, message["content"]))
+                user = None
+        return turns
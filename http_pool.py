@@ -0,0 +1,197 @@
+import asyncio
+import contextvars
+import importlib.util
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import openai
+
+try:
+    import httpx
+except ImportError:  # 新版 openai SDK 基于 httpx2
+    import httpx2 as httpx
+
+# 计入连接建立耗时的阶段（trace 事件名去掉 .started/.complete 后缀）
+_CONNECT_PHASES = {
+    'connection.connect_tcp': 'tcp_seconds',
+    'connection.connect_unix_socket': 'tcp_seconds',
+    'connection.start_tls': 'tls_seconds',
+}
+# 当前调用（线程或异步任务）的连接用量，由 track_connections 设置
+_call_usage = contextvars.ContextVar('http_pool_call_usage', default=None)
+
+
+class SharedHTTPPool:
+    """
+    进程内共享的HTTP连接池：所有 DeepSeekClient 复用同一个连接池，保持长连接，避免每个客户端、
+    每次请求重新进行TCP/TLS握手；安装了 h2 时启用 HTTP/2。
+    通过 httpcore 的 trace 扩展统计新建连接的次数和握手耗时。
+    fork 出的子进程（如批量生成的工作进程）会丢弃继承的连接，按需创建自己的连接池
+    """
+
+    max_connections = 32  # 最大连接数
+    max_keepalive_connections = 16  # 最大空闲长连接数
+    keepalive_expiry = 60.0  # 空闲长连接保留时间（秒）
+    http2 = importlib.util.find_spec('h2') is not None
+
+    _lock = threading.Lock()
+    _client = None
+    _async_client = None
+    _async_loop = None
+    _stats = None
+
+    @classmethod
+    def configure(cls, max_connections: Optional[int] = None, max_keepalive_connections: Optional[int] = None,
+                  keepalive_expiry: Optional[float] = None, http2: Optional[bool] = None):
+        """
+        调整连接池参数，已创建的连接池会被关闭并在下次使用时按新参数重建
+
+        Args:
+            max_connections: 最大连接数
+            max_keepalive_connections: 最大空闲长连接数
+            keepalive_expiry: 空闲长连接保留时间（秒）
+            http2: 是否启用 HTTP/2（需要安装 h2）
+        """
+        if max_connections is not None:
+            cls.max_connections = max_connections
+        if max_keepalive_connections is not None:
+            cls.max_keepalive_connections = max_keepalive_connections
+        if keepalive_expiry is not None:
+            cls.keepalive_expiry = keepalive_expiry
+        if http2 is not None:
+            if http2 and importlib.util.find_spec('h2') is None:
+                print("警告：未安装 h2，无法启用 HTTP/2，继续使用 HTTP/1.1")
+                http2 = False
+            cls.http2 = http2
+        cls.close()
+
+    @classmethod
+    def _limits(cls):
+        return httpx.Limits(max_connections=cls.max_connections,
+                            max_keepalive_connections=cls.max_keepalive_connections,
+                            keepalive_expiry=cls.keepalive_expiry)
+
+    @classmethod
+    def get_client(cls):
+        """获取共享的同步HTTP客户端，作为 OpenAI(http_client=...) 参数"""
+        with cls._lock:
+            if cls._client is None:
+                cls._client = openai.DefaultHttpxClient(limits=cls._limits(), http2=cls.http2,
+                                                        event_hooks={'request': [cls._trace_request]})
+            return cls._client
+
+    @classmethod
+    def get_async_client(cls):
+        """
+        获取共享的异步HTTP客户端，作为 AsyncOpenAI(http_client=...) 参数。
+        异步连接与事件循环绑定，需在事件循环中调用；事件循环变化时重新创建
+        """
+        loop = asyncio.get_running_loop()
+        with cls._lock:
+            if cls._async_client is None or cls._async_loop is not loop:
+                cls._async_client = openai.DefaultAsyncHttpxClient(limits=cls._limits(), http2=cls.http2,
+                                                                   event_hooks={'request': [cls._atrace_request]})
+                cls._async_loop = loop
+            return cls._async_client
+
+    @classmethod
+    def close(cls):
+        """关闭同步连接池，丢弃异步连接池（其连接随所属事件循环关闭）"""
+        with cls._lock:
+            client, cls._client = cls._client, None
+            cls._async_client = None
+            cls._async_loop = None
+        if client is not None:
+            client.close()
+
+    @classmethod
+    def _reset_after_fork(cls):
+        # 子进程不能与父进程共用套接字，直接丢弃继承的连接池而不关闭
+        cls._lock = threading.Lock()
+        cls._client = None
+        cls._async_client = None
+        cls._async_loop = None
+        cls.reset_stats()
+
+    @classmethod
+    def reset_stats(cls):
+        """重置连接统计"""
+        cls._stats = {'requests': 0, 'connections': 0, 'tcp_seconds': 0.0, 'tls_seconds': 0.0}
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Any]:
+        """
+        连接统计：请求数、新建连接数、连接复用率及握手总耗时和平均耗时（毫秒）
+        """
+        stats = dict(cls._stats)
+        connections = stats['connections']
+        setup_seconds = stats['tcp_seconds'] + stats['tls_seconds']
+        stats['reuse_rate'] = 1 - connections / stats['requests'] if stats['requests'] else 0.0
+        stats['setup_ms_total'] = setup_seconds * 1000
+        stats['setup_ms_per_connection'] = setup_seconds * 1000 / connections if connections else 0.0
+        stats['setup_ms_per_request'] = setup_seconds * 1000 / stats['requests'] if stats['requests'] else 0.0
+        return stats
+
+    @classmethod
+    def print_stats(cls):
+        """打印连接统计"""
+        stats = cls.get_stats()
+        print(f"HTTP连接统计：请求 {stats['requests']} 次，新建连接 {stats['connections']} 个，"
+              f"复用率 {stats['reuse_rate']:.0%}，握手耗时共 {stats['setup_ms_total']:.1f}毫秒"
+              f"（每个连接 {stats['setup_ms_per_connection']:.1f}毫秒，"
+              f"平均每个请求 {stats['setup_ms_per_request']:.2f}毫秒）")
+
+    @staticmethod
+    def track_connections() -> Dict[str, Any]:
+        """
+        开始统计当前线程或异步任务中的请求新建的连接，返回的字典在请求过程中累计
+        connections（新建连接数）和 setup_seconds（握手耗时）
+        """
+        usage = {'connections': 0, 'setup_seconds': 0.0}
+        _call_usage.set(usage)
+        return usage
+
+    @classmethod
+    def _record(cls, name: str, started: Dict[str, float]):
+        """处理一个 trace 事件，started 记录本次请求各阶段的开始时间"""
+        phase, _, event = name.rpartition('.')
+        if phase not in _CONNECT_PHASES:
+            return
+        if event == 'started':
+            started[phase] = time.perf_counter()
+        elif event == 'complete' and phase in started:
+            seconds = time.perf_counter() - started.pop(phase)
+            is_new_connection = phase != 'connection.start_tls'
+            with cls._lock:
+                cls._stats[_CONNECT_PHASES[phase]] += seconds
+                if is_new_connection:
+                    cls._stats['connections'] += 1
+            usage = _call_usage.get()
+            if usage is not None:
+                usage['setup_seconds'] += seconds
+                usage['connections'] += is_new_connection
+
+    @classmethod
+    def _trace_request(cls, request):
+        started = {}
+        with cls._lock:
+            cls._stats['requests'] += 1
+        request.extensions['trace'] = lambda name, info: cls._record(name, started)
+
+    @classmethod
+    async def _atrace_request(cls, request):
+        started = {}
+        with cls._lock:
+            cls._stats['requests'] += 1
+
+        async def trace(name, info):
+            cls._record(name, started)
+
+        request.extensions['trace'] = trace
+
+
+SharedHTTPPool.reset_stats()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=SharedHTTPPool._reset_after_fork)
@@ -1,6 +1,6 @@
 import time
 from abc import ABCMeta, abstractmethod
-from typing import Any, List
+from typing import TYPE_CHECKING, Any, List, Optional
 import os
 
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
@@ -10,10 +10,15 @@ from docx.table import Table, _Cell
 from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
 
-from helper import image_size
+from helper.image_cache import ImageCache
+from helper.image_optimizer import ImageOptimizer
 from helper.docx_helper import *
 from helper.type_helper import *
 
+if TYPE_CHECKING:
+    # render_context 导入了本模块，只在类型检查时导入，避免循环导入
+    from render_context import RenderContext
+
 
 class Label(metaclass=ABCMeta):
     """
@@ -40,8 +45,8 @@ class Label(metaclass=ABCMeta):
 
     @classmethod
     @abstractmethod
-    def insert_data_to_point(cls, point_data: dict, data: Any, static_datas: dict) -> None:
-        """在插入点插入数据"""
+    def insert_data_to_point(cls, point_data: dict, data: Any, context: 'RenderContext') -> None:
+        """在插入点插入数据，context 为本次生成任务的渲染上下文（静态数据、模板目录等）"""
         pass
 
     @classmethod
@@ -99,7 +104,7 @@ class TextLabel(ContentLabel):
         return 'text'
 
     @classmethod
-    def insert_data_to_point(cls, point_data: dict, data: Any, static_datas: dict) -> None:
+    def insert_data_to_point(cls, point_data: dict, data: Any, context: 'RenderContext') -> None:
         # 处理跨run的情况
         if 'containing_runs' in point_data:
             containing_runs = point_data['containing_runs']
@@ -154,7 +159,7 @@ class DateLabel(NoContentLabel):
         static_datas[cls.get_type()] = date_s
 
     @classmethod
-    def insert_data_to_point(cls, point_data: dict, data: Any, static_datas: dict) -> None:
+    def insert_data_to_point(cls, point_data: dict, data: Any, context: 'RenderContext') -> None:
         # 检查是否包含多个runs
         if 'containing_runs' in point_data:
             containing_runs = point_data['containing_runs']
@@ -169,7 +174,7 @@ class DateLabel(NoContentLabel):
             suffix = last_run.text[end_offset:]
 
             # 更新第一个run的文本
-            first_run.text = prefix + static_datas[point_data['type']]
+            first_run.text = prefix + context.static_datas[point_data['type']]
 
             # 清空中间的runs
             for run_info in containing_runs[1:-1]:
@@ -180,7 +185,7 @@ class DateLabel(NoContentLabel):
                 last_run.text = suffix
         else:
             # 如果只有一个run，直接替换文本
-            new_text = point_data['run'].text.replace(point_data['text'], static_datas[point_data['type']])
+            new_text = point_data['run'].text.replace(point_data['text'], context.static_datas[point_data['type']])
             point_data['run'].text = new_text
 
         # 如果是表格单元格中的标签，需要特殊处理段落格式
@@ -209,7 +214,7 @@ class TimeLabel(NoContentLabel):
         static_datas[cls.get_type()] = time_s
 
     @classmethod
-    def insert_data_to_point(cls, point_data: dict, data: Any, static_datas: dict) -> None:
+    def insert_data_to_point(cls, point_data: dict, data: Any, context: 'RenderContext') -> None:
         # Check if containing_runs exists for handling multi-run cases
         if 'containing_runs' in point_data:
             containing_runs = point_data['containing_runs']
@@ -223,7 +228,7 @@ class TimeLabel(NoContentLabel):
             end_offset = point_data['end_pos'] - last_run_start
             suffix = last_run.text[end_offset:]
 
-            first_run.text = prefix + static_datas[point_data['type']]
+            first_run.text = prefix + context.static_datas[point_data['type']]
 
             for run_info in containing_runs[1:-1]:
                 run_info['run'].text = ''
@@ -231,7 +236,7 @@ class TimeLabel(NoContentLabel):
             if len(containing_runs) > 1:
                 last_run.text = suffix
         else:
-            new_text = point_data['run'].text.replace(point_data['text'], static_datas[point_data['type']])
+            new_text = point_data['run'].text.replace(point_data['text'], context.static_datas[point_data['type']])
             point_data['run'].text = new_text
 
 
@@ -244,7 +249,7 @@ class OrderedListLabel(ContentLabel):
         return 'ordered-list'
 
     @classmethod
-    def insert_data_to_point(cls, point_data: dict, data: Any, static_datas: dict) -> None:
+    def insert_data_to_point(cls, point_data: dict, data: Any, context: 'RenderContext') -> None:
         paragraph = point_data['paragraph']
         for i, item in enumerate(data):
             p = paragraph.insert_paragraph_before(f'{i + 1}. {item}')
@@ -271,7 +276,7 @@ class UnorderedListLabel(ContentLabel):
         return 'unordered-list'
 
     @classmethod
-    def insert_data_to_point(cls, point_data: dict, data: Any, static_datas: dict) -> None:
+    def insert_data_to_point(cls, point_data: dict, data: Any, context: 'RenderContext') -> None:
         paragraph = point_data['paragraph']
         for i, item in enumerate(data):
             p = paragraph.insert_paragraph_before(f'{cls._header_chars[cls._default_header_char]}{" " * cls._default_header_gap}{item}')
@@ -293,7 +298,7 @@ class ImageLabel(ContentLabel):
         return 'image'
 
     @classmethod
-    def insert_data_to_point(cls, point_data: dict, data: Any, static_datas: dict) -> None:
+    def insert_data_to_point(cls, point_data: dict, data: Any, context: 'RenderContext') -> None:
         """支持多种表格形式中的图片插入，自适应大小居中显示，并且图片描述也居中"""
         try:
             pic_desc, pic_url = data
@@ -304,38 +309,21 @@ class ImageLabel(ContentLabel):
             in_table = 'cell' in point_data
             cell = point_data.get('cell', None)
             
-            # 增强图片路径处理
             import os
-            if not os.path.exists(pic_url):
-                # 尝试在模板文件所在目录查找
-                template_dir = os.path.dirname(document.path) if hasattr(document, 'path') else ''
-                possible_paths = [
-                    pic_url,  # 原始路径
-                    os.path.join(os.getcwd(), pic_url),  # 当前工作目录下
-                    os.path.join(template_dir, pic_url),  # 模板文件所在目录
-                    os.path.abspath(pic_url),  # 绝对路径
-                    os.path.join(os.path.dirname(os.path.abspath(__file__)), pic_url),  # 脚本文件目录
-                    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', pic_url),  # 项目根目录
-                ]
-                
-                # 检查所有可能的路径
-                found = False
-                for path in possible_paths:
-                    if os.path.exists(path):
-                        pic_url = path
-                        found = True
-                        break
-                
-                if not found:
-                    print(f"错误：图片文件不存在 - {pic_url}")
-                    # 如果图片不存在，保留标签
-                    if 'run' in point_data and point_data['run'] is not None:
-                        point_data['run'].text = point_data['text'] + "(找不到图片)"
-                    return
+            found_url = cls.resolve_pic_url(pic_url, context)
+            if found_url is None:
+                print(f"错误：图片文件不存在 - {pic_url}")
+                # 如果图片不存在，保留标签
+                if 'run' in point_data and point_data['run'] is not None:
+                    point_data['run'].text = point_data['text'] + "(找不到图片)"
+                return
+            pic_url = found_url
             
-            # 获取图片尺寸
+            # 从图片缓存获取图片内容和尺寸，同一图片插入多份文档时只读取一次
+            image = None
             try:
-                img_width, img_height = image_size.get(pic_url)
+                image = ImageCache.get(pic_url)
+                img_width, img_height = image.width, image.height
             except Exception as e:
                 print(f"警告：获取图片尺寸时出错 - {str(e)}")
                 # 使用合理的默认值
@@ -425,9 +413,18 @@ class ImageLabel(ContentLabel):
                 ip = paragraph.insert_paragraph_before()
                 ir = ip.add_run()
             
+            # 按最终宽度缩小并重新压缩图片（渲染上下文启用图片优化时）
+            if image is not None and context is not None and context.optimize_images:
+                image = ImageOptimizer.optimize(image, int(final_width), context.image_dpi)
+
             # 插入图片
             try:
-                picture = ir.add_picture(pic_url, width=final_width)
+                if image is not None:
+                    picture = ir.add_picture(image.open(), width=final_width)
+                    # 从内存插入时图片默认命名为 image.png，改回原文件名
+                    picture._inline.graphic.graphicData.pic.nvPicPr.cNvPr.name = os.path.basename(pic_url)
+                else:
+                    picture = ir.add_picture(pic_url, width=final_width)
             except Exception as e:
                 print(f"插入图片失败: {pic_url}, 错误: {str(e)}")
                 # 在遇到错误时，保留原始标签
@@ -485,6 +482,36 @@ class ImageLabel(ContentLabel):
             if 'run' in point_data and point_data['run'] is not None:
                 point_data['run'].text = point_data['text'] + "(处理出错)"
 
+    @classmethod
+    def resolve_pic_url(cls, pic_url: str, context: Optional['RenderContext'] = None) -> Optional[str]:
+        """
+        查找图片文件：路径存在时直接使用；否则先在图片素材索引中查找（字典查找，无需逐个位置检查文件是否存在），
+        索引中没有时再依次尝试各个可能的位置，都找不到时返回 None
+        """
+        if os.path.exists(pic_url):
+            return pic_url
+        template_dir = context.template_dir if context is not None else ''
+        if context is not None:
+            resolved_url = context.asset_index.resolve(pic_url, template_dir)
+            if resolved_url is not None:
+                return resolved_url
+
+        # 尝试在模板文件所在目录查找
+        possible_paths = [
+            pic_url,  # 原始路径
+            os.path.join(os.getcwd(), pic_url),  # 当前工作目录下
+            os.path.join(template_dir, pic_url),  # 模板文件所在目录
+            os.path.abspath(pic_url),  # 绝对路径
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), pic_url),  # 脚本文件目录
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', pic_url),  # 项目根目录
+        ]
+
+        # 检查所有可能的路径
+        for path in possible_paths:
+            if os.path.exists(path):
+                return path
+        return None
+
     @classmethod
     def check_data_type(cls, data: Any) -> bool:
         """要求data为tuple，第一个元素是描述字符串（可为None），第二个元素是图片url"""
@@ -500,7 +527,7 @@ class LinkLabel(ContentLabel):
         return 'link'
 
     @classmethod
-    def insert_data_to_point(cls, point_data: dict, data: Any, static_datas: dict) -> None:
+    def insert_data_to_point(cls, point_data: dict, data: Any, context: 'RenderContext') -> None:
         """将包含标签的 run 替换为 link"""
         link_n, link_url = data
         paragraph = point_data['paragraph']
@@ -561,7 +588,7 @@ class TableLabel(ContentLabel):
         return 'table'
 
     @classmethod
-    def insert_data_to_point(cls, point_data: dict, data: Any, static_datas: dict) -> None:
+    def insert_data_to_point(cls, point_data: dict, data: Any, context: 'RenderContext') -> None:
         """在内容标签的 paragraph 下插入表格，并删除内容标签的 paragraph"""
         document = point_data['document']
         paragraph = point_data['paragraph']
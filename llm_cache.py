@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class LLMResponseCache:
+    """
+    大模型回复的磁盘缓存：以系统提示词、规范化后的输入数据、用户消息和模型参数的哈希为键，
+    保存在 SQLite 数据库中；按条目数和存放时间淘汰旧记录，重复生成相同数据时无需再次请求 API
+    """
+
+    # 位于项目目录下，与启动程序时的工作目录无关
+    DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', '.llm_cache.sqlite3')
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, max_entries: int = 2000, max_age: float = 30 * 24 * 3600):
+        """
+        Args:
+            db_path: 缓存数据库文件路径
+            max_entries: 最多保留的缓存条目数，超出时淘汰最久未使用的记录
+            max_age: 缓存有效期（秒），过期记录视为未命中并被删除
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.enabled = True
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        self._connection = None
+
+    @staticmethod
+    def make_key(system_prompt: str, processed_data: Optional[Dict[str, Any]], message: str,
+                 model_params: Dict[str, Any]) -> str:
+        """计算缓存键，输入数据按键排序并去除字符串首尾空白，字段顺序不同不影响命中"""
+        if processed_data:
+            processed_data = {str(k): v.strip() if isinstance(v, str) else v for k, v in processed_data.items()}
+        content = json.dumps({
+            'system_prompt': system_prompt,
+            'processed_data': processed_data,
+            'message': message.strip(),
+            'model_params': model_params
+        }, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存的回复，未命中或已过期时返回 None"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        try:
+            with self._lock:
+                connection = self._connect()
+                row = connection.execute('SELECT response, created_at FROM responses WHERE key = ?', (key,)).fetchone()
+                if row is not None and now - row[1] > self.max_age:
+                    connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+                    connection.commit()
+                    self.stats['evictions'] += 1
+                    row = None
+                if row is None:
+                    self.stats['misses'] += 1
+                    return None
+                connection.execute('UPDATE responses SET accessed_at = ?, hits = hits + 1 WHERE key = ?', (now, key))
+                connection.commit()
+                self.stats['hits'] += 1
+                return row[0]
+        except sqlite3.Error as e:
+            print(f"警告：读取大模型回复缓存失败 - {str(e)}")
+            return None
+
+    def put(self, key: str, response: str):
+        """写入回复并按有效期和条目数淘汰旧记录"""
+        if not self.enabled:
+            return
+        now = time.time()
+        try:
+            with self._lock:
+                connection = self._connect()
+                connection.execute('INSERT OR REPLACE INTO responses (key, response, created_at, accessed_at, hits) '
+                                   'VALUES (?, ?, ?, ?, 0)', (key, response, now, now))
+                self.stats['writes'] += 1
+                self._evict(connection, now)
+                connection.commit()
+        except sqlite3.Error as e:
+            print(f"警告：写入大模型回复缓存失败 - {str(e)}")
+
+    def clear(self):
+        """清空缓存及统计信息"""
+        try:
+            with self._lock:
+                connection = self._connect()
+                connection.execute('DELETE FROM responses')
+                connection.commit()
+        except sqlite3.Error as e:
+            print(f"警告：清空大模型回复缓存失败 - {str(e)}")
+        for name in self.stats:
+            self.stats[name] = 0
+
+    def get_hit_rate(self) -> float:
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # 调用方需持有 self._lock；多进程批量生成时每个进程各自打开连接
+        if self._connection is None:
+            directory = os.path.dirname(os.path.abspath(self.db_path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS responses ('
+                               'key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL, '
+                               'accessed_at REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)')
+            connection.execute('CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses (accessed_at)')
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def _evict(self, connection: sqlite3.Connection, now: float):
+        expired = connection.execute('DELETE FROM responses WHERE created_at < ?', (now - self.max_age,)).rowcount
+        count = connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            connection.execute('DELETE FROM responses WHERE key IN '
+                               '(SELECT key FROM responses ORDER BY accessed_at LIMIT ?)', (overflow,))
+        self.stats['evictions'] += max(expired, 0) + max(overflow, 0)
@@ -0,0 +1,230 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional
+
+from helper.os_helper import file_lock
+from helper.stats_helper import summarize_latencies
+from helper.token_helper import get_prompt_cache_tokens
+from http_pool import SharedHTTPPool
+
+
+class LLMTelemetry:
+    """
+    大模型调用遥测：每次调用记录一条结构化数据（首个token延迟、总延迟、输出速度、token用量、重试次数、
+    调用结果及各阶段耗时），追加写入按大小滚动的 JSONL 文件，并可汇总为 p50/p95/p99 分布。
+
+    各阶段耗时：prepare（请求前的本地处理，如计算工艺参数）、queue（等待并发名额）、connect（新建连接的握手）、
+    ttft（发出请求到首个token）、generation（首个token到最后一个token）、
+    processing（除接口请求外的本地处理总耗时）
+    """
+
+    # 位于项目目录下，与启动程序时的工作目录无关
+    DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', '.llm_metrics.jsonl')
+
+    def __init__(self, path: str = DEFAULT_PATH, max_bytes: int = 5 * 1024 * 1024, backup_count: int = 3,
+                 max_records: int = 10000):
+        """
+        Args:
+            path: 指标文件路径
+            max_bytes: 单个文件的最大字节数，超出时滚动为 path.1、path.2 ...
+            backup_count: 保留的历史文件个数
+            max_records: 内存中保留的最近调用记录数，完整记录见指标文件
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.enabled = True
+        self.records = deque(maxlen=max_records)  # 本进程最近的调用记录
+        self._lock = threading.Lock()
+
+    def start(self, kind: str, stream: bool = False, model: Optional[str] = None) -> Dict[str, Any]:
+        """
+        开始记录一次调用
+
+        Args:
+            kind: 调用类型，generate（生成）或 patch（增量修改）
+            stream: 是否为流式请求
+            model: 模型名称
+
+        Returns:
+            调用记录，依次传给 mark_request、mark_first_token 和 finish
+        """
+        return {
+            'timestamp': time.time(), 'kind': kind, 'source': 'llm', 'stream': stream, 'model': model,
+            'outcome': None, 'error': None, 'retries': 0,
+            '_start': time.perf_counter(), '_queue_start': None, '_request_start': None, '_first_token': None, '_response_end': None,
+            '_connection_usage': None
+        }
+
+    @staticmethod
+    def is_finished(record: Dict[str, Any]) -> bool:
+        """调用记录是否已结束并写入"""
+        return record['outcome'] is not None
+
+    @staticmethod
+    def mark_queue(record: Dict[str, Any]):
+        """本地准备完成，开始等待并发名额"""
+        record['_queue_start'] = time.perf_counter()
+
+    @staticmethod
+    def mark_request(record: Dict[str, Any]):
+        """本地准备完成，即将发出请求"""
+        record['_request_start'] = time.perf_counter()
+        record['_connection_usage'] = SharedHTTPPool.track_connections()
+
+    @staticmethod
+    def mark_first_token(record: Dict[str, Any]):
+        """收到首个内容token"""
+        if record['_first_token'] is None:
+            record['_first_token'] = time.perf_counter()
+
+    @staticmethod
+    def mark_response(record: Dict[str, Any]):
+        """接口响应接收完毕（流式请求为最后一个数据块）"""
+        record['_response_end'] = time.perf_counter()
+
+    def finish(self, record: Dict[str, Any], outcome: str = 'success', usage=None, source: Optional[str] = None,
+               error: Optional[BaseException] = None) -> Dict[str, Any]:
+        """
+        结束记录并写入指标文件
+
+        Args:
+            record: start 返回的调用记录
+            outcome: 调用结果，success（成功）、error（请求失败）或 invalid（回复无效）
+            usage: 接口返回的token用量
+            source: 回复来源，llm（大模型）、local（本地规则引擎）或 cache（回复缓存）
+            error: 失败时的异常
+        """
+        end = time.perf_counter()
+        start = record.pop('_start')
+        queue_start = record.pop('_queue_start')
+        request_start = record.pop('_request_start')
+        first_token = record.pop('_first_token')
+        response_end = record.pop('_response_end') or end
+        connection_usage = record.pop('_connection_usage')
+
+        record['outcome'] = outcome
+        if source is not None:
+            record['source'] = source
+        if error is not None:
+            record['error'] = f"{type(error).__name__}: {error}"
+        record['total_seconds'] = end - start
+        record['prepare_seconds'] = (queue_start or request_start or end) - start
+        record['queue_seconds'] = (request_start or end) - queue_start if queue_start is not None else 0.0
+        record['latency_seconds'] = response_end - request_start if request_start is not None else None
+        # 非流式请求以完整回复到达的时间作为首个token时间
+        record['ttft_seconds'] = (first_token or response_end) - request_start if request_start is not None else None
+        record['generation_seconds'] = response_end - first_token if first_token is not None else None
+        record['processing_seconds'] = (record['total_seconds'] - (record['latency_seconds'] or 0.0)
+                                        - record['queue_seconds'])
+        record['connections'] = connection_usage['connections'] if connection_usage else 0
+        record['connect_seconds'] = connection_usage['setup_seconds'] if connection_usage else 0.0
+
+        cache_hit_tokens, cache_miss_tokens = get_prompt_cache_tokens(usage)
+        record['prompt_tokens'] = getattr(usage, 'prompt_tokens', None)
+        record['completion_tokens'] = getattr(usage, 'completion_tokens', None)
+        record['cache_hit_tokens'] = cache_hit_tokens
+        record['cache_miss_tokens'] = cache_miss_tokens
+        # 流式请求按生成阶段计算输出速度，非流式请求按整个请求计算
+        output_seconds = record['generation_seconds'] or record['latency_seconds']
+        record['tokens_per_second'] = (record['completion_tokens'] / output_seconds
+                                       if record['completion_tokens'] and output_seconds else None)
+
+        with self._lock:
+            self.records.append(record)
+        self.write(record)
+        return record
+
+    def write(self, record: Dict[str, Any]):
+        """追加一条记录，文件超出大小上限时先滚动；多个工作进程写同一文件时由文件锁保证滚动不丢记录"""
+        if not self.enabled:
+            return
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        try:
+            with self._lock, file_lock(self.path):
+                if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+                    self._rotate()
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+        except OSError as e:
+            print(f"警告：写入调用指标失败 - {str(e)}")
+
+    def _rotate(self):
+        # 调用方需持有 self._lock 和文件锁
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def load(self, include_backups: bool = False) -> List[Dict[str, Any]]:
+        """读取指标文件中的记录（可包括滚动的历史文件），跳过无法解析的行"""
+        paths = [self.path]
+        if include_backups:
+            paths = [f"{self.path}.{index}" for index in range(self.backup_count, 0, -1)] + paths
+        records = []
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        return records
+
+    @staticmethod
+    def summarize(records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        汇总调用记录：按结果和来源计数，累计token用量及重试次数，
+        各阶段耗时和输出速度给出 p50/p95/p99 分布（只统计实际请求大模型的成功调用）
+        """
+        summary = {'calls': 0, 'outcomes': {}, 'sources': {}, 'retries': 0,
+                   'prompt_tokens': 0, 'completion_tokens': 0, 'cache_hit_tokens': 0}
+        llm_records = []
+        for record in records:
+            summary['calls'] += 1
+            summary['outcomes'][record['outcome']] = summary['outcomes'].get(record['outcome'], 0) + 1
+            summary['sources'][record['source']] = summary['sources'].get(record['source'], 0) + 1
+            summary['retries'] += record.get('retries') or 0
+            for name in ('prompt_tokens', 'completion_tokens', 'cache_hit_tokens'):
+                summary[name] += record.get(name) or 0
+            if record['source'] == 'llm' and record['outcome'] == 'success':
+                llm_records.append(record)
+
+        for name in ('total_seconds', 'ttft_seconds', 'generation_seconds', 'latency_seconds', 'prepare_seconds',
+                     'queue_seconds', 'connect_seconds', 'processing_seconds', 'tokens_per_second'):
+            summary[name] = summarize_latencies(r[name] for r in llm_records if r.get(name) is not None)
+        return summary
+
+    @classmethod
+    def print_summary(cls, records: Iterable[Dict[str, Any]]):
+        """打印调用指标汇总"""
+        summary = cls.summarize(records)
+        print(f"大模型调用统计：共 {summary['calls']} 次，结果 {summary['outcomes']}，来源 {summary['sources']}，"
+              f"重试 {summary['retries']} 次；提示词token {summary['prompt_tokens']}"
+              f"（命中前缀缓存 {summary['cache_hit_tokens']}），输出token {summary['completion_tokens']}")
+        labels = [('total_seconds', '总耗时'), ('ttft_seconds', '首个token延迟'), ('generation_seconds', '生成耗时'),
+                  ('queue_seconds', '排队等待'), ('connect_seconds', '建立连接'), ('processing_seconds', '本地处理')]
+        for name, label in labels:
+            stats = summary[name]
+            if stats['count']:
+                print(f"  {label}：p50 {stats['p50']:.3f}秒，p95 {stats['p95']:.3f}秒，p99 {stats['p99']:.3f}秒")
+        speed = summary['tokens_per_second']
+        if speed['count']:
+            print(f"  输出速度：p50 {speed['p50']:.1f}，p95 {speed['p95']:.1f}，p99 {speed['p99']:.1f} token/秒")
+
+
+if __name__ == "__main__":
+    # 汇总指标文件，例如：python llm_telemetry.py [data/.llm_metrics.jsonl]
+    import sys
+
+    telemetry = LLMTelemetry(sys.argv[1] if len(sys.argv) > 1 else LLMTelemetry.DEFAULT_PATH)
+    LLMTelemetry.print_summary(telemetry.load(include_backups=True))
@@ -1,19 +1,24 @@
 from document_generator_gui import DocumentGeneratorGUI
 from helper.os_helper import *
 from data_loader import StaticDataLoader
+from render_context import RenderContext
 from template_analyzer import TemplateAnalyzer
 from doc_processor import DocumentProcessor
 from deepseek_client import DeepSeekClient
 import os
+import multiprocessing
 
 
-def match(file_path: str, save_path: str, datas: dict):
+def match(file_path: str, save_path: str, datas: dict, context: RenderContext = None):
 
-    # 注册每次模板生成过程的静态插入数据
-    TemplateAnalyzer.register_static_datas()
+    # 每次模板生成过程使用独立的渲染上下文（包括静态插入数据），可在多个线程中同时生成
+    if context is None:
+        context = RenderContext(file_path, TemplateAnalyzer.registered_labels)
 
     # 模板检查与预处理
-    check_result = TemplateAnalyzer.check_template(file_path, DocumentProcessor.insert_data_to_no_content_point)
+    with context.timer('check_template'):
+        check_result = TemplateAnalyzer.check_template(file_path, DocumentProcessor.insert_data_to_no_content_point,
+                                                       context=context)
 
     # 模板校验失败直接退出
     if check_result['code'].is_error():
@@ -22,10 +27,12 @@ def match(file_path: str, save_path: str, datas: dict):
     document = check_result['data']['document']
 
     # 处理有内容类型插入点，检查并插入数据，返回没有对应数据的插入点
-    no_data_points = DocumentProcessor.solve_content_labels(insert_points, datas)
+    with context.timer('solve_content_labels'):
+        no_data_points = DocumentProcessor.solve_content_labels(insert_points, datas, context)
 
     # 保存文件
-    document.save(save_path)
+    with context.timer('save'):
+        document.save(save_path)
 
 
 def main():
@@ -61,4 +68,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # 打包为可执行文件后，批量生成使用的多进程需要此调用
+    multiprocessing.freeze_support()
     main()
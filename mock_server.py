@@ -0,0 +1,331 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+from helper.json_helper import decode_json_object
+from helper.token_helper import estimate_messages_tokens, estimate_tokens
+from wps_rules import WPSRuleEngine
+
+
+class _MockHTTPServer(ThreadingHTTPServer):
+    # 并发测试时避免连接因监听队列已满被拒绝
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class MockChatServer:
+    """
+    本地 OpenAI 兼容桩服务器：实现 /chat/completions 接口（含 SSE 流式响应），回放录制的焊接工艺规程JSON，
+    未录制的行由本地规则引擎生成；首个token延迟、输出速度、错误率和 429 比例可配置，
+    固定随机种子时延迟和错误序列可复现，用于离线测试批量生成、缓存和并发功能
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, ttft: float = 0.3, tokens_per_second: float = 60.0,
+                 jitter: float = 0.0, error_rate: float = 0.0, rate_limit_rate: float = 0.0, seed: Optional[int] = None,
+                 recordings_dir: Optional[str] = None):
+        """
+        Args:
+            host: 监听地址
+            port: 监听端口，0 表示自动分配
+            ttft: 首个token延迟（秒）
+            tokens_per_second: 输出速度（token/秒）
+            jitter: 延迟抖动比例，如 0.2 表示在 ±20% 范围内随机
+            error_rate: 返回 500 错误的比例
+            rate_limit_rate: 返回 429 错误的比例
+            seed: 随机种子
+            recordings_dir: 录制的回复目录（每个 .json 文件为一份完整回复），按工艺规程编号回放
+        """
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rule_engine = WPSRuleEngine()
+        self.recordings = self.load_recordings(recordings_dir) if recordings_dir else {}
+        self.stats = {'requests': 0, 'streams': 0, 'replayed': 0, 'generated': 0, 'errors': 0, 'rate_limited': 0}
+        self._prefix_hashes = set()  # 模拟接口的提示词前缀缓存
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.httpd = _MockHTTPServer((host, port), self._make_handler())
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @staticmethod
+    def load_recordings(recordings_dir: str) -> Dict[str, str]:
+        """加载录制的回复，返回 {工艺规程编号: 回复文本}"""
+        recordings = {}
+        for file_name in sorted(os.listdir(recordings_dir)):
+            if not file_name.endswith('.json'):
+                continue
+            with open(os.path.join(recordings_dir, file_name), 'r', encoding='utf-8') as f:
+                content = f.read()
+            data = decode_json_object(content)
+            if data and '工艺规程编号' in data:
+                recordings[str(data['工艺规程编号'])] = content
+            else:
+                print(f"警告：录制文件中没有工艺规程编号，已跳过 - {file_name}")
+        return recordings
+
+    def start(self) -> 'MockChatServer':
+        """在后台线程中启动服务器"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止服务器"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _next_random(self) -> float:
+        with self._lock:
+            return self._random.random()
+
+    def _delay(self, seconds: float) -> float:
+        if self.jitter:
+            seconds *= 1 + self.jitter * (2 * self._next_random() - 1)
+        return max(seconds, 0.0)
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def get_prompt_cache_usage(self, messages: list) -> Dict[str, Any]:
+        """
+        模拟接口的提示词前缀缓存：与之前请求相同的最长消息前缀（不含最后一条消息）计为命中，
+        按 64 token 为单位缓存，返回 DeepSeek 和 OpenAI 两种格式的缓存用量字段
+        """
+        prefix_hashes = []
+        digest = hashlib.sha256()
+        for message in messages[:-1]:
+            digest.update(json.dumps(message, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+            prefix_hashes.append(digest.hexdigest())
+
+        hit_count = 0
+        with self._lock:
+            for count in range(len(prefix_hashes), 0, -1):
+                if prefix_hashes[count - 1] in self._prefix_hashes:
+                    hit_count = count
+                    break
+            self._prefix_hashes.update(prefix_hashes)
+
+        prompt_tokens = estimate_messages_tokens(messages)
+        hit_tokens = estimate_messages_tokens(messages[:hit_count]) // 64 * 64
+        return {"prompt_cache_hit_tokens": hit_tokens, "prompt_cache_miss_tokens": prompt_tokens - hit_tokens,
+                "prompt_tokens_details": {"cached_tokens": hit_tokens}}
+
+    def build_reply(self, messages: list) -> str:
+        """根据请求消息生成回复文本：增量修改请求返回空补丁，生成请求优先回放录制的回复"""
+        system = messages[0].get('content', '') if messages and messages[0].get('role') == 'system' else ''
+        user = messages[-1].get('content', '') if messages else ''
+        if system.startswith('你负责修改'):
+            return '{}'
+        if system.startswith('你负责补全'):
+            # 多行打包的混合生成请求：各行以【编号：...】开头，回复以编号为键、各行补全字段为值
+            if '【编号：' in user:
+                replies = {}
+                for part in user.split('【编号：')[1:]:
+                    key, _, row_text = part.partition('】')
+                    replies[key] = decode_json_object(self._build_completion_reply(row_text))
+                return json.dumps(replies, ensure_ascii=False, indent=4)
+            return self._build_completion_reply(user)
+
+        # 多行打包请求：各行数据以【编号：...】开头，回复以编号为键的JSON对象
+        if '【编号：' in user:
+            replies = {}
+            for part in user.split('【编号：')[1:]:
+                key, _, row_text = part.partition('】')
+                excel_data = self._find_excel_data(row_text)
+                if excel_data:
+                    replies[key] = decode_json_object(self._build_row_reply(excel_data))
+            return json.dumps(replies, ensure_ascii=False, indent=4)
+
+        excel_data = self._find_excel_data(user)
+        if not excel_data:
+            return json.dumps({"错误": "请求中没有Excel数据"}, ensure_ascii=False)
+        return self._build_row_reply(excel_data)
+
+    def _build_completion_reply(self, user: str) -> str:
+        """混合生成请求的回复：只输出需要补全的字段，规则引擎无法确定的值以 "/" 占位"""
+        names_line = user.split('\n', 1)[0]
+        names = names_line.split('：', 1)[1].split('、') if '：' in names_line else []
+        excel_data = self._find_excel_data(user) or {}
+        self._count('generated')
+        fields, _ = self.rule_engine.resolve(excel_data)
+        reply = {}
+        for name in names:
+            if name == "焊接工艺参数":
+                reply[name] = fields.get(name) or [list(self.rule_engine.PARAMETER_TABLE_HEADER)]
+            else:
+                reply[name] = fields.get(name, "/")
+        return json.dumps(reply, ensure_ascii=False, indent=4)
+
+    @staticmethod
+    def _find_excel_data(text: str) -> Optional[dict]:
+        marker = text.find('以下是Excel文件解析的焊接参数数据')
+        return decode_json_object(text[marker:]) if marker >= 0 else None
+
+    def _build_row_reply(self, excel_data: dict) -> str:
+        """单行数据的回复：优先回放录制的回复，否则由规则引擎生成"""
+        recording = self.recordings.get(str(excel_data.get('WPS')))
+        if recording is not None:
+            self._count('replayed')
+            return recording
+
+        self._count('generated')
+        fields, unresolved = self.rule_engine.resolve(excel_data)
+        for name in unresolved:
+            fields[name] = [list(self.rule_engine.PARAMETER_TABLE_HEADER)] if name == "焊接工艺参数" else "/"
+        return json.dumps({name: fields[name] for name in self.rule_engine.FIELD_ORDER}, ensure_ascii=False, indent=4)
+
+    @staticmethod
+    def truncate_reply(reply: str, max_tokens: Optional[int]) -> Tuple[str, str]:
+        """按 max_tokens 截断回复，返回 (回复, 结束原因)"""
+        if not max_tokens or estimate_tokens(reply) <= max_tokens:
+            return reply, "stop"
+        low, high = 0, len(reply)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if estimate_tokens(reply[:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return reply[:low], "length"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                try:
+                    request = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    self._send_json(400, {"error": {"message": "请求体不是合法的JSON", "type": "invalid_request_error"}})
+                    return
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    self._send_json(404, {"error": {"message": f"未知接口 {self.path}", "type": "invalid_request_error"}})
+                    return
+
+                server._count('requests')
+                draw = server._next_random()
+                if draw < server.rate_limit_rate:
+                    server._count('rate_limited')
+                    self._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+                                    {'Retry-After': '1'})
+                    return
+                if draw < server.rate_limit_rate + server.error_rate:
+                    server._count('errors')
+                    self._send_json(500, {"error": {"message": "Internal server error", "type": "server_error"}})
+                    return
+
+                messages = request.get('messages', [])
+                reply, finish_reason = server.truncate_reply(server.build_reply(messages), request.get('max_tokens'))
+                usage = {"prompt_tokens": estimate_messages_tokens(messages), "completion_tokens": estimate_tokens(reply)}
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+                usage.update(server.get_prompt_cache_usage(messages))
+                if request.get('stream'):
+                    server._count('streams')
+                    include_usage = bool((request.get('stream_options') or {}).get('include_usage'))
+                    self._stream(request.get('model', 'mock'), reply, usage if include_usage else None, finish_reason)
+                else:
+                    time.sleep(server._delay(server.ttft + usage["completion_tokens"] / server.tokens_per_second))
+                    self._send_json(200, {
+                        "id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion", "created": int(time.time()),
+                        "model": request.get('model', 'mock'),
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": reply},
+                                     "finish_reason": finish_reason}],
+                        "usage": usage
+                    })
+
+            def _send_json(self, status: int, body: dict, headers: Optional[dict] = None):
+                content = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(content)
+
+            def _stream(self, model: str, reply: str, usage: Optional[dict], finish_reason: str = "stop"):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                # 分块传输，流式响应结束后连接可继续复用
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+
+                chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+                def write_chunk(data: bytes):
+                    self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                    self.wfile.flush()
+
+                def send_chunk(delta: dict, finish_reason=None, chunk_usage=None):
+                    chunk = {"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": model, "choices": []}
+                    if delta is not None:
+                        chunk["choices"] = [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+                    if chunk_usage is not None:
+                        chunk["usage"] = chunk_usage
+                    write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+
+                time.sleep(server._delay(server.ttft))
+                send_chunk({"role": "assistant", "content": ""})
+                # 按估算的token切分回复：中文约每字 1 个token，其余约每 4 个字符 1 个token
+                interval = 1 / server.tokens_per_second
+                piece = ''
+                for char in reply:
+                    piece += char
+                    if ord(char) > 0x2fff or len(piece) >= 4:
+                        send_chunk({"content": piece})
+                        piece = ''
+                        time.sleep(server._delay(interval))
+                if piece:
+                    send_chunk({"content": piece})
+                send_chunk({}, finish_reason)
+                if usage is not None:
+                    send_chunk(None, chunk_usage=usage)
+                write_chunk(b"data: [DONE]\n\n")
+                write_chunk(b"")
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容桩服务器")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--ttft', type=float, default=0.3, help='首个token延迟（秒）')
+    parser.add_argument('--tps', type=float, default=60.0, help='输出速度（token/秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='延迟抖动比例')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 500 错误的比例')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='返回 429 错误的比例')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子')
+    parser.add_argument('--recordings', default=None, help='录制的回复目录')
+    args = parser.parse_args()
+
+    mock_server = MockChatServer(args.host, args.port, args.ttft, args.tps, args.jitter, args.error_rate,
+                                 args.rate_limit_rate, args.seed, args.recordings)
+    print(f"桩服务器已启动: {mock_server.base_url}（Ctrl+C 停止）")
+    try:
+        mock_server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        mock_server.stop()
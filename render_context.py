@@ -0,0 +1,89 @@
+import os
+import time
+from typing import Dict, Optional
+
+import labels
+from helper.asset_index import AssetIndex
+
+
+class RenderContext:
+    """
+    单次文档生成任务的渲染上下文：保存本次任务的静态插入数据、标签注册表快照、渲染指标、模板目录、图片素材索引
+    和图片优化设置，由 TemplateAnalyzer.check_template、DocumentProcessor.solve_content_labels 传递给每个标签的插入方法。
+    各任务使用独立的上下文，同一进程中的多个线程可以同时生成文档而互不影响
+    """
+
+    def __init__(self, template_path: Optional[str] = None, registered_labels: Optional[Dict[str, type]] = None,
+                 asset_index: Optional[AssetIndex] = None, optimize_images: bool = False,
+                 image_dpi: Optional[int] = None):
+        """
+        Args:
+            template_path: 模板文件路径
+            registered_labels: 标签注册表 {标签类型: 标签类}，默认为创建时 LabelManager 中已注册标签的快照
+            asset_index: 图片素材索引，默认在首次使用时获取覆盖 imgs/ 和模板所在目录的共享索引
+            optimize_images: 嵌入前按最终尺寸缩小并重新压缩图片（需要 Pillow，见 ImageOptimizer）
+            image_dpi: 图片优化的目标分辨率，默认为 ImageOptimizer.target_dpi
+        """
+        self.template_path = template_path
+        self.template_dir = os.path.dirname(os.path.abspath(template_path)) if template_path else ''
+        if registered_labels is None:
+            registered_labels = {label.get_type(): label for label in labels.LabelManager.get_labels()}
+        self.registered_labels = dict(registered_labels)
+        self.insert_point_content_types = [t for t, label in self.registered_labels.items() if label.has_content()]
+        self.insert_point_no_content_types = [t for t, label in self.registered_labels.items()
+                                              if not label.has_content()]
+        self.insert_point_types = self.insert_point_no_content_types + self.insert_point_content_types
+        self._asset_index = asset_index
+        self.optimize_images = optimize_images
+        self.image_dpi = image_dpi
+        self.static_datas = {}
+        self.metrics = {'inserted': {}, 'failed': {}, 'timings': {}}
+        self.register_static_datas()
+
+    @property
+    def asset_index(self) -> AssetIndex:
+        """图片素材索引，多个任务共享同一目录的索引"""
+        if self._asset_index is None:
+            self._asset_index = AssetIndex.for_template(self.template_dir)
+        return self._asset_index
+
+    def register_static_datas(self):
+        """注册本次任务的静态插入数据（如生成日期、时间）"""
+        self.static_datas.clear()
+        for label in self.registered_labels.values():
+            label.register_static_datas(self.static_datas)
+
+    def get_label(self, point_type: str):
+        """按标签类型获取标签类"""
+        return self.registered_labels[point_type]
+
+    def is_no_content_type(self, point_type: str) -> bool:
+        return point_type in self.insert_point_no_content_types
+
+    def count_inserted(self, point_type: str):
+        """记录一个成功插入的标签"""
+        inserted = self.metrics['inserted']
+        inserted[point_type] = inserted.get(point_type, 0) + 1
+
+    def count_failed(self, point_type: str):
+        """记录一个插入失败的标签"""
+        failed = self.metrics['failed']
+        failed[point_type] = failed.get(point_type, 0) + 1
+
+    def timer(self, name: str) -> '_PhaseTimer':
+        """计时上下文管理器，耗时累计到 metrics['timings'][name]（秒）"""
+        return _PhaseTimer(self.metrics['timings'], name)
+
+
+class _PhaseTimer:
+    def __init__(self, timings: dict, name: str):
+        self.timings = timings
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.timings[self.name] = self.timings.get(self.name, 0.0) + time.perf_counter() - self.start
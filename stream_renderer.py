@@ -0,0 +1,118 @@
+import threading
+from typing import Any, Optional
+
+from data_loader import LLMDataLoader
+from doc_processor import DocumentProcessor
+from render_context import RenderContext
+from template_analyzer import TemplateAnalyzer
+
+
+class StreamingDocumentRenderer:
+    """
+    流式渲染器：在大模型生成的同时于后台线程分析模板，每个字段的值完整后立即插入文档；
+    图片标签以及与其他标签共用段落的标签在生成结束后统一处理，保证与一次性渲染的结果一致
+    """
+
+    def __init__(self, template_path: str, context: Optional[RenderContext] = None):
+        """
+        Args:
+            template_path: 模板文件路径
+            context: 本次生成的渲染上下文，默认按当前注册的标签新建
+        """
+        self.template_path = template_path
+        self.context = context or RenderContext(template_path, TemplateAnalyzer.registered_labels)
+        self.inserted_names = set()
+        self._pending = []
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._error = None
+        self._document = None
+        self._insert_points = None
+        self._streamable_names = set()
+        self._thread = threading.Thread(target=self._analyze_template, daemon=True)
+        self._thread.start()
+
+    def _analyze_template(self):
+        try:
+            check_result = TemplateAnalyzer.check_template(self.template_path,
+                                                           DocumentProcessor.insert_data_to_no_content_point,
+                                                           context=self.context)
+            if check_result['code'].is_error():
+                self._error = f"模板校验失败: {check_result['code']}"
+                return
+            self._document = check_result['data']['document']
+            self._insert_points = check_result['data']['insert_points']
+            self._streamable_names = self._get_streamable_names(self._insert_points)
+        except Exception as e:
+            self._error = str(e)
+        finally:
+            # 插入模板分析期间已完成的字段
+            with self._lock:
+                self._ready.set()
+                self._flush_pending()
+
+    @staticmethod
+    def _get_streamable_names(insert_points: dict) -> set:
+        """可在生成过程中立即插入的标签：非图片类型，且所在段落中没有其他插入点"""
+        paragraph_counts = {}
+        for point_data in insert_points.values():
+            for pd in point_data if isinstance(point_data, list) else [point_data]:
+                key = id(pd['paragraph']._p)
+                paragraph_counts[key] = paragraph_counts.get(key, 0) + 1
+
+        names = set()
+        for name, point_data in insert_points.items():
+            points = point_data if isinstance(point_data, list) else [point_data]
+            if all(pd['type'] != 'image' and paragraph_counts[id(pd['paragraph']._p)] == 1 for pd in points):
+                names.add(name)
+        return names
+
+    def add_field(self, name: str, value: Any):
+        """
+        接收一个已完成的字段，模板分析完成后立即插入，否则暂存到分析完成后插入
+
+        可作为 DeepSeekClient.chat 的 on_field 回调
+        """
+        # 与 LLMDataLoader 的转换规则保持一致
+        if isinstance(value, list) and len(value) == 2:
+            value = tuple(value)
+        with self._lock:
+            self._pending.append((name, value))
+            if self._ready.is_set():
+                self._flush_pending()
+
+    def _flush_pending(self):
+        # 调用方需持有 self._lock
+        if self._insert_points is None:
+            self._pending.clear()
+            return
+        for name, value in self._pending:
+            if name in self._streamable_names and name not in self.inserted_names:
+                DocumentProcessor.solve_content_labels({name: self._insert_points[name]}, {name: value},
+                                                       self.context)
+                self.inserted_names.add(name)
+        self._pending.clear()
+
+    def finish(self, llm_output: str, save_path: str, data: Optional[dict] = None):
+        """
+        生成结束后插入剩余的标签并保存文档
+
+        Args:
+            llm_output: 大模型的完整输出
+            save_path: 文档保存路径
+            data: 已解析的完整数据，默认由 LLMDataLoader 解析 llm_output
+        """
+        self._ready.wait()
+        if self._error:
+            raise ValueError(self._error)
+        with self._lock:
+            self._flush_pending()
+
+        if data is None:
+            data = LLMDataLoader(llm_output).load_data()
+        remaining_points = {name: point_data for name, point_data in self._insert_points.items()
+                            if name not in self.inserted_names}
+        DocumentProcessor.solve_content_labels(remaining_points, data, self.context)
+        self._document.save(save_path)
+        print(f"调试 - 流式渲染: 生成过程中插入 {len(self.inserted_names)} 个标签，"
+              f"结束后插入 {len(remaining_points)} 个标签")
@@ -1,14 +1,21 @@
 import re
 from enum import Enum, unique
 from docx import Document
+from docx.oxml.ns import qn
+from docx.table import Table, _Cell
+from docx.text.paragraph import Paragraph
 import labels
+from render_context import RenderContext
+from template_plan import TemplatePlan
+from template_pool import TemplatePool
+from helper.docx_helper import iter_story_containers
 
 
-def is_no_content_point(p_d):
-    p_t = p_d['type']
-    if p_t in TemplateAnalyzer.insert_point_no_content_types:
-        return True
-    return False
+def is_no_content_point(p_d, context: RenderContext):
+    return context.is_no_content_type(p_d['type'])
+
+
+_MC_FALLBACK = '{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback'
 
 
 class TemplateAnalyzer:
@@ -21,8 +28,6 @@ class TemplateAnalyzer:
                                      not label.has_content()]
     insert_point_types = insert_point_no_content_types + insert_point_content_types
 
-    static_datas = {}
-
     @classmethod
     def update_labels_info(cls):
         cls.registered_labels = {label.get_type(): label for label in labels.LabelManager.get_labels()}
@@ -32,12 +37,6 @@ class TemplateAnalyzer:
                                              not label.has_content()]
         cls.insert_point_types = cls.insert_point_no_content_types + cls.insert_point_content_types
 
-    @classmethod
-    def register_static_datas(cls):
-        cls.static_datas.clear()
-        for label in cls.registered_labels.values():
-            label.register_static_datas(cls.static_datas)
-
     @unique
     class CheckCode(Enum):
         SUCCESS = 1
@@ -51,182 +50,230 @@ class TemplateAnalyzer:
             return self.value < 0
 
     @classmethod
-    def check_template(cls, file_path: str, insert_operation: callable = is_no_content_point) -> dict:
-        
-        document = Document(file_path)
+    def check_template(cls, file_path: str, insert_operation: callable = is_no_content_point,
+                       use_plan: bool = True, context: RenderContext = None) -> dict:
+        """
+        校验模板并收集插入点
+
+        Args:
+            file_path: 模板文件路径
+            insert_operation: 预处理操作 (point_data, context) -> bool，返回 True 表示插入点已处理
+            use_plan: 是否使用已编译的模板计划
+            context: 本次生成任务的渲染上下文，默认按当前注册的标签新建，结果的 data['context'] 中返回
+        """
+        if context is None:
+            context = RenderContext(file_path, cls.registered_labels)
+        point_types = context.insert_point_types
+
+        # 从模板池获取模板文档的副本，模板文件只在首次使用或被修改后解析
+        document, template_hash = TemplatePool.acquire(file_path)
         insert_points = {}
 
-        # 处理正文部分
-        for element in document.element.body:
-            if element.tag.endswith('p'):
-                paragraph = document.paragraphs[
-                    len([e for e in document.element.body[:list(document.element.body).index(element)] if
-                         e.tag.endswith('p')])]
-                cls._process_paragraph(paragraph, insert_points, insert_operation, document)
-            elif element.tag.endswith('tbl'):
-                table = document.tables[
-                    len([e for e in document.element.body[:list(document.element.body).index(element)] if
-                         e.tag.endswith('tbl')])]
-                cls._process_table(table, insert_points, insert_operation, document)
-
-        # 处理页眉页脚
-        for section in document.sections:
-            for part in [section.header, section.footer]:
-                if part:
-                    for paragraph in part.paragraphs:
-                        cls._process_paragraph(paragraph, insert_points, insert_operation, document)
-                    for table in part.tables:
-                        cls._process_table(table, insert_points, insert_operation, document)
-        
-        # 扫描所有可能被遗漏的表格和标签
-        cls._scan_all_tables(document, insert_points, insert_operation)
-        
-        # 添加调试信息 - 标签识别结果摘要
-        # print(f"\n调试信息 - 标签识别结果摘要:")
-        image_labels = []
-        for point_name, point_data in insert_points.items():
-            if isinstance(point_data, list):
-                for pd in point_data:
-                    if pd['type'] == 'image':
-                        image_labels.append((point_name, pd['text']))
-            elif point_data['type'] == 'image':
-                image_labels.append((point_name, point_data['text']))
+        def point_operation(point_data):
+            return insert_operation(point_data, context)
+
+        # 优先使用已编译的模板计划直接还原插入点，避免重复扫描
+        if use_plan:
+            plan = TemplatePlan.load(file_path, template_hash, point_types)
+            resolved_points = plan.resolve(document) if plan is not None else None
+            if resolved_points is not None:
+                for point_data in resolved_points:
+                    cls._add_insert_point(point_data, insert_points, point_operation)
+                return cls._check_success(document, insert_points, {'from_plan': True,
+                                                                    'insert_points': len(resolved_points)},
+                                          context)
+
+        # 记录扫描到的所有插入点（包括预处理阶段已插入的无内容标签），用于编译模板计划
+        scanned_points = []
+
+        def scan_operation(point_data):
+            scanned_points.append(point_data)
+            return point_operation(point_data)
 
+        # 单次遍历正文及页眉页脚中的所有段落
+        scan_stats = cls._scan_document(document, insert_points, scan_operation, point_types)
+
+        # 编译并保存模板计划，后续生成时直接还原插入点
+        if use_plan:
+            TemplatePlan.compile(document, template_hash, point_types, scanned_points).save(file_path)
+
+        return cls._check_success(document, insert_points, scan_stats, context)
+
+    @classmethod
+    def _check_success(cls, document, insert_points, scan_stats, context) -> dict:
         return {
             "code": cls.CheckCode.SUCCESS,
             "msg": "successful",
             "data": {
                 "document": document,
-                "insert_points": insert_points
+                "insert_points": insert_points,
+                "scan_stats": scan_stats,
+                "context": context
             }
         }
 
-    @classmethod
-    def _scan_all_tables(cls, document, insert_points, insert_operation):
-        """全文扫描所有可能的表格，包括在复杂结构中的表格，确保不会遗漏任何表格中的标签"""
-        # 使用XPath查找文档中的所有表格
-        doc_element = document._element
-        all_tables_elements = doc_element.xpath('.//w:tbl')
-        
-        # 获取已经处理过的表格元素，避免重复处理
-        processed_table_elements = set()
-        for point_data in insert_points.values():
-            if isinstance(point_data, list):
-                for pd in point_data:
-                    if 'table' in pd:
-                        processed_table_elements.add(pd['table']._element)
+    @staticmethod
+    def _add_insert_point(point_data, insert_points, insert_operation):
+        """执行插入操作，未被处理的插入点按标签名登记，同名标签以列表保存"""
+        point_name = point_data['name']
+        if not insert_operation(point_data):
+            if point_name in insert_points:
+                if isinstance(insert_points[point_name], list):
+                    insert_points[point_name].append(point_data)
+                else:
+                    insert_points[point_name] = [insert_points[point_name], point_data]
             else:
-                if 'table' in point_data:
-                    processed_table_elements.add(point_data['table']._element)
-        
-        # 处理文档中的所有表格
-        for table_element in all_tables_elements:
-            # 如果已经处理过这个表格元素，跳过
-            if table_element in processed_table_elements:
+                insert_points[point_name] = point_data
+
+    @classmethod
+    def _scan_document(cls, document, insert_points, insert_operation, point_types=None) -> dict:
+        """
+        单次遍历正文及所有页眉页脚中的每个段落（w:p），每个段落只访问一次，
+        并给出段落所在表格、行、单元格的上下文，返回用于核对的扫描统计
+        """
+        if point_types is None:
+            point_types = cls.insert_point_types
+        scan_stats = {'parts': 0, 'paragraphs_visited': 0, 'unique_paragraphs': 0, 'tables': 0,
+                      'insert_points': 0, 'duplicate_points': 0}
+        visited_paragraphs = set()
+        seen_points = set()
+
+        def register_point(point_data):
+            # 同一段落同一位置的标签只登记一次
+            point_key = (point_data['paragraph']._p, point_data['start_pos'])
+            if point_key in seen_points:
+                scan_stats['duplicate_points'] += 1
+                return True
+            seen_points.add(point_key)
+            scan_stats['insert_points'] += 1
+            return insert_operation(point_data)
+
+        for _, container in iter_story_containers(document):
+            scan_stats['parts'] += 1
+            root = container._element
+            cell_contexts = {}
+            table_rows = {}
+            for p in root.iter(qn('w:p')):
+                # 找到最近的单元格，跳过兼容性标记中重复的备用内容
+                tc = None
+                ancestor = p.getparent()
+                while ancestor is not None and ancestor is not root:
+                    if ancestor.tag == _MC_FALLBACK:
+                        break
+                    if tc is None and ancestor.tag == qn('w:tc'):
+                        tc = ancestor
+                    ancestor = ancestor.getparent()
+                else:
+                    scan_stats['paragraphs_visited'] += 1
+                    visited_paragraphs.add(p)
+                    paragraph = Paragraph(p, container)
+                    if tc is None:
+                        cls._process_paragraph(paragraph, insert_points, register_point, document, point_types)
+                    else:
+                        if tc not in cell_contexts:
+                            cell_contexts[tc] = cls._get_cell_context(tc, container, table_rows)
+                        table, cell, row_index, cell_index = cell_contexts[tc]
+                        cls._process_cell_paragraph(paragraph, table, cell, row_index, cell_index,
+                                                    insert_points, register_point, document, point_types)
+            scan_stats['tables'] += len(table_rows)
+
+        scan_stats['unique_paragraphs'] = len(visited_paragraphs)
+        return scan_stats
+
+    @staticmethod
+    def _get_cell_context(tc, container, table_rows: dict):
+        """获取单元格所在的表格、行号和列号（按布局网格计算，合并单元格取起始列）"""
+        tr = tc.getparent()
+        while tr.tag != qn('w:tr'):
+            tr = tr.getparent()
+        tbl = tr.getparent()
+        while tbl.tag != qn('w:tbl'):
+            tbl = tbl.getparent()
+
+        if tbl not in table_rows:
+            table_rows[tbl] = (Table(tbl, container), {row: index for index, row in enumerate(tbl.tr_lst)})
+        table, rows = table_rows[tbl]
+
+        cell_index = 0
+        for row_tc in tr.tc_lst:
+            if row_tc is tc:
+                break
+            cell_index += row_tc.grid_span
+        return table, _Cell(tc, table), rows.get(tr, 0), cell_index
+
+    @classmethod
+    def _process_cell_paragraph(cls, paragraph, table, cell, row_index, cell_index, insert_points,
+                                insert_operation, document, point_types):
+        """处理表格单元格中段落的内容标签"""
+        if not paragraph.text.strip():
+            return
+
+        # 特殊处理：合并所有runs的文本，确保完整捕获标签
+        full_text = paragraph.text
+        matches = cls._content_label_re.finditer(full_text)
+
+        for match in matches:
+            point = match.group(1)
+            point_split = point.split(':')
+            if len(point_split) != 2:
+                print(f"调试 - 标签格式错误: '{match.group(0)}', 需要形如 '{{{{类型:名称}}}}'")
+                continue
+
+            point_type, point_name = point_split
+            if point_type not in point_types:
+                print(f"调试 - 标签类型不支持: '{point_type}', 支持的类型有: {point_types}")
                 continue
             
-            try:
-                # 尝试为表格元素创建一个Table对象
-                from docx.table import Table
-                table = Table(table_element, document._body)
-                cls._process_table(table, insert_points, insert_operation, document)
-                # 添加到已处理的表格集合中
-                processed_table_elements.add(table_element)
-            except Exception as e:
-                print(f"警告：处理表格时出错 - {str(e)}")
+            print(f"调试 - 在表格中找到标签: 类型='{point_type}', 名称='{point_name}', 文本='{match.group(0)}'")
 
-    @classmethod
-    def _process_table(cls, table, insert_points, insert_operation, document):
-        """处理表格中的内容标签，增强识别能力"""
-        # 递归处理嵌套表格的函数
-        def process_nested_tables(cell):
-            # 处理单元格中的嵌套表格
-            for nested_table in cell.tables:
-                cls._process_table(nested_table, insert_points, insert_operation, document)
-        
-        for row_index, row in enumerate(table.rows):
-            for cell_index, cell in enumerate(row.cells):
-                # 首先处理单元格中的嵌套表格
-                process_nested_tables(cell)
-                
-                # 然后处理单元格中的段落
-                for paragraph in cell.paragraphs:
-                    if not paragraph.text.strip():
-                        continue
-
-                    # 特殊处理：合并所有runs的文本，确保完整捕获标签
-                    full_text = paragraph.text
-                    matches = cls._content_label_re.finditer(full_text)
-
-                    for match in matches:
-                        point = match.group(1)
-                        point_split = point.split(':')
-                        if len(point_split) != 2:
-                            print(f"调试 - 标签格式错误: '{match.group(0)}', 需要形如 '{{{{类型:名称}}}}'")
-                            continue
-
-                        point_type, point_name = point_split
-                        if point_type not in cls.insert_point_types:
-                            print(f"调试 - 标签类型不支持: '{point_type}', 支持的类型有: {cls.insert_point_types}")
-                            continue
-                            
-                        print(f"调试 - 在表格中找到标签: 类型='{point_type}', 名称='{point_name}', 文本='{match.group(0)}'")
-
-                        # 创建包含完整标签的point_data
-                        point_data = {
-                            'name': point_name,
-                            'type': point_type,
-                            'text': match.group(0),
-                            'run': paragraph.runs[0] if paragraph.runs else None,
-                            'run_index': 0,
-                            'paragraph': paragraph,
-                            'document': document,
-                            'start_pos': match.start(),
-                            'end_pos': match.end(),
-                            'cell': cell,  # 添加单元格引用
-                            'table': table,  # 添加表格引用
-                            'row_index': row_index,  # 使用枚举索引而不是table.rows.index(row)
-                            'cell_index': cell_index  # 使用枚举索引而不是row.cells.index(cell)
-                        }
-
-                        # 获取所有相关runs
-                        start_pos = match.start()
-                        end_pos = match.end()
-                        current_pos = 0
-                        containing_runs = []
-
-                        for run_idx, run in enumerate(paragraph.runs):
-                            run_length = len(run.text)
-                            run_start = current_pos
-                            run_end = current_pos + run_length
-
-                            if (run_start <= start_pos < run_end or
-                                    run_start < end_pos <= run_end or
-                                    (start_pos <= run_start and run_end <= end_pos)):
-                                containing_runs.append({
-                                    'run': run,
-                                    'run_index': run_idx,
-                                    'start': run_start,
-                                    'end': run_end
-                                })
-
-                            current_pos += run_length
-
-                        if containing_runs:
-                            point_data['containing_runs'] = containing_runs
-
-                        # 处理标签
-                        if not insert_operation(point_data):
-                            if point_name in insert_points:
-                                if isinstance(insert_points[point_name], list):
-                                    insert_points[point_name].append(point_data)
-                                else:
-                                    insert_points[point_name] = [insert_points[point_name], point_data]
-                            else:
-                                insert_points[point_name] = point_data
+            # 创建包含完整标签的point_data
+            point_data = {
+                'name': point_name,
+                'type': point_type,
+                'text': match.group(0),
+                'run': paragraph.runs[0] if paragraph.runs else None,
+                'run_index': 0,
+                'paragraph': paragraph,
+                'document': document,
+                'start_pos': match.start(),
+                'end_pos': match.end(),
+                'cell': cell,  # 添加单元格引用
+                'table': table,  # 添加表格引用
+                'row_index': row_index,  # 行号
+                'cell_index': cell_index  # 列号（合并单元格取起始列）
+            }
+
+            # 获取所有相关runs
+            start_pos = match.start()
+            end_pos = match.end()
+            current_pos = 0
+            containing_runs = []
+
+            for run_idx, run in enumerate(paragraph.runs):
+                run_length = len(run.text)
+                run_start = current_pos
+                run_end = current_pos + run_length
+
+                if (run_start <= start_pos < run_end or
+                        run_start < end_pos <= run_end or
+                        (start_pos <= run_start and run_end <= end_pos)):
+                    containing_runs.append({
+                        'run': run,
+                        'run_index': run_idx,
+                        'start': run_start,
+                        'end': run_end
+                    })
+
+                current_pos += run_length
+
+            if containing_runs:
+                point_data['containing_runs'] = containing_runs
+
+            # 处理标签
+            cls._add_insert_point(point_data, insert_points, insert_operation)
 
     @classmethod
-    def _process_paragraph(cls, paragraph, insert_points, insert_operation, document):
+    def _process_paragraph(cls, paragraph, insert_points, insert_operation, document, point_types):
         # 构建run的映射关系
         run_text_map = []
         total_offset = 0
@@ -251,8 +298,8 @@ class TemplateAnalyzer:
                 continue
 
             point_type, point_name = point_split
-            if point_type not in cls.insert_point_types:
-                print(f"调试 - 标签类型不支持: '{point_type}', 支持的类型有: {cls.insert_point_types}")
+            if point_type not in point_types:
+                print(f"调试 - 标签类型不支持: '{point_type}', 支持的类型有: {point_types}")
                 continue
                 
             print(f"调试 - 在段落中找到标签: 类型='{point_type}', 名称='{point_name}', 文本='{match.group(0)}'")
@@ -283,14 +330,7 @@ class TemplateAnalyzer:
                 'end_pos': end_pos
             }
 
-            if not insert_operation(point_data):
-                if point_name in insert_points:
-                    if isinstance(insert_points[point_name], list):
-                        insert_points[point_name].append(point_data)
-                    else:
-                        insert_points[point_name] = [insert_points[point_name], point_data]
-                else:
-                    insert_points[point_name] = point_data
+            cls._add_insert_point(point_data, insert_points, insert_operation)
 
     @staticmethod
     def print_check_info(check_info: dict, show_detail=False):
@@ -312,3 +352,32 @@ class TemplateAnalyzer:
         else:
             # print(f'模板校验失败\n\t错误代码：{check_info["code"]}\n\t错误信息：{check_info["msg"]}')
             pass
+
+
+# 正文遍历性能测试：合成 100 ~ 10000 个正文元素的模板，验证扫描时间随元素数线性增长
+if __name__ == "__main__":
+    import contextlib
+    import io
+    import os
+    import tempfile
+    import time
+
+    print(f"{'正文元素数':>10} {'扫描耗时(ms)':>14} {'每元素耗时(us)':>16}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for element_count in (100, 1000, 2500, 5000, 10000):
+            synthetic = Document()
+            for i in range(element_count):
+                if i % 10 == 9:
+                    table = synthetic.add_table(rows=1, cols=2)
+                    table.cell(0, 0).text = f'参数{i}'
+                    table.cell(0, 1).text = f'{{{{text:参数{i}}}}}'
+                else:
+                    synthetic.add_paragraph(f'第{i}段 {{{{text:字段{i}}}}}' if i % 3 == 0 else f'第{i}段正文')
+            template_path = os.path.join(tmp_dir, f'synthetic_{element_count}.docx')
+            synthetic.save(template_path)
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                TemplateAnalyzer.check_template(template_path, lambda p_d, context: False, use_plan=False)
+            elapsed = time.perf_counter() - start
+            print(f"{element_count:>10} {elapsed * 1000:>14.1f} {elapsed / element_count * 1e6:>16.1f}")
@@ -0,0 +1,206 @@
+import json
+import os
+import threading
+from typing import Optional
+
+from docx.table import Table, _Cell
+from docx.text.paragraph import Paragraph
+
+from helper.docx_helper import iter_story_containers
+
+
+class TemplatePlan:
+    """
+    模板编译计划：记录模板中每个插入点的稳定 XML 位置（所在部件、元素路径、run 区间、标签类型），
+    以模板内容哈希为键保存在磁盘上，后续生成时直接按位置还原插入点，无需再次正则扫描整个文档
+    """
+
+    # 计划文件格式版本，结构变化时递增，使旧的计划文件失效
+    VERSION = 2
+    CACHE_DIR_NAME = '.template_cache'
+
+    # 已加载计划的内存缓存 {(模板哈希, 标签类型签名): TemplatePlan}
+    _plans = {}
+    _lock = threading.Lock()
+
+    def __init__(self, template_hash: str, label_types: list, points: list):
+        self.template_hash = template_hash
+        self.label_types = label_types
+        self.points = points
+
+    @classmethod
+    def get_plan_path(cls, file_path: str, template_hash: str) -> str:
+        return os.path.join(os.path.dirname(os.path.abspath(file_path)), cls.CACHE_DIR_NAME, f'{template_hash}.json')
+
+    @classmethod
+    def load(cls, file_path: str, template_hash: str, label_types: list) -> Optional['TemplatePlan']:
+        """加载模板对应的计划，不存在或已失效时返回 None"""
+        key = (template_hash, tuple(label_types))
+        with cls._lock:
+            plan = cls._plans.get(key)
+        if plan is not None:
+            return plan
+
+        plan_path = cls.get_plan_path(file_path, template_hash)
+        if not os.path.exists(plan_path):
+            return None
+        try:
+            with open(plan_path, 'r', encoding='utf-8') as f:
+                content = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"警告：读取模板计划失败 - {str(e)}")
+            return None
+
+        if (content.get('version') != cls.VERSION or content.get('template_hash') != template_hash
+                or content.get('label_types') != list(label_types)):
+            return None
+
+        plan = cls(template_hash, content['label_types'], content['points'])
+        with cls._lock:
+            cls._plans[key] = plan
+        return plan
+
+    def save(self, file_path: str):
+        """将计划写入模板目录下的缓存文件夹"""
+        plan_path = self.get_plan_path(file_path, self.template_hash)
+        content = {
+            'version': self.VERSION,
+            'template_hash': self.template_hash,
+            'label_types': list(self.label_types),
+            'points': self.points
+        }
+        try:
+            os.makedirs(os.path.dirname(plan_path), exist_ok=True)
+            tmp_path = f'{plan_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(content, f, ensure_ascii=False)
+            os.replace(tmp_path, plan_path)
+        except OSError as e:
+            print(f"警告：保存模板计划失败 - {str(e)}")
+
+        with self._lock:
+            self._plans[(self.template_hash, tuple(self.label_types))] = self
+
+    @classmethod
+    def compile(cls, document, template_hash: str, label_types: list, scanned_points: list) -> 'TemplatePlan':
+        """根据扫描得到的插入点（按扫描顺序）编译计划"""
+        part_roots = _get_part_roots(document)
+        points = []
+        for point_data in scanned_points:
+            paragraph_element = point_data['paragraph']._p
+            part, paragraph_path = _locate(paragraph_element, part_roots)
+
+            containing_runs = None
+            if 'containing_runs' in point_data:
+                containing_runs = [[r['run_index'], r['start'], r['end']] for r in point_data['containing_runs']]
+
+            point = {
+                'name': point_data['name'],
+                'type': point_data['type'],
+                'text': point_data['text'],
+                'start_pos': point_data['start_pos'],
+                'end_pos': point_data['end_pos'],
+                'part': part,
+                'paragraph': paragraph_path,
+                'run_index': point_data['run_index'] if point_data['run'] is not None else None,
+                'containing_runs': containing_runs
+            }
+            if 'cell' in point_data:
+                point['table'] = _locate(point_data['table']._tbl, part_roots)[1]
+                point['cell'] = _locate(point_data['cell']._tc, part_roots)[1]
+                point['row_index'] = point_data['row_index']
+                point['cell_index'] = point_data['cell_index']
+            points.append(point)
+
+        return cls(template_hash, list(label_types), points)
+
+    def resolve(self, document) -> Optional[list]:
+        """
+        在新打开的文档中按计划还原所有插入点，返回按扫描顺序排列的 point_data 列表；
+        任一位置无法还原或文本不一致时返回 None，由调用方回退到完整扫描
+        """
+        parents = {}
+        paragraphs = {}
+        runs_cache = {}
+        resolved = []
+        try:
+            for point in self.points:
+                part_key = (point['part']['kind'], point['part'].get('section'))
+                if part_key not in parents:
+                    parents[part_key] = _get_part_parent(document, point['part'])
+                parent = parents[part_key]
+                root = parent._element
+
+                paragraph_key = (part_key, tuple(point['paragraph']))
+                if paragraph_key not in paragraphs:
+                    paragraph_element = _descend(root, point['paragraph'])
+                    if not paragraph_element.tag.endswith('}p'):
+                        return None
+                    paragraph = Paragraph(paragraph_element, parent)
+                    paragraphs[paragraph_key] = paragraph
+                    runs_cache[paragraph_key] = paragraph.runs
+                paragraph = paragraphs[paragraph_key]
+                runs = runs_cache[paragraph_key]
+
+                if paragraph.text[point['start_pos']:point['end_pos']] != point['text']:
+                    return None
+
+                point_data = {
+                    'name': point['name'],
+                    'type': point['type'],
+                    'text': point['text'],
+                    'run': runs[point['run_index']] if point['run_index'] is not None else None,
+                    'run_index': point['run_index'] if point['run_index'] is not None else 0,
+                    'paragraph': paragraph,
+                    'document': document,
+                    'start_pos': point['start_pos'],
+                    'end_pos': point['end_pos']
+                }
+                if point['containing_runs'] is not None:
+                    point_data['containing_runs'] = [
+                        {'run': runs[run_index], 'run_index': run_index, 'start': start, 'end': end}
+                        for run_index, start, end in point['containing_runs']
+                    ]
+                if 'cell' in point:
+                    table = Table(_descend(root, point['table']), parent)
+                    point_data['cell'] = _Cell(_descend(root, point['cell']), table)
+                    point_data['table'] = table
+                    point_data['row_index'] = point['row_index']
+                    point_data['cell_index'] = point['cell_index']
+                resolved.append(point_data)
+        except (IndexError, KeyError, AttributeError) as e:
+            print(f"警告：模板计划与文档结构不一致，将重新扫描 - {str(e)}")
+            return None
+        return resolved
+
+
+def _get_part_roots(document) -> dict:
+    """获取正文及各页眉页脚的根元素到部件描述的映射"""
+    return {container._element: part for part, container in iter_story_containers(document)}
+
+
+def _get_part_parent(document, part: dict):
+    if part['kind'] == 'body':
+        return document._body
+    return getattr(document.sections[part['section']], part['kind'])
+
+
+def _locate(element, part_roots: dict):
+    """返回元素所在部件及从部件根元素到该元素的子元素下标路径"""
+    path = []
+    current = element
+    while current not in part_roots:
+        parent = current.getparent()
+        if parent is None:
+            raise ValueError('元素不在正文或页眉页脚中')
+        path.append(parent.index(current))
+        current = parent
+    path.reverse()
+    return part_roots[current], path
+
+
+def _descend(root, path: list):
+    element = root
+    for index in path:
+        element = element[index]
+    return element
@@ -0,0 +1,79 @@
+import copy
+import hashlib
+import io
+import os
+import threading
+
+from docx import Document
+
+
+class _PooledTemplate:
+    def __init__(self, mtime_ns: int, size: int, template_hash: str, blob: bytes, document):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.template_hash = template_hash
+        self.blob = blob
+        self.document = document
+        self.lock = threading.Lock()
+
+
+class TemplatePool:
+    """
+    模板池：模板文件只解析一次并常驻内存，每次生成时交付一份深拷贝的文档对象；
+    通过文件修改时间、大小和内容哈希判断模板是否被修改，修改后自动重新加载
+    """
+
+    _templates = {}
+    _lock = threading.Lock()
+
+    # 统计信息，用于确认模板只被解析一次
+    stats = {'parses': 0, 'clones': 0}
+
+    @classmethod
+    def acquire(cls, file_path: str):
+        """
+        获取模板文档的独立副本
+
+        Returns:
+            tuple: (文档对象, 模板内容哈希)
+        """
+        pooled = cls._get_template(file_path)
+        with pooled.lock:
+            try:
+                document = copy.deepcopy(pooled.document)
+            except Exception as e:
+                print(f"警告：复制模板文档失败，改为重新解析 - {str(e)}")
+                document = Document(io.BytesIO(pooled.blob))
+        with cls._lock:
+            cls.stats['clones'] += 1
+        return document, pooled.template_hash
+
+    @classmethod
+    def _get_template(cls, file_path: str) -> _PooledTemplate:
+        key = os.path.abspath(file_path)
+        stat = os.stat(key)
+        with cls._lock:
+            pooled = cls._templates.get(key)
+        if pooled is not None and pooled.mtime_ns == stat.st_mtime_ns and pooled.size == stat.st_size:
+            return pooled
+
+        with open(key, 'rb') as f:
+            blob = f.read()
+        template_hash = hashlib.sha1(blob).hexdigest()
+
+        # 文件时间变化但内容未变时沿用已解析的文档
+        if pooled is not None and pooled.template_hash == template_hash:
+            pooled.mtime_ns, pooled.size = stat.st_mtime_ns, stat.st_size
+            return pooled
+
+        pooled = _PooledTemplate(stat.st_mtime_ns, stat.st_size, template_hash, blob, Document(io.BytesIO(blob)))
+        with cls._lock:
+            cls._templates[key] = pooled
+            cls.stats['parses'] += 1
+        return pooled
+
+    @classmethod
+    def clear(cls):
+        """清空模板池"""
+        with cls._lock:
+            cls._templates.clear()
@@ -2,6 +2,8 @@
 
 import math
 import re
+import numpy as np
+import pandas as pd
 from typing import Dict, Any, Tuple, Optional
 
 class WPSCalculator:
@@ -117,6 +119,23 @@ class WPSCalculator:
         
         # 获取对应的参数范围
         range_key = self.get_thickness_range_key(min_thickness)
+        
+        # 构建结果字典
+        calculated_params = self.calculate_range_parameters(range_key)
+        calculated_params["参考厚度"] = min_thickness
+        calculated_params["厚度范围"] = range_key
+        
+        return calculated_params
+    
+    def calculate_range_parameters(self, range_key: str) -> Dict[str, Any]:
+        """计算某一厚度范围对应的焊接工艺参数（不含参考厚度和厚度范围）
+        
+        Args:
+            range_key: 参数范围键
+            
+        Returns:
+            Dict: 电流、电压、送丝速度、焊接速度和热输入参数
+        """
         params = self.thickness_ranges[range_key]
         
         # 基础参数
@@ -148,8 +167,7 @@ class WPSCalculator:
             (0.8 * current_max * voltage_max * 0.001) / welding_speed_min, 2
         )
         
-        # 构建结果字典
-        calculated_params = {
+        return {
             "电流强度小": current_min,
             "电流强度大": current_max,
             "电弧电压小": voltage_min,
@@ -159,12 +177,51 @@ class WPSCalculator:
             "焊接速度小": welding_speed_min,
             "焊接速度大": welding_speed_max,
             "热输入小": heat_input_min,
-            "热输入大": heat_input_max,
-            "参考厚度": min_thickness,
-            "厚度范围": range_key
+            "热输入大": heat_input_max
         }
+    
+    def calculate_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """批量计算整张表每一行的焊接工艺参数，结果与逐行调用 calculate_welding_parameters 一致
         
-        return calculated_params
+        厚度提取、取较小值和厚度范围划分均按列向量化完成；焊接速度和热输入只取决于厚度范围，
+        因此每个范围只计算一次，再按各行所属范围取值。
+        
+        Args:
+            df: 包含"厚度t1/材质"、"厚度t2/材质"列的DataFrame
+            
+        Returns:
+            DataFrame: 与df索引对齐的参数表，列与 calculate_welding_parameters 的结果键相同；
+            无法提取厚度的行各列为空值
+        """
+        def extract_thickness(col):
+            if col not in df.columns:
+                return np.full(len(df), np.nan)
+            # 清单中的厚度/材质取值大量重复，只对不同取值做正则提取
+            codes, uniques = pd.factorize(df[col].astype(str))
+            thickness = pd.Series(uniques).str.extract(r'(\d+(?:\.\d+)?)mm', expand=False).astype(float).to_numpy()
+            # 缺失值的编码为-1
+            return np.where(codes >= 0, thickness[codes], np.nan)
+        
+        # 两个材质厚度的较小值（忽略缺失值）
+        t1 = extract_thickness('厚度t1/材质')
+        t2 = extract_thickness('厚度t2/材质')
+        min_thickness = np.fmin(t1, t2)
+        valid = ~np.isnan(min_thickness)
+        
+        # 厚度范围划分：<=3、<=5、>5 分别对应 thickness_ranges 中的三个范围
+        range_keys = list(self.thickness_ranges.keys())
+        range_indexes = np.searchsorted(np.array([3.0, 5.0]), np.where(valid, min_thickness, 0.0), side='left')
+        
+        # 每个范围的参数只计算一次，再按行取值
+        range_params = [self.calculate_range_parameters(range_key) for range_key in range_keys]
+        columns = {}
+        for name in range_params[0]:
+            values = np.array([params[name] for params in range_params])[range_indexes]
+            columns[name] = values if valid.all() else np.where(valid, values, np.nan)
+        columns["参考厚度"] = min_thickness
+        columns["厚度范围"] = np.where(valid, np.array(range_keys, dtype=object)[range_indexes], None)
+        
+        return pd.DataFrame(columns, index=df.index)
     
     def merge_data_for_llm(self, excel_data: Dict[str, Any], calculated_params: Dict[str, Any]) -> Dict[str, Any]:
         """合并Excel数据和计算参数，准备发送给大模型
@@ -266,4 +323,27 @@ if __name__ == "__main__":
     print("\n" + "="*50)
     print("完整合并数据:")
     for key, value in result.items():
-        print(f"  {key}: {value}")
\ No newline at end of file
+        print(f"  {key}: {value}")
+    
+    print("\n" + "="*50)
+    print("批量计算性能测试（10万行）:")
+    import time
+    rng = np.random.default_rng(0)
+    row_count = 100000
+    thickness_values = rng.choice([1.5, 2, 3, 3.5, 4, 5, 6, 8, 10, 12], size=(row_count, 2))
+    frame = pd.DataFrame({
+        '厚度t1/材质': [f"{t:g}mm 6005A-T6" for t in thickness_values[:, 0]],
+        '厚度t2/材质': [f"{t:g}mm 6082-T6" if i % 50 else None for i, t in enumerate(thickness_values[:, 1])],
+    })
+    
+    start = time.perf_counter()
+    scalar_rows = [calculator.calculate_welding_parameters(row) for row in frame.to_dict('records')]
+    scalar_time = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    frame_result = calculator.calculate_frame(frame)
+    frame_time = time.perf_counter() - start
+    
+    # 校验批量结果与逐行结果完全一致
+    assert frame_result.to_dict('records') == scalar_rows, "批量计算结果与逐行计算结果不一致"
+    print(f"逐行计算: {scalar_time:.3f}s, 批量计算: {frame_time:.3f}s, 加速比: {scalar_time / frame_time:.1f}x")
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+from wps_calculator import WPSCalculator
+
+
+class WPSRuleEngine:
+    """焊接工艺规程映射规则引擎
+
+    在本地按 DeepSeekClient.system_prompt 中的确定性映射规则，由Excel行数据和 WPSCalculator
+    计算结果直接生成完整的JSON数据，无需等待大模型；规则无法确定的字段标记为未解析。
+    """
+
+    # 输出JSON的字段顺序，与系统提示词中的输出结构一致
+    FIELD_ORDER = [
+        "工艺规程编号", "工艺编号", "接头", "工艺评定名称", "焊接过程", "接头名称", "母材1牌号", "母材2牌号",
+        "母材厚度", "焊接接头形式参数", "焊角厚度", "焊接位置", "焊前准备", "焊接准备细节", "填充金属类别", "层道",
+        "填充金属名称", "焊材烘干规定", "保护气体", "保护气体流量", "根部保护气体", "根部保护气体流量", "预热温度",
+        "层间温度", "焊后热处理", "加热和冷却速度", "焊丝干伸长度", "摆动", "脉冲焊接情况", "等离子焊接情况",
+        "焊枪角度", "焊工或操作者", "证书名称", "接头长度", "根部开槽衬垫情况", "焊接工艺参数"
+    ]
+
+    # 固定值字段
+    FIXED_VALUES = {
+        "接头名称": "角接接头",
+        "焊前准备": "用清洗剂去除油污/用打磨方法去除氧化膜",
+        "填充金属类别": "S",
+        "焊材烘干规定": "/",
+        "根部保护气体": "/",
+        "根部保护气体流量": "/",
+        "预热温度": "80~100",
+        "层间温度": "/",
+        "焊后热处理": "/",
+        "加热和冷却速度": "/",
+        "焊丝干伸长度": "12~15",
+        "摆动": "/",
+        "脉冲焊接情况": "脉冲焊",
+        "等离子焊接情况": "/",
+        "焊枪角度": "前倾角0~10°",
+        "焊工或操作者": "/",
+        "证书名称": "/",
+        "接头长度": "/",
+        "根部开槽衬垫情况": "/"
+    }
+
+    BASE_MATERIAL_STANDARD = "TB/T3260.1-2011"
+    # 合金代码：默认23.1，代表6系铝合金（6005和6082）
+    DEFAULT_ALLOY_CODE = "23.1"
+    WELDING_STANDARD = "ISO 4063"
+    SHIELDING_GAS_STANDARD = "ISO14175-I1"
+    FILLER_METAL_NAME = "ISO 18273-S Al 5087 [AlMg4.5MnZr]"
+    PARAMETER_TABLE_HEADER = ["焊道", "焊接方法", "焊材规格(mm)", "电流强度(A)", "电弧电压(V)", "电流种类/极性",
+                              "送丝速度(m/min)", "焊接速度*(mm/s)", "热输入*(KJ/mm)"]
+
+    # 层道：按接头坡口形式确定焊道行数。提示词中 a5 同时对应 "1" 和 "1\n2" 两条规则，
+    # 本地不做取舍，a5 的层道和填充金属名称留给大模型补全（混合生成）
+    LAYER_COUNTS = {"a3": 1, "a4": 1, "a8": 3, "2V": 2, "3V": 2, "4V": 2}
+
+    # 接头类型的中英文代号（FW：角焊缝，BW：对接焊缝）
+    JOINT_TYPE_ALIASES = {"角接": "角接", "FW": "角接", "对接": "对接", "BW": "对接", "搭接": "搭接"}
+
+    def __init__(self, calculator: Optional[WPSCalculator] = None):
+        self.calculator = calculator or WPSCalculator()
+
+    def build_payload(self, excel_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """生成完整的JSON数据，存在规则无法确定的字段时返回None"""
+        fields, unresolved = self.resolve(excel_data)
+        if unresolved:
+            return None
+        return fields
+
+    def resolve(self, excel_data: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+        """按映射规则解析所有字段
+
+        Args:
+            excel_data: Excel解析的行数据字典
+
+        Returns:
+            Tuple: (已解析字段字典（按输出结构顺序）, 未解析字段名列表)
+        """
+        fields = {}
+
+        wps = self._get(excel_data, 'WPS')
+        process = self._parse_welding_process(self._get(excel_data, '焊接工艺'))
+        joint_type = self._get(excel_data, '接头类型')
+        groove = self._get(excel_data, '接头坡口形式')
+        position = self._get(excel_data, '焊接位置')
+        t1, material1 = self._split_thickness_material(self._get(excel_data, '厚度t1/材质'))
+        t2, material2 = self._split_thickness_material(self._get(excel_data, '厚度t2/材质'))
+        gas = self._get(excel_data, '保护气体类型')
+
+        fields["工艺规程编号"] = wps
+        if process and joint_type and t1 and t2 and position:
+            fields["工艺编号"] = f"{process['number']} P/P {joint_type} {self.DEFAULT_ALLOY_CODE} S t{t1}+t{t2} {position}"
+        fields["接头"] = groove
+        fields["工艺评定名称"] = self._get(excel_data, 'WPQR')
+        if process:
+            fields["焊接过程"] = f"{process['suffix']}{process['number']} [{process['method']}] [{self.WELDING_STANDARD}]"
+        if material1:
+            fields["母材1牌号"] = f"{material1} {self.BASE_MATERIAL_STANDARD}"
+        if material2:
+            fields["母材2牌号"] = f"{material2} {self.BASE_MATERIAL_STANDARD}"
+        if t1 and t2:
+            fields["母材厚度"] = f"{t1}/{t2}"
+            fields["焊接接头形式参数"] = f"单位:mm\nt1: {t1}\nt2: {t2}"
+        fields["焊角厚度"] = self._get_throat_thickness(groove)
+        fields["焊接位置"] = position
+        fields["焊接准备细节"] = self._get_preparation_detail(joint_type, t1, t2)
+
+        layer_count = self.LAYER_COUNTS.get(groove)
+        if layer_count:
+            fields["层道"] = "\n".join(str(i + 1) for i in range(layer_count))
+            fields["填充金属名称"] = "\n".join([self.FILLER_METAL_NAME] * layer_count)
+
+        if gas:
+            fields["保护气体"] = f"{self.SHIELDING_GAS_STANDARD} [{gas}]"
+        fields["保护气体流量"] = self._get_gas_flow(gas)
+        fields["焊接工艺参数"] = self._build_parameter_table(excel_data, process, position)
+        fields.update(self.FIXED_VALUES)
+
+        ordered_fields = {}
+        unresolved = []
+        for name in self.FIELD_ORDER:
+            if fields.get(name) is None:
+                unresolved.append(name)
+            else:
+                ordered_fields[name] = fields[name]
+        return ordered_fields, unresolved
+
+    @staticmethod
+    def extract_field_rules(system_prompt: str, names: List[str]) -> Dict[str, str]:
+        """从系统提示词中提取指定字段的映射规则
+
+        字段规则为以 "- 字段名：" 开头的行及其后的子项和续行；标题中包含字段名的小节（如
+        "### 焊接工艺参数表格填写规则"）整节并入该字段的规则。
+
+        Returns:
+            Dict: {字段名: 规则文本}，提示词中没有规则的字段不包含在内
+        """
+        rules = {}
+        current = None
+        in_section = False
+        for line in system_prompt.splitlines():
+            heading = line.startswith('#')
+            # 小节中的列表项不视为新字段
+            match = re.match(r'^- ([^：:]+)[：:]', line) if not in_section else None
+            if match or heading or line.startswith(('输出', '要求')):
+                current = None
+                in_section = False
+                if match and match.group(1) in names:
+                    current = match.group(1)
+                elif heading:
+                    current = next((name for name in names if name in line), None)
+                    in_section = current is not None
+                if current is not None:
+                    rules.setdefault(current, []).append(line)
+                continue
+            if current is None:
+                continue
+            # 字段规则遇到空行结束，小节规则持续到下一个标题
+            if not line.strip() and not in_section:
+                current = None
+                continue
+            rules[current].append(line)
+        return {name: '\n'.join(lines).strip() for name, lines in rules.items()}
+
+    @staticmethod
+    def _get(excel_data: Dict[str, Any], key: str) -> Optional[str]:
+        value = excel_data.get(key)
+        if value is None:
+            return None
+        value = str(value).strip()
+        if not value or value in ('nan', 'None'):
+            return None
+        return value
+
+    @staticmethod
+    def _parse_welding_process(value: Optional[str]) -> Optional[Dict[str, str]]:
+        """解析焊接工艺字段，如 131(MIG-t) -> 工艺数字131、焊接方法MIG、焊后缀t"""
+        if not value:
+            return None
+        match = re.match(r'^\s*(\d+)\s*[(（]\s*([A-Za-z]+)\s*-\s*([A-Za-z]+)\s*[)）]', value)
+        if not match:
+            return None
+        return {'number': match.group(1), 'method': match.group(2), 'suffix': match.group(3)}
+
+    @staticmethod
+    def _split_thickness_material(value: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+        """拆分厚度/材质字段，如 10mm 6005A-T6 -> ('10', '6005A-T6')"""
+        if not value:
+            return None, None
+        match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*mm\s*(\S.*)?$', value)
+        if not match:
+            return None, None
+        material = match.group(2).strip() if match.group(2) else None
+        return match.group(1), material
+
+    @staticmethod
+    def _format_number(value) -> str:
+        value = round(float(value), 2)
+        return str(int(value)) if value == int(value) else f"{value:g}"
+
+    def _get_throat_thickness(self, groove: Optional[str]) -> Optional[str]:
+        """焊角厚度：包含a时取a后数字，包含z时取z后数字乘以0.7"""
+        if not groove:
+            return None
+        match = re.search(r'a(\d+(?:\.\d+)?)', groove)
+        if match:
+            return self._format_number(match.group(1))
+        match = re.search(r'z(\d+(?:\.\d+)?)', groove)
+        if match:
+            return self._format_number(float(match.group(1)) * 0.7)
+        return None
+
+    def _get_preparation_detail(self, joint_type: Optional[str], t1: Optional[str], t2: Optional[str]) -> Optional[str]:
+        """焊接准备细节：角接、对接（按较小厚度）、搭接分别取值"""
+        joint_kind = self.JOINT_TYPE_ALIASES.get(joint_type)
+        if joint_kind == "角接":
+            return "焊前装配间隙要求为0mm，最大不超过1mm"
+        if joint_kind == "对接":
+            if not t1 or not t2:
+                return None
+            if min(float(t1), float(t2)) <= 8:
+                return "焊前装配间隙要求为0mm，最大不超过3mm"
+            return "焊前装配间隙要求为0mm，最大不超过4mm"
+        if joint_kind == "搭接":
+            return "/"
+        return None
+
+    @staticmethod
+    def _get_gas_flow(gas: Optional[str]) -> Optional[str]:
+        """保护气体流量：含He的二元/三元气体为16~18，纯Ar气为14~16"""
+        if not gas:
+            return None
+        if 'He' in gas:
+            return "16~18 [内直径为Φ13的喷嘴]"
+        if 'Ar' in gas:
+            return "14~16 [内直径为Φ13的喷嘴]"
+        return None
+
+    def _build_parameter_table(self, excel_data: Dict[str, Any], process: Optional[Dict[str, str]],
+                               position: Optional[str]) -> Optional[List[List[str]]]:
+        """焊接工艺参数表：按焊接位置中的P开头位置生成数据行，数值取自 WPSCalculator"""
+        if not process or not position:
+            return None
+        positions = re.findall(r'P[A-Z]', position)
+        if not positions:
+            return None
+        try:
+            params = self.calculator.calculate_welding_parameters(excel_data)
+        except ValueError:
+            return None
+
+        def value_range(name):
+            return f"{self._format_number(params[name + '小'])}~{self._format_number(params[name + '大'])}"
+
+        table = [list(self.PARAMETER_TABLE_HEADER)]
+        for p in positions:
+            table.append([
+                f"1-{p}",
+                f"{process['suffix']}{process['number']}",
+                "Φ1.2",
+                value_range("电流强度"),
+                value_range("电弧电压"),
+                "DCEP/+",
+                value_range("送丝速度"),
+                value_range("焊接速度"),
+                value_range("热输入")
+            ])
+        return table